@@ -0,0 +1,61 @@
+"""AIService response cache and single-flight, measured offline against the stub provider.
+
+Runs compliance-platform-opensource's AIService with AI_PROVIDER=stub and a
+simulated upstream latency, then reports: N concurrent identical audit-plan
+requests (upstream calls made, wall time), a repeat of the same request
+(served from the disk cache), a fresh service instance on the same cache file
+(as another worker process would be) and N distinct prompts.
+Usage: python benchmarks/bench_ai_cache.py [--clients 20] [--latency-ms 500]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from synthetic import ROOT
+
+sys.path.insert(0, os.path.join(ROOT, 'compliance-platform-opensource'))
+from services.ai_service import AIService  # noqa: E402
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - start) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--latency-ms', type=float, default=500)
+    args = parser.parse_args()
+    os.environ['AI_STUB_LATENCY_MS'] = str(args.latency_ms)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        service = AIService(data_dir=data_dir, provider='stub')
+        with ThreadPoolExecutor(args.clients) as pool:
+            ms, results = timed(lambda: list(pool.map(
+                lambda _: service.generate_audit_plan('SOC 2', 'Payments platform'), range(args.clients))))
+        assert len(set(results)) == 1
+        print(f"{args.clients} concurrent identical requests: {ms:8.1f} ms, "
+              f"{service.upstream_calls} upstream call(s), {service.stats()['shared_calls']} shared")
+
+        ms, _ = timed(lambda: service.generate_audit_plan('SOC 2', 'Payments platform'))
+        print(f"repeat request (disk cache):           {ms:8.2f} ms")
+
+        other = AIService(data_dir=data_dir, provider='stub')
+        ms, _ = timed(lambda: other.generate_audit_plan('SOC 2', 'Payments platform'))
+        print(f"new process, same cache file:          {ms:8.2f} ms, {other.upstream_calls} upstream call(s)")
+
+        with ThreadPoolExecutor(args.clients) as pool:
+            ms, _ = timed(lambda: list(pool.map(
+                lambda n: service.generate_policy(f"Policy {n}", 'HIPAA'), range(args.clients))))
+        print(f"{args.clients} concurrent distinct requests:  {ms:8.1f} ms, "
+              f"{service.upstream_calls} upstream calls in total")
+        print(service.stats()['cache'])
+
+
+if __name__ == '__main__':
+    main()
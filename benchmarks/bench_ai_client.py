@@ -0,0 +1,89 @@
+"""AI provider client layer against the local mock API: pooling, retries, circuit breaker, rate limit.
+
+1. N sequential completions with a new connection per call (the old
+   requests.post path) vs the pooled ProviderClient: wall time and TCP
+   connections seen by the server.
+2. Upstream answering 503, 503, 200 in turn: every call still succeeds, via retries.
+3. Upstream down (always 500): once the breaker opens, calls fail in microseconds.
+4. Token bucket at --rate/s: wall time of 4x--rate calls.
+5. AIService end to end through OPENAI_BASE_URL, with /ai/stats-style counters.
+Usage: python benchmarks/bench_ai_client.py [--calls 100] [--rate 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import requests
+
+from mock_ai_server import MockAIServer
+from synthetic import ROOT
+
+sys.path.insert(0, os.path.join(ROOT, 'compliance-platform-opensource'))
+from services.ai_client import CircuitBreaker, ProviderClient, UpstreamError  # noqa: E402
+
+PAYLOAD = {'model': 'gpt-3.5-turbo', 'messages': [{'role': 'user', 'content': 'hello'}], 'max_tokens': 20}
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=100)
+    parser.add_argument('--rate', type=float, default=5)
+    args = parser.parse_args()
+
+    server = MockAIServer().start()
+    url = server.url + '/chat/completions'
+
+    seconds, _ = timed(lambda: [requests.post(url, json=PAYLOAD, timeout=30).json() for _ in range(args.calls)])
+    print(f"1. new connection per call: {seconds * 1000 / args.calls:6.2f} ms/call, {server.connections} connections")
+    server.connections = 0
+    client = ProviderClient('mock', server.url, rate=1e6, burst=args.calls)
+    seconds, _ = timed(lambda: [client.post_json('/chat/completions', PAYLOAD) for _ in range(args.calls)])
+    print(f"   pooled keep-alive:       {seconds * 1000 / args.calls:6.2f} ms/call, {server.connections} connections")
+
+    server.set_failures([503, 503, 200])
+    client = ProviderClient('mock', server.url, rate=1e6, burst=100, backoff=0.01)
+    seconds, results = timed(lambda: [client.post_json('/chat/completions', PAYLOAD) for _ in range(10)])
+    print(f"2. 503,503,200 upstream:    {len(results)}/10 succeeded in {seconds:.2f} s, {client.stats()}")
+
+    server.set_failures([500])
+    client = ProviderClient('mock', server.url, rate=1e6, burst=100, max_retries=1, backoff=0.01,
+                            breaker=CircuitBreaker(threshold=5, reset_timeout=30))
+    timings = []
+    for _ in range(20):
+        start = time.perf_counter()
+        try:
+            client.post_json('/chat/completions', PAYLOAD)
+        except UpstreamError as e:
+            timings.append((time.perf_counter() - start, type(e).__name__))
+    print(f"3. upstream down:           first call {timings[0][0] * 1000:.1f} ms ({timings[0][1]}), "
+          f"last call {timings[-1][0] * 1000:.3f} ms ({timings[-1][1]}), upstream requests {server.requests}")
+
+    server.set_failures([])
+    client = ProviderClient('mock', server.url, rate=args.rate, burst=int(args.rate))
+    calls = int(args.rate * 4)
+    seconds, _ = timed(lambda: [client.post_json('/chat/completions', PAYLOAD) for _ in range(calls)])
+    print(f"4. {calls} calls at {args.rate:g}/s (burst {int(args.rate)}): {seconds:.2f} s "
+          f"(expected ~{(calls - int(args.rate)) / args.rate:.2f} s)")
+
+    os.environ.update({'OPENAI_BASE_URL': server.url, 'OPENAI_API_KEY': 'test', 'AI_RATE_LIMIT': '1000'})
+    from services.ai_service import AIService
+    with tempfile.TemporaryDirectory() as data_dir:
+        service = AIService(data_dir=data_dir, provider='openai')
+        text = service.generate_policy('Access Control', 'SOC 2')
+        server.set_failures([500])
+        failed = service.generate_policy('Encryption', 'SOC 2')
+        print(f"5. AIService: {text[:40]!r}... / when down: {failed[:60]!r}")
+        print(f"   {service.stats()['providers']}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Blocking vs streamed (SSE) policy generation against the local mock AI API.
+
+Serves compliance-platform-opensource on a local port with OPENAI_BASE_URL
+pointing at benchmarks/mock_ai_server.py, then reports time to first byte and
+total time for POST /generate-policy and POST /generate-policy/stream, and
+what happens upstream when a streaming client disconnects after a few events.
+Usage: python benchmarks/bench_ai_stream.py [--latency-ms 500] [--token-delay-ms 20] [--tokens 200]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+from werkzeug.serving import make_server
+
+from mock_ai_server import MockAIServer
+from synthetic import ROOT
+
+APP_DIR = os.path.join(ROOT, 'compliance-platform-opensource')
+
+
+def timed_request(url, body, stream):
+    start = time.perf_counter()
+    response = requests.post(url, json=body, stream=True, timeout=120)
+    chunks = response.iter_content(chunk_size=None)
+    first = next(chunks)
+    if stream:
+        # The opening comment only carries the headers; time the first piece of text
+        while b'data:' not in first:
+            first = next(chunks)
+    ttfb = time.perf_counter() - start
+    size = len(first) + sum(len(chunk) for chunk in chunks)
+    return ttfb * 1000, (time.perf_counter() - start) * 1000, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency-ms', type=float, default=500)
+    parser.add_argument('--token-delay-ms', type=float, default=20)
+    parser.add_argument('--tokens', type=int, default=200)
+    args = parser.parse_args()
+
+    mock = MockAIServer(latency=args.latency_ms / 1000, token_delay=args.token_delay_ms / 1000,
+                        tokens=args.tokens).start()
+    os.environ.update({'OPENAI_BASE_URL': mock.url, 'OPENAI_API_KEY': 'test', 'AI_PROVIDER': 'openai',
+                       'AI_RATE_LIMIT': '1000', 'AI_RATE_BURST': '1000'})
+    sys.path.insert(0, APP_DIR)
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.chdir(data_dir)
+        import local_server
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        server = make_server('127.0.0.1', 0, local_server.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{server.server_port}"
+
+        print(f"mock upstream: {args.latency_ms:g} ms to first token, {args.tokens} tokens "
+              f"{args.token_delay_ms:g} ms apart")
+        print(f"{'endpoint':<26} {'ttfb ms':>9} {'total ms':>9} {'bytes':>8}")
+        for n, path in enumerate(['/generate-policy', '/generate-policy/stream']):
+            # Distinct prompts so neither run is served from the response cache
+            body = {'policy_type': f"Access Control {n}", 'framework': 'SOC 2'}
+            ttfb, total, size = timed_request(base + path, body, path.endswith('/stream'))
+            print(f"{path:<26} {ttfb:>9.1f} {total:>9.1f} {size:>8,}")
+
+        response = requests.post(base + '/generate-policy/stream', stream=True, timeout=120,
+                                 json={'policy_type': 'Encryption', 'framework': 'SOC 2'})
+        received = 0
+        for line in response.iter_lines():
+            received += line.startswith(b'data:')
+            if received == 10:
+                break
+        response.close()
+        time.sleep(1)
+        stats = local_server.ai_service.stats()
+        print(f"client gave up after {received} events: upstream saw {mock.disconnects} disconnect(s), "
+              f"{mock.completed} of {mock.requests} completions finished, "
+              f"{stats['cancelled_streams']} cancelled stream(s)")
+        server.shutdown()
+    mock.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Threaded WSGI vs the ASGI serving mode of compliance-platform-opensource under slow AI calls.
+
+Both modes run one process (prefork with --threads, or uvicorn asgi:app)
+against benchmarks/mock_ai_server.py answering after --latency-ms. N clients
+POST distinct /generate-policy requests at once while a probe polls the cheap
+GET /frameworks one request at a time; reported are the wall time for all AI
+requests and the probe requests completed meanwhile, with their latency.
+Usage: python benchmarks/bench_asgi.py [--requests 100] [--latency-ms 2000] [--threads 8]
+"""
+import argparse
+import http.client
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mock_ai_server import MockAIServer
+from synthetic import ROOT
+
+APP_DIR = os.path.join(ROOT, 'compliance-platform-opensource')
+
+
+def request(port, method, path, body=None, timeout=300):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+def start_server(mode, port, data_dir, env, threads, timeout=20):
+    if mode == 'asgi':
+        command = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--app-dir', APP_DIR,
+                   '--port', str(port), '--log-level', 'warning', '--backlog', '2048']
+    else:
+        command = [sys.executable, os.path.join(ROOT, 'services', 'prefork.py'), 'local_server:app',
+                   '--host', '127.0.0.1', '--port', str(port), '--workers', '1', '--threads', str(threads)]
+    env = dict(os.environ, PYTHONPATH=APP_DIR, **env)
+    process = subprocess.Popen(command, cwd=data_dir, env=env, start_new_session=True,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and process.poll() is None:
+        try:
+            if request(port, 'GET', '/frameworks')[0] == 200:
+                return process
+        except OSError:
+            time.sleep(0.1)
+    stop_server(process)
+    raise RuntimeError(f"{mode} server did not start")
+
+
+def stop_server(process):
+    os.killpg(process.pid, signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+
+
+def probe(port, stop, latencies):
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            request(port, 'GET', '/frameworks')
+        except OSError:
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+        time.sleep(0.05)
+
+
+def bench(mode, args, env):
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.makedirs(os.path.join(data_dir, 'data'))
+        shutil.copy(os.path.join(APP_DIR, 'data', 'policies.json'), os.path.join(data_dir, 'data'))
+        process = start_server(mode, args.port, data_dir, env, args.threads)
+        stop = threading.Event()
+        latencies = []
+        try:
+            prober = threading.Thread(target=probe, args=(args.port, stop, latencies))
+            prober.start()
+            time.sleep(0.5)
+            start = time.perf_counter()
+            with ThreadPoolExecutor(args.requests) as pool:
+                results = list(pool.map(lambda n: request(args.port, 'POST', '/generate-policy', {
+                    'policy_type': f"{mode} policy {n}", 'framework': 'SOC 2'}), range(args.requests)))
+            elapsed = time.perf_counter() - start
+            stop.set()
+            prober.join()
+        finally:
+            stop.set()
+            stop_server(process)
+    ok = sum(status == 200 and b'Mock answer' in body for status, body in results)
+    return {'mode': mode, 'ok': ok, 'seconds': elapsed,
+            'probes': len(latencies), 'mean': sum(latencies) / max(1, len(latencies)), 'max': max(latencies or [0])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--latency-ms', type=float, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--port', type=int, default=8766)
+    args = parser.parse_args()
+
+    mock = MockAIServer(latency=args.latency_ms / 1000, tokens=50).start()
+    env = {'OPENAI_BASE_URL': mock.url, 'OPENAI_API_KEY': 'test', 'AI_PROVIDER': 'openai',
+           'AI_RATE_LIMIT': '10000', 'AI_RATE_BURST': '10000'}
+    print(f"{args.requests} concurrent AI requests, upstream {args.latency_ms:g} ms; "
+          f"GET /frameworks latency meanwhile")
+    print(f"{'mode':<24} {'ok':>5} {'AI wall s':>10} {'probes':>7} {'mean ms':>8} {'max ms':>8}")
+    for mode in ('wsgi', 'asgi'):
+        r = bench(mode, args, env)
+        label = f"prefork, {args.threads} threads" if mode == 'wsgi' else 'asgi (uvicorn)'
+        print(f"{label:<24} {r['ok']:>5} {r['seconds']:>10.2f} {r['probes']:>7} {r['mean']:>8.1f} {r['max']:>8.1f}")
+    mock.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Login and per-request authorization cost in compliance-platform-opensource's UserManager.
+
+1. One password check: the old unsalted SHA-256 vs scrypt at AUTH_SCRYPT_N.
+2. Login: a single login, then --logins concurrent logins through the KDF pool.
+3. authorize(token): a token this process issued (in-memory table), one issued
+   by another worker process (signature check), and for comparison what
+   checking the password on every request would cost.
+4. GET /frameworks through the Flask app: no auth vs AUTH_REQUIRED with a token.
+Usage: python benchmarks/bench_auth.py [--logins 16] [--requests 2000]
+"""
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from synthetic import ROOT
+
+APP_DIR = os.path.join(ROOT, 'compliance-platform-opensource')
+sys.path.insert(0, APP_DIR)
+from services.user_manager import UserManager  # noqa: E402
+
+
+def per_call_us(fn, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logins', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        users = UserManager(data_dir)
+        stored = users.users['admin']['password_hash']
+        legacy = hashlib.sha256(b'admin123').hexdigest()
+        print(f"1. password check: sha256 {per_call_us(lambda: users._verify_password('admin123', legacy), 1000):9.1f} us, "
+              f"scrypt n={users.scrypt_n} {per_call_us(lambda: users._verify_password('admin123', stored), 10) / 1000:6.1f} ms")
+
+        start = time.perf_counter()
+        session = users.login('admin', 'admin123')
+        single = (time.perf_counter() - start) * 1000
+        with ThreadPoolExecutor(args.logins) as pool:
+            start = time.perf_counter()
+            list(pool.map(lambda _: users.login('admin', 'admin123'), range(args.logins)))
+            burst = time.perf_counter() - start
+        print(f"2. login: {single:.1f} ms; {args.logins} concurrent logins in {burst * 1000:.0f} ms "
+              f"on {os.getenv('AUTH_KDF_THREADS', '4')} KDF threads")
+
+        token = session['token']
+        other = UserManager(data_dir)
+        tokens = [users.issue_token('admin')['token'] for _ in range(args.requests)]
+        remaining = iter(tokens)
+        cached = per_call_us(lambda: users.authorize(token), args.requests)
+        uncached = per_call_us(lambda: other.authorize(next(remaining)), args.requests)
+        print(f"3. authorize: cached {cached:.1f} us, issued by another worker {uncached:.1f} us, "
+              f"password per request {per_call_us(lambda: users.authenticate('admin', 'admin123'), 10) / 1000:.1f} ms")
+
+        os.chdir(data_dir)
+        os.environ['AI_PROVIDER'] = 'stub'
+        import local_server
+        local_server.user_manager = users
+        client = local_server.app.test_client()
+        headers = {'Authorization': f"Bearer {token}"}
+        open_us = per_call_us(lambda: client.get('/frameworks'), args.requests)
+        local_server.AUTH_REQUIRED = True
+        assert client.get('/frameworks').status_code == 401
+        auth_us = per_call_us(lambda: client.get('/frameworks', headers=headers), args.requests)
+        print(f"4. GET /frameworks: {open_us:.0f} us without auth, {auth_us:.0f} us with AUTH_REQUIRED and a token")
+
+
+if __name__ == '__main__':
+    main()
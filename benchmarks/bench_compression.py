@@ -0,0 +1,75 @@
+"""Bytes on the wire and CPU cost of API response compression, per encoding.
+
+For each payload and each available encoding (gzip always; br and zstd when the
+brotli / zstandard packages are installed) reports the compressed size, ratio
+and CPU time per compression, then the request latency of the full assessments
+list with the compressed body built fresh vs reused from the read cache.
+Usage: python benchmarks/bench_compression.py [--records 1000] [--controls 50,200] [--repeat 5]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from synthetic import ROOT, load_server, write_dataset
+
+from services.compression import ENCODINGS, compress
+
+PAYLOADS = [
+    ('assessments (full list)', '/api/assessments'),
+    ('assessments ?limit=100', '/api/assessments?limit=100'),
+    ('assessments ?limit=100&summary=1', '/api/assessments?limit=100&summary=1'),
+    ('assessment by id', '/api/assessments/1'),
+    ('gap analysis ?limit=50', '/api/analytics/gap-analysis?limit=50'),
+    ('compliance score', '/api/analytics/compliance-score'),
+]
+
+
+def cpu_ms(fn, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--records', type=int, default=1000)
+    parser.add_argument('--controls', default='50,200')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        write_dataset(data_dir, args.records, controls=tuple(int(n) for n in args.controls.split(',')))
+        server = load_server('sqlite', data_dir)
+        client = server.app.test_client()
+
+        bodies = [(name, client.get(path).data) for name, path in PAYLOADS]
+        with open(os.path.join(ROOT, 'data', 'policies.json'), 'rb') as f:
+            bodies.append(('data/policies.json', f.read()))
+
+        print(f"{'payload':<34} {'encoding':<8} {'bytes':>11} {'ratio':>7} {'cpu ms':>9}")
+        for name, body in bodies:
+            print(f"{name:<34} {'identity':<8} {len(body):>11} {1:>7.1f} {0:>9.3f}")
+            for encoding in ENCODINGS:
+                compressed = compress(body, encoding)
+                cost = cpu_ms(lambda: compress(body, encoding), args.repeat)
+                print(f"{'':<34} {encoding:<8} {len(compressed):>11} {len(body) / len(compressed):>7.1f} {cost:>9.3f}")
+
+        print(f"\nGET /api/assessments (full list), {args.records} records")
+        for encoding in ENCODINGS:
+            headers = {'Accept-Encoding': encoding}
+            server.read_cache.invalidate()
+            start = time.perf_counter()
+            client.get('/api/assessments', headers=headers)
+            cold = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                client.get('/api/assessments', headers=headers)
+            warm = (time.perf_counter() - start) / args.repeat * 1000
+            print(f"  {encoding:<8} first request {cold:>9.1f} ms   cached compressed body {warm:>7.2f} ms")
+        server.storage.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Concurrent POST /api/assessments: throughput, lost writes and duplicate ids.
+
+Runs once with one commit per write and once with group commit.
+Usage: python benchmarks/bench_concurrent_writes.py [--clients 16] [--posts 100] [--backend sqlite]
+"""
+import argparse
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from synthetic import load_server, make_assessment
+
+
+def run(backend, clients, posts, group_commit):
+    with tempfile.TemporaryDirectory() as data_dir:
+        server = load_server(backend, data_dir)
+        if not group_commit:
+            server.storage._writer.max_batch = 1
+        payload = make_assessment(0)
+        del payload['id']
+        errors = []
+
+        def client_loop():
+            client = server.app.test_client()
+            for _ in range(posts):
+                response = client.post('/api/assessments', json=payload)
+                if response.status_code != 200:
+                    errors.append(response.status_code)
+
+        threads = [threading.Thread(target=client_loop) for _ in range(clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        stored = server.storage.list('assessments')
+        ids = Counter(record['id'] for record in stored)
+        stats = server.storage.write_stats()
+        server.storage.close()
+
+    return {
+        'mode': 'group commit' if group_commit else 'commit per write',
+        'throughput': clients * posts / elapsed,
+        'lost': clients * posts - len(stored),
+        'duplicate_ids': sum(1 for count in ids.values() if count > 1),
+        'writes_per_batch': stats['writes_per_batch'],
+        'errors': len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--posts', type=int, default=100)
+    parser.add_argument('--backend', default='sqlite')
+    args = parser.parse_args()
+
+    print(f"{args.clients} clients x {args.posts} POSTs ({args.backend})")
+    print(f"{'mode':<18} {'req/s':>8} {'lost':>5} {'dup ids':>8} {'writes/batch':>13} {'errors':>7}")
+    for group_commit in (False, True):
+        r = run(args.backend, args.clients, args.posts, group_commit)
+        print(f"{r['mode']:<18} {r['throughput']:>8.0f} {r['lost']:>5} {r['duplicate_ids']:>8} "
+              f"{r['writes_per_batch']:>13} {r['errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Bulk ingest vs one POST per record.
+
+Loads N synthetic assessments into an empty store three ways — N single
+POST /api/assessments calls, one POST /api/assessments/bulk with an NDJSON
+body, and the same body again with ?upsert=1 (every record matches by
+external_id, so all are updates) — and reports wall time and records/s per
+backend.
+Usage: python benchmarks/bench_ingest.py [--records 2000] [--controls 20] [--backend sqlite,json]
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+
+from synthetic import load_server, make_assessment
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--records', type=int, default=2000)
+    parser.add_argument('--controls', type=int, default=20)
+    parser.add_argument('--backend', default='sqlite,json')
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    records = []
+    for i in range(1, args.records + 1):
+        record = make_assessment(i, args.controls, rng)
+        record.pop('id', None)
+        record['external_id'] = f"ext-{i}"
+        records.append(record)
+    ndjson = '\n'.join(json.dumps(record) for record in records)
+
+    print(f"{args.records} assessments x {args.controls} controls, {len(ndjson) / 1e6:.1f} MB NDJSON")
+    print(f"{'backend':<8} {'method':<26} {'seconds':>9} {'records/s':>11}")
+    for backend in args.backend.split(','):
+        with tempfile.TemporaryDirectory() as single_dir, tempfile.TemporaryDirectory() as bulk_dir:
+            server = load_server(backend, single_dir)
+            client = server.app.test_client()
+            seconds, _ = timed(lambda: [client.post('/api/assessments', json=record) for record in records])
+            print(f"{backend:<8} {'single POST per record':<26} {seconds:>9.2f} {args.records / seconds:>11.0f}")
+            server.storage.close()
+
+            server = load_server(backend, bulk_dir)
+            client = server.app.test_client()
+            for label, path in (('bulk NDJSON insert', '/api/assessments/bulk'),
+                                ('bulk NDJSON upsert', '/api/assessments/bulk?upsert=1')):
+                seconds, response = timed(lambda: client.post(path, data=ndjson, content_type='application/x-ndjson'))
+                result = response.get_json()
+                assert response.status_code == 200 and not result['failed'], result
+                print(f"{backend:<8} {label:<26} {seconds:>9.2f} {args.records / seconds:>11.0f}")
+            assert server.storage.count('assessments') == args.records
+            server.storage.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Response size and latency of GET /api/assessments: full list vs summary, projection and paging.
+
+Usage: python benchmarks/bench_list_api.py [--assessments 2000] [--controls 50] [--requests 20]
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+from synthetic import load_server, write_assessments
+
+VARIANTS = [
+    ('full list (before)', '/api/assessments'),
+    ('summary=1', '/api/assessments?summary=1'),
+    ('fields=id,name,framework,created_at', '/api/assessments?fields=id,name,framework,created_at'),
+    ('limit=50&summary=1', '/api/assessments?limit=50&summary=1'),
+    ('limit=50 (full records)', '/api/assessments?limit=50'),
+]
+
+
+def measure(client, url, requests):
+    timings = []
+    size = 0
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get(url)
+        timings.append(time.perf_counter() - start)
+        size = len(response.get_data())
+    return size, statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--assessments', type=int, default=2000)
+    parser.add_argument('--controls', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--backend', default='sqlite')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        write_assessments(data_dir, args.assessments, args.controls)
+        server = load_server(args.backend, data_dir)
+        client = server.app.test_client()
+
+        print(f"{args.assessments} assessments x {args.controls} controls ({args.backend})")
+        print(f"{'variant':<38} {'bytes':>12} {'cold ms':>9} {'warm ms':>9}")
+        for name, url in VARIANTS:
+            server.read_cache.invalidate()
+            start = time.perf_counter()
+            client.get(url)
+            cold = (time.perf_counter() - start) * 1000
+            size, warm = measure(client, url, args.requests)
+            print(f"{name:<38} {size:>12,} {cold:>9.2f} {warm:>9.2f}")
+        server.storage.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Requests/sec of the dev server vs the pre-forked `serve` mode, over real HTTP.
+
+Each mode is started as a subprocess on a synthetic dataset and hit by client
+processes cycling through a few read endpoints; afterwards a POST followed by
+reads checks that every worker sees the write.
+Usage: python benchmarks/bench_serve.py [--clients 16] [--seconds 10] [--workers 4] [--backend sqlite]
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from synthetic import ROOT, make_assessment, write_assessments
+
+PATHS = [
+    '/api/assessments?limit=50&summary=1',
+    '/api/assessments/7',
+    '/api/analytics/compliance-score',
+    '/api/analytics/gap-analysis?limit=20',
+]
+
+
+def request(port, method, path, body=None):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    try:
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+def client_loop(port, seconds):
+    done = errors = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        try:
+            status, _ = request(port, 'GET', PATHS[done % len(PATHS)])
+        except OSError:
+            status = None
+        if status == 200:
+            done += 1
+        else:
+            errors += 1
+    return done, errors
+
+
+def start_server(mode, port, data_dir, backend, workers, threads, timeout=20):
+    env = dict(os.environ, COMPLIANCE_DATA_DIR=data_dir, COMPLIANCE_STORAGE=backend)
+    command = [sys.executable, 'local_server.py', mode, '--port', str(port)]
+    if mode == 'serve':
+        command += ['--workers', str(workers), '--threads', str(threads)]
+    process = subprocess.Popen(command, cwd=ROOT, env=env, start_new_session=True,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and process.poll() is None:
+        try:
+            if request(port, 'GET', '/api/assessments?limit=1')[0] == 200:
+                return process
+        except OSError:
+            time.sleep(0.1)
+    stop_server(process)
+    raise RuntimeError(f"{mode} server did not start")
+
+
+def stop_server(process):
+    # The dev server's reloader runs the app in a child process; signal the whole group
+    os.killpg(process.pid, signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+
+
+def check_consistency(port, probes=50):
+    """POST once, then every subsequent read (whichever worker serves it) must include the write"""
+    before = json.loads(request(port, 'GET', '/api/analytics/compliance-score')[1])['total_controls']
+    payload = make_assessment(0)
+    del payload['id']
+    status, _ = request(port, 'POST', '/api/assessments', payload)
+    assert status == 200, status
+    stale = 0
+    for _ in range(probes):
+        total = json.loads(request(port, 'GET', '/api/analytics/compliance-score')[1])['total_controls']
+        stale += total != before + len(payload['controls'])
+    return stale
+
+
+def bench(mode, args):
+    with tempfile.TemporaryDirectory() as data_dir:
+        write_assessments(data_dir, args.records)
+        process = start_server(mode, args.port, data_dir, args.backend, args.workers, args.threads)
+        try:
+            with multiprocessing.Pool(args.clients) as pool:
+                start = time.perf_counter()
+                results = pool.starmap(client_loop, [(args.port, args.seconds)] * args.clients)
+                elapsed = time.perf_counter() - start
+            stale = check_consistency(args.port)
+        finally:
+            stop_server(process)
+    done = sum(r[0] for r in results)
+    return {'mode': mode, 'requests': done, 'errors': sum(r[1] for r in results),
+            'rps': round(done / elapsed, 1), 'stale_reads': stale}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--records', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--backend', default='sqlite')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    print(f"{'mode':<6} {'requests':>9} {'errors':>7} {'req/s':>8} {'stale':>6}")
+    for mode in ('dev', 'serve'):
+        result = bench(mode, args)
+        print(f"{result['mode']:<6} {result['requests']:>9} {result['errors']:>7} "
+              f"{result['rps']:>8} {result['stale_reads']:>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""POST /api/assessments latency as the dataset grows, per storage backend.
+
+Usage: python benchmarks/bench_storage.py [--sizes 100,1000,10000,100000] [--posts 200]
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+from synthetic import load_server, make_assessment, write_assessments
+
+
+def bench(backend, size, posts):
+    with tempfile.TemporaryDirectory() as data_dir:
+        write_assessments(data_dir, size)
+
+        server = load_server(backend, data_dir)
+        client = server.app.test_client()
+        payload = make_assessment(0)
+        del payload['id']
+        timings = []
+        for _ in range(posts):
+            start = time.perf_counter()
+            response = client.post('/api/assessments', json=payload)
+            timings.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.data
+        server.storage.close()
+
+    timings.sort()
+    return {
+        'backend': backend,
+        'records': size,
+        'posts': posts,
+        'p50_ms': round(statistics.median(timings) * 1000, 3),
+        'p95_ms': round(timings[int(len(timings) * 0.95) - 1] * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='100,1000,10000,100000')
+    parser.add_argument('--posts', type=int, default=200)
+    parser.add_argument('--backends', default='sqlite,json')
+    parser.add_argument('--json-max', type=int, default=10000,
+                        help='skip legacy JSON runs above this size (each POST rewrites the file)')
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',')]
+    print(f"{'backend':<8} {'records':>8} {'p50 ms':>9} {'p95 ms':>9}")
+    for backend in args.backends.split(','):
+        for size in sizes:
+            if backend == 'json' and size > args.json_max:
+                continue
+            result = bench(backend, size, args.posts)
+            print(f"{result['backend']:<8} {result['records']:>8} {result['p50_ms']:>9} {result['p95_ms']:>9}")
+
+
+if __name__ == '__main__':
+    main()
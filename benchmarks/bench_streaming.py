@@ -0,0 +1,54 @@
+"""Time to first byte and peak Python memory: buffered vs streamed GET /api/assessments.
+
+Usage: python benchmarks/bench_streaming.py [--assessments 5000] [--controls 50]
+"""
+import argparse
+import tempfile
+import time
+import tracemalloc
+
+from synthetic import load_server, write_assessments
+
+VARIANTS = [
+    ('buffered (jsonify)', '/api/assessments?fields=id,name,framework,controls'),
+    ('stream=json', '/api/assessments?stream=json'),
+    ('stream=ndjson', '/api/assessments?stream=ndjson'),
+]
+
+
+def run(client, url):
+    tracemalloc.start()
+    start = time.perf_counter()
+    response = client.get(url, buffered=False)
+    chunks = iter(response.response)
+    first = next(chunks)
+    ttfb = time.perf_counter() - start
+    size = len(first) + sum(len(chunk) for chunk in chunks)
+    total = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    response.close()
+    return size, ttfb * 1000, total * 1000, peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--assessments', type=int, default=5000)
+    parser.add_argument('--controls', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        write_assessments(data_dir, args.assessments, args.controls)
+        server = load_server('sqlite', data_dir)
+        client = server.app.test_client()
+        print(f"{args.assessments} assessments x {args.controls} controls")
+        print(f"{'variant':<22} {'bytes':>12} {'ttfb ms':>9} {'total ms':>9} {'peak MiB':>9}")
+        for name, url in VARIANTS:
+            server.read_cache.invalidate()
+            size, ttfb, total, peak = run(client, url)
+            print(f"{name:<22} {size:>12,} {ttfb:>9.1f} {total:>9.1f} {peak:>9.1f}")
+        server.storage.close()
+
+
+if __name__ == '__main__':
+    main()
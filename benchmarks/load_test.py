@@ -0,0 +1,300 @@
+"""Load test every route of local_server.py against synthetic data at several scales.
+
+For each scale a dataset is generated (assessments.json, controls.json,
+evidence.json), the server is started on it as a subprocess, and each route in
+ROUTES is driven by concurrent client processes for a fixed time. Results
+(p50/p95/p99 latency, throughput, errors, server peak RSS) go to a JSON file
+that can be diffed between releases with --compare.
+
+Usage: python benchmarks/load_test.py [--scales 1000,10000] [--controls 50,200] [--clients 8]
+                                      [--seconds 3] [--mode serve] [--output results.json]
+       python benchmarks/load_test.py --compare old.json new.json
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+
+from bench_serve import request, start_server, stop_server
+from synthetic import ROOT, load_server, make_assessment, write_dataset
+
+# (name, method, path, body) -- {assessment} and {control} are replaced with random
+# existing ids, {job} with a finished export job, {delete_control} with an id no
+# other request deletes. Destructive
+# routes run last. Add new routes here; main() warns about any route left out.
+ROUTES = [
+    ('index', 'GET', '/', None),
+    ('analytics_page', 'GET', '/analytics', None),
+    ('static_js', 'GET', '/js/app.js', None),
+    ('metrics', 'GET', '/metrics', None),
+    ('assessments_page', 'GET', '/api/assessments?limit=100', None),
+    ('assessments_summary', 'GET', '/api/assessments?limit=100&summary=1', None),
+    ('assessments_fields', 'GET', '/api/assessments?limit=500&fields=id,name,framework', None),
+    ('assessments_stream', 'GET', '/api/assessments?stream=ndjson&fields=id,name', None),
+    ('assessment_get', 'GET', '/api/assessments/{assessment}', None),
+    ('controls_page', 'GET', '/api/controls?limit=100', None),
+    ('control_get', 'GET', '/api/controls/{control}', None),
+    ('audit_plans', 'GET', '/api/audit-plans', None),
+    ('reports', 'GET', '/api/reports?limit=100', None),
+    ('cache_stats', 'GET', '/api/cache/stats', None),
+    ('compliance_score', 'GET', '/api/analytics/compliance-score', None),
+    ('compliance_score_framework', 'GET', '/api/analytics/compliance-score?framework=HIPAA', None),
+    ('gap_analysis', 'GET', '/api/analytics/gap-analysis?limit=50', None),
+    ('gap_analysis_high', 'GET', '/api/analytics/gap-analysis?limit=50&risk_level=High', None),
+    ('trends', 'GET', '/api/analytics/trends', None),
+    ('generate_controls', 'POST', '/api/generate-controls',
+     {'framework': 'SOC 2', 'infrastructure': ['firewall', 'cloud', 'database']}),
+    ('assessment_create', 'POST', '/api/assessments', 'assessment'),
+    ('control_create', 'POST', '/api/controls', {'name': 'Load test control', 'status': 'not_started'}),
+    ('assessments_bulk', 'POST', '/api/assessments/bulk', 'assessment_batch'),
+    ('controls_bulk', 'POST', '/api/controls/bulk', [{'name': 'Load test control', 'status': 'not_started'}] * 20),
+    ('audit_plan_create', 'POST', '/api/audit-plans', {'name': 'Load test plan', 'framework': 'SOC 2'}),
+    ('control_update', 'POST', '/api/controls/update', 'control_update'),
+    ('assessment_patch', 'PATCH', '/api/assessments/{assessment}', {'name': 'Renamed by load test'}),
+    ('control_patch', 'PATCH', '/api/controls/{control}', {'progress': 50}),
+    ('report_export', 'POST', '/api/reports/export/pdf', {}),
+    ('export_jobs', 'GET', '/api/jobs?limit=20', None),
+    ('export_job', 'GET', '/api/jobs/{job}', None),
+    ('export_job_download', 'GET', '/api/jobs/{job}/download', None),
+    ('export_job_cancel', 'DELETE', '/api/jobs/{job}', None),
+    ('compliance_score_rebuild', 'POST', '/api/analytics/compliance-score/rebuild', {}),
+    ('control_delete', 'DELETE', '/api/controls/{delete_control}', None),
+    ('assessment_delete', 'DELETE', '/api/assessments/{delete_assessment}', None),
+]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def client_loop(port, route, seconds, counts, client, clients, seed):
+    _, method, path, body = route
+    rng = random.Random(seed)
+    latencies, statuses = [], {}
+    delete_from = ('controls' if '{delete_control}' in path else
+                   'assessments' if '{delete_assessment}' in path else None)
+    sequence = 0
+    deadline = time.monotonic() + seconds
+    while True:
+        # Deletes walk down from the highest id, interleaved across clients
+        delete_offset = sequence * clients + client
+        if delete_from and delete_offset >= counts[delete_from]:
+            break
+        url = path.format(
+            assessment=rng.randint(1, counts['assessments']),
+            control=rng.randint(1, counts['controls']),
+            job=counts.get('job'),
+            delete_control=counts['controls'] - delete_offset,
+            delete_assessment=counts['assessments'] - delete_offset)
+        payload = body
+        if body == 'assessment':
+            payload = make_assessment(0, rng.randint(5, 20), rng)
+            del payload['id']
+        elif body == 'assessment_batch':
+            payload = [make_assessment(0, rng.randint(5, 20), rng) for _ in range(10)]
+            for assessment in payload:
+                del assessment['id']
+        elif body == 'control_update':
+            payload = {'id': rng.randint(1, counts['controls']), 'progress': rng.randint(0, 100),
+                       'status': 'in_progress'}
+        start = time.perf_counter()
+        try:
+            status, _ = request(port, method, url, payload)
+        except OSError:
+            status = 'connection_error'
+        latencies.append(time.perf_counter() - start)
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+        sequence += 1
+        if time.monotonic() >= deadline:
+            break
+    return latencies, statuses
+
+
+def finished_export(port):
+    """Id of a completed export job, for the job status and download routes"""
+    _, body = request(port, 'POST', '/api/reports/export/csv', {})
+    job = json.loads(body)
+    request(port, 'GET', f"/api/jobs/{job['id']}?wait=30")
+    return job['id']
+
+
+def peak_rss_kib(pid):
+    """Sum of VmHWM over the server process and its children (Linux /proc only)"""
+    def children(parent):
+        try:
+            with open(f'/proc/{parent}/task/{parent}/children') as f:
+                return [int(c) for c in f.read().split()]
+        except OSError:
+            return []
+
+    total, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        pending.extend(children(current))
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        total += int(line.split()[1])
+        except OSError:
+            continue
+    return total or None
+
+
+def run_scale(scale, args):
+    results = []
+    with tempfile.TemporaryDirectory() as data_dir:
+        start = time.perf_counter()
+        counts = write_dataset(data_dir, scale, controls=args.controls, seed=args.seed)
+        generated = time.perf_counter() - start
+        print(f"scale {scale}: {counts['controls']} controls, {counts['evidence']} evidence "
+              f"(generated in {generated:.1f}s)", flush=True)
+
+        start = time.perf_counter()
+        process = start_server(args.mode, args.port, data_dir, args.backend, args.workers, args.threads,
+                               timeout=args.startup_timeout)
+        startup = time.perf_counter() - start
+        try:
+            counts['job'] = finished_export(args.port)
+            for route in ROUTES:
+                if args.routes and route[0] not in args.routes:
+                    continue
+                # One request first, so lazily built indexes show up as cold_ms rather than in the percentiles
+                cold = client_loop(args.port, route, 0, counts, 0, 1, args.seed) if route[1] == 'GET' else ([], {})
+                with multiprocessing.Pool(args.clients) as pool:
+                    start = time.perf_counter()
+                    runs = pool.starmap(client_loop, [
+                        (args.port, route, args.seconds, counts, client, args.clients, args.seed + client)
+                        for client in range(args.clients)])
+                    elapsed = time.perf_counter() - start
+                latencies = sorted(latency for run in runs for latency in run[0])
+                statuses = {}
+                for run in runs:
+                    for status, count in run[1].items():
+                        statuses[status] = statuses.get(status, 0) + count
+                ok = sum(count for status, count in statuses.items() if status.startswith(('2', '3')))
+                result = {
+                    'route': route[0], 'method': route[1], 'path': route[2],
+                    'cold_ms': _ms(cold[0][0]) if cold[0] else None,
+                    'requests': len(latencies), 'errors': len(latencies) - ok, 'statuses': statuses,
+                    'throughput_rps': round(ok / elapsed, 1),
+                    'p50_ms': _ms(percentile(latencies, 0.50)),
+                    'p95_ms': _ms(percentile(latencies, 0.95)),
+                    'p99_ms': _ms(percentile(latencies, 0.99)),
+                }
+                results.append(result)
+                print(f"  {route[0]:<28} {result['requests']:>7} {result['errors']:>6} {result['throughput_rps']:>9} "
+                      f"{result['p50_ms']:>9} {result['p95_ms']:>9} {result['p99_ms']:>9}", flush=True)
+            peak_rss = peak_rss_kib(process.pid)
+        finally:
+            stop_server(process)
+    return {'scale': scale, 'records': counts, 'startup_s': round(startup, 2),
+            'peak_rss_kib': peak_rss, 'routes': results}
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def uncovered_routes():
+    """Route/method pairs registered on the app that ROUTES never exercises"""
+    with tempfile.TemporaryDirectory() as data_dir:
+        server = load_server('sqlite', data_dir)
+        covered = {(method, path.split('?')[0]) for _, method, path, _ in ROUTES}
+        adapter = server.app.url_map.bind('localhost')
+        missing = []
+        for rule in server.app.url_map.iter_rules():
+            for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}):
+                if rule.endpoint == 'static':
+                    continue
+                if not any(m == method and adapter.test(p, method=m) and
+                           adapter.match(p, method=m)[0] == rule.endpoint for m, p in covered):
+                    missing.append(f"{method} {rule.rule}")
+        server.storage.close()
+    return missing
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = {(s['scale'], r['route']): r for s in json.load(f)['scales'] for r in s['routes']}
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{'scale':>7} {'route':<28} {'p95 old':>9} {'p95 new':>9} {'change':>8} {'rps old':>9} {'rps new':>9}")
+    for scale in new['scales']:
+        for route in scale['routes']:
+            before = old.get((scale['scale'], route['route']))
+            if not before or not before['p95_ms'] or route['p95_ms'] is None:
+                continue
+            change = (route['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+            print(f"{scale['scale']:>7} {route['route']:<28} {before['p95_ms']:>9} {route['p95_ms']:>9} "
+                  f"{change:>+7.1f}% {before['throughput_rps']:>9} {route['throughput_rps']:>9}")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scales', default='1000,10000', help='assessment counts, e.g. 1000,10000,100000')
+    parser.add_argument('--controls', default='50,200', help='min,max controls per assessment')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent client processes')
+    parser.add_argument('--seconds', type=float, default=3, help='duration per route')
+    parser.add_argument('--routes', help='only run these route names (comma separated)')
+    parser.add_argument('--mode', default='serve', choices=['serve', 'dev'])
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--backend', default='sqlite')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--startup-timeout', type=float, default=1800,
+                        help='seconds to wait for the first start (includes importing the JSON files)')
+    parser.add_argument('--output', default=os.path.join(ROOT, 'benchmarks', 'results', 'load_test.json'))
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='diff two result files and exit')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    args.controls = tuple(int(n) for n in args.controls.split(','))
+    args.routes = set(args.routes.split(',')) if args.routes else None
+
+    for route in uncovered_routes():
+        print(f"Warning: {route} is not covered by ROUTES")
+
+    report = {
+        'generated_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'config': {'mode': args.mode, 'workers': args.workers, 'threads': args.threads, 'backend': args.backend,
+                   'clients': args.clients, 'seconds_per_route': args.seconds, 'controls': args.controls,
+                   'seed': args.seed},
+        'scales': [],
+    }
+    print(f"  {'route':<28} {'reqs':>7} {'errors':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for scale in (int(s) for s in args.scales.split(',')):
+        report['scales'].append(run_scale(scale, args))
+        print(f"  peak RSS {report['scales'][-1]['peak_rss_kib']} KiB, startup {report['scales'][-1]['startup_s']}s")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""Local stand-in for the OpenAI chat completions API, for offline benchmarks.
+
+POST /v1/chat/completions answers in the OpenAI response format, or as
+server-sent events with "stream": true. Latency, per-token delay and failures
+(a repeating cycle of HTTP statuses, optionally with Retry-After) are set on
+the server object, which also counts requests and TCP connections so that
+connection reuse is visible.
+Usage: python benchmarks/mock_ai_server.py [--port 8090] [--latency-ms 500] [--fail 503,503,200]
+Then point the app at it: OPENAI_BASE_URL=http://127.0.0.1:8090/v1 OPENAI_API_KEY=test
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Hundreds of concurrent clients connect at once in the serving benchmarks
+    request_queue_size = 1024
+
+    def __init__(self, port=0, latency=0.0, token_delay=0.0, tokens=50, fail=(), retry_after=None):
+        super().__init__(('127.0.0.1', port), _Handler)
+        self.latency = latency
+        self.token_delay = token_delay
+        self.tokens = tokens
+        self.retry_after = retry_after
+        self.set_failures(fail)
+        self.requests = 0
+        self.connections = 0
+        self.completed = 0
+        self.disconnects = 0
+        self._lock = threading.Lock()
+
+    def set_failures(self, statuses):
+        """Cycle of statuses to answer with (200 = succeed); empty for always succeeding"""
+        self._statuses = itertools.cycle(statuses) if statuses else None
+
+    def next_status(self):
+        with self._lock:
+            self.requests += 1
+            return next(self._statuses) if self._statuses else 200
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without TCP_NODELAY, requests on a
+    # kept-alive connection stall ~40 ms on Nagle + delayed ACK, which real servers avoid
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server._lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, status, body, headers=()):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        server = self.server
+        status = server.next_status()
+        time.sleep(server.latency)
+        if status != 200:
+            headers = [('Retry-After', str(server.retry_after))] if server.retry_after is not None else []
+            self._json(status, {'error': {'message': f'mock failure {status}'}}, headers)
+            return
+        prompt = request.get('messages', [{}])[-1].get('content', '')
+        words = [f"token{n}" for n in range(min(server.tokens, request.get('max_tokens', server.tokens)))]
+        if not request.get('stream'):
+            # The whole completion is generated before any of it is sent
+            time.sleep(server.token_delay * len(words))
+            self._json(200, {'choices': [{'message': {'role': 'assistant',
+                                                      'content': f"Mock answer to {len(prompt)} chars: " + ' '.join(words)}}]})
+            with server._lock:
+                server.completed += 1
+            return
+        # Chunked, one event per chunk, as the real API streams
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        events = [{'choices': [{'delta': {'content': word + ' '}}]} for word in words]
+        try:
+            for event in events:
+                self._chunk(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+                time.sleep(server.token_delay)
+            self._chunk(b"data: [DONE]\n\n")
+            self._chunk(b"")
+            with server._lock:
+                server.completed += 1
+        except (BrokenPipeError, ConnectionResetError):
+            with server._lock:
+                server.disconnects += 1
+            self.close_connection = True
+
+    def _chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency-ms', type=float, default=500)
+    parser.add_argument('--token-delay-ms', type=float, default=20)
+    parser.add_argument('--fail', default='', help='cycle of statuses, e.g. 503,503,200')
+    args = parser.parse_args()
+    server = MockAIServer(args.port, args.latency_ms / 1000, args.token_delay_ms / 1000,
+                          fail=[int(s) for s in args.fail.split(',') if s])
+    print(f"Mock AI API on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
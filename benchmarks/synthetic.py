@@ -0,0 +1,100 @@
+"""Synthetic compliance data and an in-process server for the benchmarks."""
+import importlib
+import json
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+FRAMEWORKS = ['SOC 2', 'HIPAA', 'NIST CSF', 'PCI DSS', 'ISO 27001']
+RISK_LEVELS = ['High', 'Medium', 'Low']
+STATUSES = ['not_started', 'in_progress', 'implemented']
+
+
+def make_control(framework, n, rng=random):
+    return {
+        'id': f'{framework}-{n}',
+        'name': f'Control {n}',
+        'description': 'Synthetic control generated for benchmarking',
+        'type': rng.choice(['automatic', 'manual']),
+        'risk_level': rng.choice(RISK_LEVELS),
+        'status': rng.choice(STATUSES),
+        'test_status': rng.choice(['tested', 'not_tested']),
+        'test_result': rng.choice(['pass', 'fail']),
+        'progress': rng.randint(0, 100)
+    }
+
+
+def make_assessment(i, controls=5, rng=random):
+    framework = FRAMEWORKS[i % len(FRAMEWORKS)]
+    return {
+        'id': i,
+        'name': f'Assessment {i}',
+        'framework': framework,
+        'infrastructure': ['cloud', 'database'],
+        'controls': [make_control(framework, n, rng) for n in range(1, controls + 1)],
+        'created_at': '2025-01-01T00:00:00'
+    }
+
+
+def write_assessments(data_dir, count, controls=5, seed=1):
+    rng = random.Random(seed)
+    with open(os.path.join(data_dir, 'assessments.json'), 'w') as f:
+        json.dump([make_assessment(i, controls, rng) for i in range(1, count + 1)], f)
+
+
+def load_server(backend, data_dir):
+    """Import a fresh copy of local_server bound to `data_dir`"""
+    os.environ['COMPLIANCE_STORAGE'] = backend
+    os.environ['COMPLIANCE_DATA_DIR'] = data_dir
+    sys.modules.pop('local_server', None)
+    return importlib.import_module('local_server')
+
+
+def _write_json_list(path, records):
+    """Write an iterable of records as a JSON list without holding it in memory"""
+    with open(path, 'w') as f:
+        f.write('[')
+        for index, record in enumerate(records):
+            if index:
+                f.write(',')
+            json.dump(record, f)
+        f.write(']')
+
+
+def write_dataset(data_dir, assessments, controls=(50, 200), evidence_ratio=0.5, seed=1):
+    """assessments.json, controls.json and evidence.json at production-like volume.
+
+    Each assessment embeds between controls[0] and controls[1] controls; controls.json
+    holds the same controls as standalone records with unique integer ids, and
+    evidence.json one upload record for roughly `evidence_ratio` of them.
+    Returns the number of records written per file.
+    """
+    rng = random.Random(seed)
+    counts = {'assessments': assessments, 'controls': 0, 'evidence': 0}
+    sizes = [rng.randint(controls[0], controls[1]) for _ in range(assessments)]
+
+    _write_json_list(os.path.join(data_dir, 'assessments.json'),
+                     (make_assessment(i, sizes[i - 1], random.Random(seed + i)) for i in range(1, assessments + 1)))
+
+    def standalone_controls():
+        for i in range(1, assessments + 1):
+            assessment_rng = random.Random(seed + i)
+            framework = FRAMEWORKS[i % len(FRAMEWORKS)]
+            for n in range(1, sizes[i - 1] + 1):
+                counts['controls'] += 1
+                yield {**make_control(framework, n, assessment_rng), 'id': counts['controls'],
+                       'control_id': f'{framework}-{n}', 'assessment_id': i}
+    _write_json_list(os.path.join(data_dir, 'controls.json'), standalone_controls())
+
+    def evidence():
+        for control_id in range(1, counts['controls'] + 1):
+            if rng.random() < evidence_ratio:
+                counts['evidence'] += 1
+                yield {'id': counts['evidence'], 'control_id': control_id,
+                       'filename': f'evidence_{control_id}.pdf', 'size': rng.randint(10_000, 5_000_000),
+                       'uploaded_at': '2025-01-01T00:00:00'}
+    _write_json_list(os.path.join(data_dir, 'evidence.json'), evidence())
+    return counts
@@ -0,0 +1,303 @@
+"""ASGI entry point: the async serving mode.
+
+The AI generation endpoints run as coroutines: the provider call is awaited
+on the event loop, so one process holds hundreds of in-flight generations
+without a thread each. Every other route is the Flask app from local_server,
+run through a WSGI bridge on a bounded thread pool; exports get a pool of
+their own, so neither AI traffic nor slow exports starve the cheap endpoints.
+
+Usage (from this directory, like local_server.py):
+    uvicorn asgi:app --port 8000
+ASGI_WSGI_THREADS (default 8) and ASGI_EXPORT_THREADS (default 2) size the pools.
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+import local_server
+from services.ai_service import ProviderError
+
+# Request bodies up to this size stay in memory; larger ones (evidence uploads) go to a temporary file
+SPOOL_BYTES = 1024 * 1024
+
+ai_service = local_server.ai_service
+
+logger = logging.getLogger(__name__)
+
+class Disconnected(Exception):
+    """The client went away before the request body was read"""
+
+async def read_body(receive):
+    body = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+    size = 0
+    more = True
+    while more:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            await close_body(body)
+            raise Disconnected()
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > SPOOL_BYTES:
+            # Past the spool size the body is on disk: file I/O stays off the event loop
+            await asyncio.to_thread(body.write, chunk)
+        else:
+            body.write(chunk)
+        more = message.get('more_body', False)
+    body.seek(0)
+    return body
+
+async def close_body(body):
+    # Closing a spooled body that went to disk removes the file
+    await asyncio.to_thread(body.close)
+
+async def wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+def request_data(scope, body):
+    """The JSON body, or the query parameters when there is none"""
+    raw = body.read()
+    body.seek(0)
+    try:
+        data = json.loads(raw) if raw else None
+    except ValueError:
+        data = None
+    return data if isinstance(data, dict) else dict(parse_qsl(scope['query_string'].decode('latin-1')))
+
+def authorized(scope):
+    """The session for the request's bearer token, as local_server.authorize_request checks it"""
+    header = dict(scope['headers']).get(b'authorization', b'').decode('latin-1')
+    return local_server.user_manager.authorize(local_server.bearer_token(header))
+
+async def send_json(send, status, payload):
+    body = json.dumps(payload).encode('utf-8')
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]})
+    await send({'type': 'http.response.body', 'body': body})
+
+async def send_events(receive, send, pieces):
+    """Server-sent events as local_server.sse writes them; a disconnect cancels the generation"""
+    async def relay():
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache'),
+                                (b'x-accel-buffering', b'no')]})
+        await send({'type': 'http.response.body', 'body': b": generating\n\n", 'more_body': True})
+        try:
+            async for piece in pieces:
+                event = f"data: {json.dumps({'text': piece})}\n\n"
+                await send({'type': 'http.response.body', 'body': event.encode('utf-8'), 'more_body': True})
+            last = "event: done\ndata: {}\n\n"
+        except ProviderError as e:
+            last = f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+        await send({'type': 'http.response.body', 'body': last.encode('utf-8')})
+
+    streaming = asyncio.ensure_future(relay())
+    disconnect = asyncio.ensure_future(wait_disconnect(receive))
+    await asyncio.wait({streaming, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+    if not streaming.done():
+        # Cancelling the relay closes the upstream connection, which stops the completion
+        streaming.cancel()
+    disconnect.cancel()
+    try:
+        await streaming
+    except asyncio.CancelledError:
+        pass
+
+async def generate_audit_plan(scope, receive, send, data):
+    prompt = ai_service.audit_plan_prompt(data.get('framework'), data.get('scope'))
+    await send_json(send, 200, {"audit_plan": await ai_service.agenerate(prompt)})
+
+async def generate_policy(scope, receive, send, data):
+    prompt = ai_service.policy_prompt(data.get('policy_type'), data.get('framework'))
+    await send_json(send, 200, {"policy_content": await ai_service.agenerate(prompt)})
+
+async def stream_audit_plan(scope, receive, send, data):
+    prompt = ai_service.audit_plan_prompt(data.get('framework'), data.get('scope'))
+    await send_events(receive, send, ai_service.astream(prompt))
+
+async def stream_policy(scope, receive, send, data):
+    prompt = ai_service.policy_prompt(data.get('policy_type'), data.get('framework'))
+    await send_events(receive, send, ai_service.astream(prompt))
+
+ROUTES = {
+    ('POST', '/generate-audit-plan'): generate_audit_plan,
+    ('POST', '/generate-policy'): generate_policy,
+    ('GET', '/generate-audit-plan/stream'): stream_audit_plan,
+    ('POST', '/generate-audit-plan/stream'): stream_audit_plan,
+    ('GET', '/generate-policy/stream'): stream_policy,
+    ('POST', '/generate-policy/stream'): stream_policy
+}
+
+class WSGIBridge:
+    """Serves ASGI requests with a WSGI app on a bounded thread pool.
+
+    The response is passed back a chunk at a time through a small queue, so
+    streamed responses stay streamed and a slow client holds back the worker
+    thread rather than filling memory. When the client disconnects, the app's
+    iterable is closed at the next chunk.
+    """
+
+    def __init__(self, wsgi_app, threads: int, name: str):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix=name)
+
+    def environ(self, scope, body):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope['query_string'].decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            # The whole body has been read: the app may read to EOF without a Content-Length
+            'wsgi.input_terminated': True,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False
+        }
+        for name, value in scope['headers']:
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                environ[name] = value
+            else:
+                key = 'HTTP_' + name
+                environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    async def __call__(self, scope, receive, send, body):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=8)
+        disconnected = threading.Event()
+        environ = self.environ(scope, body)
+
+        def put(*message):
+            asyncio.run_coroutine_threadsafe(queue.put(message), loop).result()
+
+        def run():
+            response = []
+
+            def start_response(status, headers, exc_info=None):
+                if exc_info and response and response[-1] is None:
+                    raise exc_info[1].with_traceback(exc_info[2])
+                response[:] = [status, headers]
+                return lambda data: put('body', data)
+
+            def start():
+                if response and response[-1] is not None:
+                    put('start', *response)
+                    response.append(None)
+
+            try:
+                iterable = self.wsgi_app(environ, start_response)
+                try:
+                    for chunk in iterable:
+                        if disconnected.is_set():
+                            break
+                        start()
+                        if chunk:
+                            put('body', chunk)
+                    start()
+                finally:
+                    if hasattr(iterable, 'close'):
+                        iterable.close()
+            except BaseException as e:
+                put('error', e)
+            else:
+                put('end')
+            finally:
+                body.close()
+
+        done = loop.run_in_executor(self.executor, run)
+        watch = asyncio.ensure_future(wait_disconnect(receive))
+        watch.add_done_callback(lambda task: task.cancelled() or disconnected.set())
+        started = False
+        try:
+            while True:
+                kind, *rest = await queue.get()
+                if kind == 'end':
+                    if not disconnected.is_set():
+                        await send({'type': 'http.response.body', 'body': b''})
+                    break
+                if kind == 'error':
+                    logger.error("Unhandled error in %s %s", scope['method'], scope['path'], exc_info=rest[0])
+                    if not started:
+                        await send_json(send, 500, {"error": "Internal server error"})
+                    break
+                if disconnected.is_set():
+                    # Keep draining so the worker thread is never left blocked on the queue
+                    continue
+                if kind == 'start':
+                    status, headers = rest
+                    await send({'type': 'http.response.start', 'status': int(status.split(' ', 1)[0]),
+                                'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                            for name, value in headers]})
+                    started = True
+                else:
+                    await send({'type': 'http.response.body', 'body': rest[0], 'more_body': True})
+        finally:
+            watch.cancel()
+            await done
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+flask_bridge = WSGIBridge(local_server.app, int(os.environ.get('ASGI_WSGI_THREADS', '8')), 'wsgi')
+export_bridge = WSGIBridge(local_server.app, int(os.environ.get('ASGI_EXPORT_THREADS', '2')), 'export')
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Resume unfinished policy batches now rather than on the first Flask request
+            local_server.policy_batches.start()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await ai_service.aclose()
+            local_server.policy_batches.close()
+            flask_bridge.close()
+            export_bridge.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+    try:
+        body = await read_body(receive)
+    except Disconnected:
+        return
+    route = ROUTES.get((scope['method'], scope['path']))
+    if route is not None:
+        if local_server.AUTH_REQUIRED and authorized(scope) is None:
+            await close_body(body)
+            await send_json(send, 401, {"error": "Authentication required"})
+            return
+        try:
+            data = await asyncio.to_thread(request_data, scope, body)
+            await route(scope, receive, send, data)
+        finally:
+            await close_body(body)
+    elif scope['path'].startswith('/export/'):
+        await export_bridge(scope, receive, send, body)
+    else:
+        await flask_bridge(scope, receive, send, body)
@@ -1,10 +1,12 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, abort, g, request, jsonify, send_file, send_from_directory
 import json
 import os
 from datetime import datetime
-from services.ai_service import AIService
+from typing import Optional
+from services.ai_service import AIService, ProviderError
 from services.export_service import ExportService
 from services.user_manager import UserManager
+from services.policy_batch import TYPES, PolicyBatches, PolicyStore
 
 app = Flask(__name__)
 
@@ -12,14 +14,39 @@ app = Flask(__name__)
 ai_service = AIService()
 export_service = ExportService()
 user_manager = UserManager()
+policy_batches = PolicyBatches(os.path.join('data', 'policy_batches.db'), ai_service,
+                               PolicyStore(os.path.join('data', 'policies.json')),
+                               workers=int(os.environ.get('AI_BATCH_WORKERS', '4')))
+
+# AUTH_REQUIRED=1: every route except the page, static files and login needs
+# "Authorization: Bearer <token>" from /auth/login, and only admins may register users
+AUTH_REQUIRED = os.environ.get('AUTH_REQUIRED', '0') == '1'
+PUBLIC_ENDPOINTS = {'serve_index', 'serve_static', 'login'}
+# The only directories serve_static reads from; data/ (users, auth_secret) is never served
+STATIC_DIRS = ('css', 'js')
+
+def bearer_token(header: Optional[str]) -> Optional[str]:
+    scheme, _, token = (header or '').partition(' ')
+    return token.strip() if scheme.lower() == 'bearer' else None
+
+@app.before_request
+def start_policy_batches():
+    # Resumes unfinished batches; lazy so a pre-fork master never generates
+    policy_batches.start()
+
+@app.before_request
+def authorize_request():
+    g.session = user_manager.authorize(bearer_token(request.headers.get('Authorization')))
+    if AUTH_REQUIRED and g.session is None and request.endpoint not in PUBLIC_ENDPOINTS:
+        return jsonify({"error": "Authentication required"}), 401
 
 # Enhanced frameworks
 EXPANDED_FRAMEWORKS = {
-    \"SOC 2\": [\"Security\", \"Availability\", \"Processing Integrity\", \"Confidentiality\", \"Privacy\"],
-    \"HIPAA\": [\"Privacy Rule\", \"Security Rule\", \"Breach Notification\"],
-    \"NIST CSF\": [\"Identify\", \"Protect\", \"Detect\", \"Respond\", \"Recover\"],
-    \"PCI DSS\": [\"Build Secure Systems\", \"Protect Cardholder Data\", \"Vulnerability Management\", \"Access Control\", \"Monitoring\", \"Security Policies\"],
-    \"ISO 27001\": [\"Context Establishment\", \"Leadership\", \"Planning\", \"Support\", \"Operation\", \"Performance Evaluation\", \"Improvement\"]
+    "SOC 2": ["Security", "Availability", "Processing Integrity", "Confidentiality", "Privacy"],
+    "HIPAA": ["Privacy Rule", "Security Rule", "Breach Notification"],
+    "NIST CSF": ["Identify", "Protect", "Detect", "Respond", "Recover"],
+    "PCI DSS": ["Build Secure Systems", "Protect Cardholder Data", "Vulnerability Management", "Access Control", "Monitoring", "Security Policies"],
+    "ISO 27001": ["Context Establishment", "Leadership", "Planning", "Support", "Operation", "Performance Evaluation", "Improvement"]
 }
 
 @app.route('/')
@@ -28,7 +55,10 @@ def serve_index():
 
 @app.route('/<path:path>')
 def serve_static(path):
-    return send_file(path)
+    directory, _, name = path.partition('/')
+    if directory not in STATIC_DIRS or not name:
+        abort(404)
+    return send_from_directory(os.path.join(app.root_path, directory), name)
 
 # Enhanced Audit Plan Generation
 @app.route('/generate-audit-plan', methods=['POST'])
@@ -39,7 +69,7 @@ def generate_audit_plan():
     
     # Use real AI service
     audit_plan = ai_service.generate_audit_plan(framework, scope)
-    return jsonify({\"audit_plan\": audit_plan})
+    return jsonify({"audit_plan": audit_plan})
 
 # Enhanced Policy Generation
 @app.route('/generate-policy', methods=['POST'])
@@ -49,7 +79,87 @@ def generate_policy():
     framework = data.get('framework')
     
     policy_content = ai_service.generate_policy(policy_type, framework)
-    return jsonify({\"policy_content\": policy_content})
+    return jsonify({"policy_content": policy_content})
+
+# Streaming variants: server-sent events carrying the text as the provider generates it.
+# POST a JSON body, or GET with query parameters (for EventSource).
+def sse(pieces):
+    """One "data" event per piece of text, then a "done" event (or an "error" event)"""
+    try:
+        # Headers go out now, before the provider has produced anything
+        yield ": generating\n\n"
+        for piece in pieces:
+            yield f"data: {json.dumps({'text': piece})}\n\n"
+        yield "event: done\ndata: {}\n\n"
+    except ProviderError as e:
+        yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+    finally:
+        # Runs early when the client disconnects; closing the generation cancels the upstream request
+        pieces.close()
+
+def sse_response(pieces):
+    return Response(sse(pieces), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/generate-audit-plan/stream', methods=['GET', 'POST'])
+def stream_audit_plan():
+    data = request.get_json(silent=True) or request.args
+    return sse_response(ai_service.stream_audit_plan(data.get('framework'), data.get('scope')))
+
+@app.route('/generate-policy/stream', methods=['GET', 'POST'])
+def stream_policy():
+    data = request.get_json(silent=True) or request.args
+    return sse_response(ai_service.stream_policy(data.get('policy_type'), data.get('framework')))
+
+# Batch generation: a policy and/or procedure per control, run concurrently under the
+# provider rate limit, saved to data/policies.json as each completes. The batch is
+# persisted, so it carries on after a restart; follow it again with /stream.
+def batch_events(batch_id):
+    yield f"event: batch\ndata: {json.dumps(policy_batches.get(batch_id))}\n\n"
+    for item in policy_batches.follow(batch_id):
+        yield f"event: item\ndata: {json.dumps(item)}\n\n"
+    yield f"event: done\ndata: {json.dumps(policy_batches.get(batch_id))}\n\n"
+
+@app.route('/generate-policies/batch', methods=['POST'])
+def generate_policies_batch():
+    data = request.get_json(silent=True) or {}
+    framework = data.get('framework')
+    types = data.get('types', list(TYPES))
+    controls = []
+    # Controls as in data/controls.json, or bare policy types
+    for control in data.get('controls', []):
+        if isinstance(control, str):
+            controls.append({'control_id': control, 'area': control})
+        elif isinstance(control, dict) and (control.get('control_area') or control.get('policy_type')):
+            area = control.get('control_area') or control.get('policy_type')
+            controls.append({'control_id': control.get('control_id') or area, 'area': area})
+        else:
+            return jsonify({"error": "Each control needs a control_area or policy_type"}), 400
+    if not framework or not controls:
+        return jsonify({"error": "framework and controls are required"}), 400
+    if not types or any(t not in TYPES for t in types):
+        return jsonify({"error": f"types must be drawn from {', '.join(TYPES)}"}), 400
+    
+    batch = policy_batches.submit(framework, controls, types)
+    if request.args.get('stream', '1') == '0':
+        return jsonify(batch), 202
+    return Response(batch_events(batch['id']), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/generate-policies/batch/<batch_id>', methods=['GET'])
+def get_policy_batch(batch_id):
+    batch = policy_batches.get(batch_id)
+    if batch is None:
+        return jsonify({"error": "Batch not found"}), 404
+    batch['items'] = policy_batches.items(batch_id)
+    return jsonify(batch)
+
+@app.route('/generate-policies/batch/<batch_id>/stream', methods=['GET'])
+def stream_policy_batch(batch_id):
+    if policy_batches.get(batch_id) is None:
+        return jsonify({"error": "Batch not found"}), 404
+    return Response(batch_events(batch_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 # Export endpoints
 @app.route('/export/excel', methods=['POST'])
@@ -58,7 +168,7 @@ def export_excel():
     controls = data.get('controls', [])
     
     filename = export_service.export_to_excel(controls)
-    return jsonify({\"filename\": filename, \"message\": \"Excel export completed\"})
+    return jsonify({"filename": filename, "message": "Excel export completed"})
 
 @app.route('/export/pdf', methods=['POST'])
 def export_pdf():
@@ -67,7 +177,7 @@ def export_pdf():
     framework = data.get('framework', 'Compliance')
     
     filename = export_service.export_to_pdf(controls, framework)
-    return jsonify({\"filename\": filename, \"message\": \"PDF export completed\"})
+    return jsonify({"filename": filename, "message": "PDF export completed"})
 
 # User management endpoints
 @app.route('/auth/login', methods=['POST'])
@@ -76,41 +186,63 @@ def login():
     username = data.get('username')
     password = data.get('password')
     
-    if user_manager.authenticate(username, password):
+    session = user_manager.login(username, password) if username and password else None
+    if session:
         return jsonify({
-            \"success\": True,
-            \"username\": username,
-            \"role\": user_manager.get_user_role(username)
+            "success": True,
+            "username": username,
+            "role": session["role"],
+            "token": session["token"],
+            "expires_at": session["expires_at"]
         })
     else:
-        return jsonify({\"success\": False, \"error\": \"Invalid credentials\"})
+        return jsonify({"success": False, "error": "Invalid credentials"})
+
+@app.route('/auth/logout', methods=['POST'])
+def logout():
+    if not user_manager.revoke(bearer_token(request.headers.get('Authorization'))):
+        return jsonify({"success": False, "error": "Not logged in"}), 401
+    return jsonify({"success": True})
+
+@app.route('/auth/session', methods=['GET'])
+def current_session():
+    if g.session is None:
+        return jsonify({"error": "Not logged in"}), 401
+    return jsonify({key: g.session[key] for key in ('username', 'role', 'expires_at')})
 
 @app.route('/auth/register', methods=['POST'])
 def register():
+    if AUTH_REQUIRED and g.session['role'] != 'administrator':
+        return jsonify({"success": False, "error": "Only administrators can create users"}), 403
     data = request.json
     username = data.get('username')
     password = data.get('password')
     
     if user_manager.create_user(username, password):
-        return jsonify({\"success\": True, \"message\": \"User created successfully\"})
+        return jsonify({"success": True, "message": "User created successfully"})
     else:
-        return jsonify({\"success\": False, \"error\": \"Username already exists\"})
+        return jsonify({"success": False, "error": "Username already exists"})
 
 # Evidence upload endpoint
 @app.route('/upload-evidence', methods=['POST'])
 def upload_evidence():
     if 'evidence' not in request.files:
-        return jsonify({\"error\": \"No file provided\"}), 400
+        return jsonify({"error": "No file provided"}), 400
     
     file = request.files['evidence']
     if file.filename == '':
-        return jsonify({\"error\": \"No file selected\"}), 400
+        return jsonify({"error": "No file selected"}), 400
     
     # Save the file
-    filename = f\"uploads/evidence/{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file.filename}\"
+    filename = f"uploads/evidence/{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file.filename}"
     file.save(filename)
     
-    return jsonify({\"success\": True, \"filename\": filename, \"message\": \"Evidence uploaded successfully\"})
+    return jsonify({"success": True, "filename": filename, "message": "Evidence uploaded successfully"})
+
+# AI usage: upstream calls, coalesced duplicates and response cache hit rate
+@app.route('/ai/stats', methods=['GET'])
+def ai_stats():
+    return jsonify(dict(ai_service.stats(), batch_items=policy_batches.stats()))
 
 # Get frameworks endpoint
 @app.route('/frameworks', methods=['GET'])
@@ -121,9 +253,12 @@ def get_frameworks():
 @app.route('/save-controls', methods=['POST'])
 def save_controls():
     data = request.json
-    with open('data/controls.json', 'w') as f:
+    # Write-then-rename so other worker processes never read a half-written file
+    tmp_path = f"data/controls.json.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
         json.dump(data, f, indent=2)
-    return jsonify({\"message\": \"Controls saved successfully\"})
+    os.replace(tmp_path, 'data/controls.json')
+    return jsonify({"message": "Controls saved successfully"})
 
 @app.route('/load-controls', methods=['GET'])
 def load_controls():
@@ -138,7 +273,10 @@ if __name__ == '__main__':
     os.makedirs('uploads/evidence', exist_ok=True)
     os.makedirs('exports', exist_ok=True)
     
-    print(\"Starting Enhanced Compliance Platform Server...\")
-    print(\"New Features: Multi-user, Real AI, Export Capabilities, Evidence Upload\")
-    print(\"Supported Frameworks: SOC 2, HIPAA, NIST CSF, PCI DSS, ISO 27001\")
-    app.run(host='0.0.0.0', port=8000, debug=True)
+    print("Starting Enhanced Compliance Platform Server...")
+    print("New Features: Multi-user, Real AI, Export Capabilities, Evidence Upload")
+    print("Supported Frameworks: SOC 2, HIPAA, NIST CSF, PCI DSS, ISO 27001")
+    print("Development server only; for production run from the repository root:")
+    print("  python services/prefork.py local_server:app --chdir compliance-platform-opensource")
+    print("or, to hold many slow AI requests per process, from this directory: uvicorn asgi:app")
+    app.run(host='127.0.0.1', port=8000, debug=os.environ.get('FLASK_DEBUG', '1') == '1')
@@ -0,0 +1,159 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+class ResponseCache:
+    """AI completions on disk (SQLite), keyed by a hash of provider, model, prompt and parameters.
+
+    Entries expire after `ttl` seconds; beyond `max_entries` or `max_bytes` the
+    least recently used are dropped. The database is shared by every server
+    worker process, so a completion paid for once serves them all.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            used_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_responses_used ON responses (used_at);
+    """
+
+    def __init__(self, path: str, ttl: float = 24 * 3600, max_entries: int = 1000,
+                 max_bytes: int = 50 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(provider: str, model: str, prompt: str, params: Dict) -> str:
+        payload = json.dumps([provider, model, prompt, params], sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str, count: bool = True) -> Optional[str]:
+        """Cached value or None; `count=False` leaves the hit/miss statistics alone"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM responses WHERE key = ? AND created_at > ?", (key, now - self.ttl)).fetchone()
+            if row is None:
+                self.misses += count
+                return None
+            self.hits += count
+            self._conn.execute("UPDATE responses SET used_at = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, size, created_at, used_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value.encode('utf-8')), now, now))
+                self._evict(now)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _evict(self, now: float):
+        self._conn.execute("DELETE FROM responses WHERE created_at <= ?", (now - self.ttl,))
+        count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and size <= self.max_bytes:
+            return
+        # Oldest-used first until both bounds hold
+        drop = 0
+        for (entry_size,) in self._conn.execute("SELECT size FROM responses ORDER BY used_at"):
+            if count - drop <= self.max_entries and size <= self.max_bytes:
+                break
+            drop += 1
+            size -= entry_size
+        self._conn.execute(
+            "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY used_at LIMIT ?)", (drop,))
+
+    def stats(self) -> Dict:
+        """Hit and miss counts, hit_rate as a percentage of lookups, and the stored entries and bytes"""
+        with self._lock:
+            count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups * 100, 1) if lookups else 0.0,
+                'entries': count,
+                'bytes': size
+            }
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Concurrent calls with the same key share one execution of `fn`"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self.shared = 0
+
+    def do(self, key: str, fn: Callable[[], str]) -> str:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines: one task per key, awaited by every caller.
+
+    The task is shielded, so a caller that is cancelled (its client went away)
+    neither cancels the call for the others nor loses the result for the cache.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.shared = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[str]]) -> str:
+        task = self._tasks.get(key)
+        if task is None:
+            task = self._tasks[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
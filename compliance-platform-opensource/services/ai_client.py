@@ -0,0 +1,309 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+# Upstream statuses worth retrying: rate limited, or a transient server error
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class UpstreamError(Exception):
+    """A provider call failed after retries (or was refused by the circuit breaker)"""
+
+    def __init__(self, message: str, status: Optional[int] = None, retryable: bool = False,
+                 retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+class CircuitOpen(UpstreamError):
+    """The provider has been failing; calls fail fast until the reset timeout passes"""
+
+class TokenBucket:
+    """`rate` requests per second on average, bursts of up to `burst`"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self) -> float:
+        """Take a token if one is available (0.0), else the seconds until one will be"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Take a token, sleeping until one is available; False if that would exceed `timeout`"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """As acquire, waiting without blocking the event loop"""
+        while True:
+            wait = self._take()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures; one trial call is let through after `reset_timeout`"""
+
+    def __init__(self, threshold: int = 5, reset_timeout: float = 30.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.opened = 0
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Raise CircuitOpen unless a call may go ahead; True when that call is the half-open trial"""
+        with self._lock:
+            if self.state == 'open':
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    raise CircuitOpen("Circuit open: upstream is failing, try again later")
+                self.state = 'half_open'
+                return True
+            elif self.state == 'half_open':
+                # Only the trial call goes through while half open
+                raise CircuitOpen("Circuit half open: waiting on a trial call")
+            return False
+
+    def abandon(self, trial: bool):
+        """A call ended with no outcome (cancelled); if it was the trial, the next call gets to be one"""
+        with self._lock:
+            if trial and self.state == 'half_open':
+                # _opened_at is left as it was, so the reset timeout has already passed
+                self.state = 'open'
+
+    def success(self):
+        with self._lock:
+            self.state = 'closed'
+            self._failures = 0
+
+    def failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == 'half_open' or self._failures >= self.threshold:
+                if self.state != 'open':
+                    self.opened += 1
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+
+class ProviderClient:
+    """Shared, rate-limited, retrying access to one AI provider.
+
+    HTTP calls go through one requests Session whose keep-alive pool holds up to
+    `pool_size` connections, so requests reuse TLS connections instead of
+    opening one each; the async variants (acall, apost_json) share an httpx
+    AsyncClient with at most `max_connections` open. Every call (HTTP or SDK)
+    takes a token from the provider's bucket, is retried on 429/5xx and
+    connection errors with full-jitter exponential backoff (honouring
+    Retry-After), and is refused immediately while the circuit breaker is open.
+    """
+
+    def __init__(self, name: str, base_url: str = '', headers: Optional[Dict[str, str]] = None,
+                 rate: float = 3.0, burst: int = 5, max_retries: int = 3, backoff: float = 0.5,
+                 max_backoff: float = 8.0, timeout=(5, 60), pool_size: int = 10, max_connections: int = 100,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.headers = headers or {}
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.max_connections = max_connections
+        self.breaker = breaker or CircuitBreaker()
+        self._session = None
+        self._async_session = None
+        self._async_loop = None
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    session.headers.update(self.headers)
+                    self._session = session
+        return self._session
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        """Run `fn` under the rate limit, retry policy and circuit breaker.
+
+        `fn` raises UpstreamError(retryable=True) for failures worth retrying.
+        """
+        attempt = 0
+        while True:
+            trial = self.breaker.allow()
+            try:
+                self.bucket.acquire()
+                start = time.perf_counter()
+                result = fn()
+            except Exception as e:
+                delay = self._failed(e, attempt, time.perf_counter() - start)
+                attempt += 1
+                time.sleep(delay)
+                continue
+            except BaseException:
+                # Interrupted (GeneratorExit, KeyboardInterrupt): no outcome to record
+                self.breaker.abandon(trial)
+                raise
+            self._observe(time.perf_counter() - start)
+            self.breaker.success()
+            return result
+
+    async def acall(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """As call, for a coroutine function; waits without blocking the event loop"""
+        attempt = 0
+        while True:
+            trial = self.breaker.allow()
+            try:
+                await self.bucket.acquire_async()
+                start = time.perf_counter()
+                result = await fn()
+            except Exception as e:
+                delay = self._failed(e, attempt, time.perf_counter() - start)
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled, e.g. by a client disconnect: no outcome to record
+                self.breaker.abandon(trial)
+                raise
+            self._observe(time.perf_counter() - start)
+            self.breaker.success()
+            return result
+
+    def _failed(self, error: Exception, attempt: int, seconds: float) -> float:
+        """Record a failed attempt; the delay before the next one, or re-raise when it is not retried"""
+        self._observe(seconds)
+        if isinstance(error, UpstreamError) and not error.retryable:
+            # The provider answered (e.g. 400); it is up, the request was wrong
+            self.breaker.success()
+        else:
+            self.breaker.failure()
+        if not isinstance(error, UpstreamError) or not error.retryable or attempt >= self.max_retries:
+            with self._lock:
+                self.failures += 1
+            raise error
+        delay = error.retry_after
+        if delay is None:
+            delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        with self._lock:
+            self.retries += 1
+        return min(delay, self.max_backoff)
+
+    def post_json(self, path: str, payload: Dict, stream: bool = False):
+        """POST `payload` to base_url + path; the decoded JSON body (or the open response when streaming)"""
+        import requests
+
+        def send():
+            try:
+                response = self.session.post(self.base_url + path, json=payload, timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                raise UpstreamError(f"{self.name} request failed: {e}", retryable=True)
+            if response.status_code >= 400:
+                error = self._status_error(response.status_code, response.headers, response.text)
+                response.close()
+                raise error
+            return response if stream else response.json()
+
+        return self.call(send)
+
+    def async_session(self):
+        """httpx.AsyncClient for the running event loop (raises ImportError without httpx)"""
+        import httpx
+
+        loop = asyncio.get_running_loop()
+        if self._async_session is None or self._async_loop is not loop:
+            self._async_session = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0]),
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.pool_size))
+            self._async_loop = loop
+        return self._async_session
+
+    async def apost_json(self, path: str, payload: Dict, stream: bool = False):
+        """As post_json, awaiting the response on the event loop (an open httpx response when streaming)"""
+        import httpx
+
+        session = self.async_session()
+
+        async def send():
+            request = session.build_request('POST', self.base_url + path, json=payload)
+            try:
+                response = await session.send(request, stream=stream)
+            except httpx.TransportError as e:
+                raise UpstreamError(f"{self.name} request failed: {e}", retryable=True)
+            if response.status_code >= 400:
+                body = (await response.aread()).decode('utf-8', 'replace')
+                await response.aclose()
+                raise self._status_error(response.status_code, response.headers, body)
+            return response if stream else response.json()
+
+        return await self.acall(send)
+
+    def _status_error(self, status: int, headers, body: str) -> UpstreamError:
+        retry_after = headers.get('Retry-After', '')
+        return UpstreamError(f"{self.name} returned HTTP {status}: {body[:200]}",
+                             status=status,
+                             retryable=status in RETRY_STATUSES,
+                             retry_after=float(retry_after) if retry_after.isdigit() else None)
+
+    def _observe(self, seconds: float):
+        with self._lock:
+            self.calls += 1
+            self.latency_total += seconds
+            self.latency_max = max(self.latency_max, seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'retries': self.retries,
+                'failures': self.failures,
+                'avg_latency_ms': round(self.latency_total / self.calls * 1000, 1) if self.calls else 0.0,
+                'max_latency_ms': round(self.latency_max * 1000, 1),
+                'circuit': self.breaker.state,
+                'circuit_opened': self.breaker.opened
+            }
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+
+    async def aclose(self):
+        if self._async_session is not None:
+            await self._async_session.aclose()
+            self._async_session = None
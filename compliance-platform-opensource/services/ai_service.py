@@ -1,61 +1,406 @@
-import os
-import requests
+import asyncio
+import hashlib
 import json
-from typing import Dict, Any
+import os
+import threading
+import time
+from typing import Dict, Any, AsyncIterator, Iterator, Optional
+
+from services.ai_cache import AsyncSingleFlight, ResponseCache, SingleFlight
+from services.ai_client import RETRY_STATUSES, ProviderClient, UpstreamError
+
+# Model used per provider; part of the cache key
+MODELS = {
+    'openai': 'gpt-3.5-turbo',
+    'gemini': 'gemini-pro',
+    'stub': 'stub'
+}
+
+class ProviderError(Exception):
+    """Generation failed or is not configured; the message is shown to the user and never cached"""
 
 class AIService:
-    def __init__(self):
+    def __init__(self, data_dir="data", provider: Optional[str] = None, cache: Optional[ResponseCache] = None):
         self.openai_key = os.getenv('OPENAI_API_KEY')
         self.gemini_key = os.getenv('GEMINI_API_KEY')
+        # openai (default), gemini, or stub for offline development and tests
+        self.provider = (provider or os.getenv('AI_PROVIDER', 'openai')).lower()
+        self.cache = cache or ResponseCache(
+            os.path.join(data_dir, 'ai_cache.db'),
+            ttl=float(os.getenv('AI_CACHE_TTL_HOURS', '24')) * 3600,
+            max_entries=int(os.getenv('AI_CACHE_MAX_ENTRIES', '1000')))
+        self._flights = SingleFlight()
+        self._async_flights = AsyncSingleFlight()
+        self.upstream_calls = 0
+        self.streams = 0
+        self.cancelled = 0
+        self._clients: Dict[str, ProviderClient] = {}
+        self._gemini_model = None
+        self._lock = threading.Lock()
+    
+    def _client(self, provider: str) -> ProviderClient:
+        """One shared client per provider (connection pool, rate limit, retries, circuit breaker)"""
+        if provider not in self._clients:
+            with self._lock:
+                if provider not in self._clients:
+                    headers = {}
+                    if provider == 'openai':
+                        headers = {"Authorization": f"Bearer {self.openai_key}", "Content-Type": "application/json"}
+                    self._clients[provider] = ProviderClient(
+                        provider,
+                        base_url=os.getenv('OPENAI_BASE_URL', 'https://api.openai.com/v1') if provider == 'openai' else '',
+                        headers=headers,
+                        rate=float(os.getenv('AI_RATE_LIMIT', '3')),
+                        burst=int(os.getenv('AI_RATE_BURST', '5')),
+                        max_retries=int(os.getenv('AI_MAX_RETRIES', '3')),
+                        max_connections=int(os.getenv('AI_MAX_CONNECTIONS', '100')),
+                        timeout=(5, float(os.getenv('AI_TIMEOUT_SECONDS', '60'))))
+        return self._clients[provider]
+    
+    def generate(self, prompt: str, max_tokens: int = 1500, provider: Optional[str] = None) -> str:
+        """Completion for `prompt`, from the response cache when possible.
+
+        Concurrent identical requests share one upstream call; failures come back
+        as a message and are not cached.
+        """
+        try:
+            return self.complete(prompt, max_tokens, provider)
+        except ProviderError as e:
+            return str(e)
+    
+    def _key(self, prompt: str, max_tokens: int, provider: Optional[str]):
+        """(provider, cache key) for a request"""
+        provider = provider or self.provider
+        if provider not in MODELS:
+            raise ProviderError(f"Unknown AI provider: {provider}")
+        params = {'max_tokens': max_tokens, 'temperature': 0.7}
+        return provider, self.cache.key(provider, MODELS[provider], prompt, params)
+    
+    def complete(self, prompt: str, max_tokens: int = 1500, provider: Optional[str] = None) -> str:
+        """As generate, but failures raise ProviderError"""
+        provider, key = self._key(prompt, max_tokens, provider)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        return self._flights.do(key, lambda: self._generate_uncached(key, provider, prompt, max_tokens))
+    
+    def _generate_uncached(self, key: str, provider: str, prompt: str, max_tokens: int) -> str:
+        # Another worker process may have filled the cache while this one waited
+        cached = self.cache.get(key, count=False)
+        if cached is not None:
+            return cached
+        self.upstream_calls += 1
+        if provider == 'openai':
+            text = self._call_openai(prompt, max_tokens)
+        elif provider == 'gemini':
+            text = self._call_gemini(prompt)
+        else:
+            text = self._call_stub(prompt, max_tokens)
+        self.cache.set(key, text)
+        return text
+    
+    def stream(self, prompt: str, max_tokens: int = 1500, provider: Optional[str] = None) -> Iterator[str]:
+        """Completion for `prompt` as pieces of text, yielded as the provider produces them.
+
+        A cached completion comes back as one piece and a finished stream is
+        cached. Closing the generator early (the client went away) closes the
+        upstream connection, so the provider stops generating. Failures raise
+        ProviderError.
+        """
+        provider, key = self._key(prompt, max_tokens, provider)
+        cached = self.cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+        self.upstream_calls += 1
+        self.streams += 1
+        if provider == 'openai':
+            pieces = self._stream_openai(prompt, max_tokens)
+        elif provider == 'gemini':
+            pieces = self._stream_gemini(prompt)
+        else:
+            pieces = self._stream_stub(prompt, max_tokens)
+        text = []
+        try:
+            for piece in pieces:
+                text.append(piece)
+                yield piece
+        except GeneratorExit:
+            self.cancelled += 1
+            raise
+        finally:
+            pieces.close()
+        self.cache.set(key, ''.join(text))
+    
+    async def agenerate(self, prompt: str, max_tokens: int = 1500, provider: Optional[str] = None) -> str:
+        """As generate, on the event loop: the provider call is awaited and cache access runs on a thread.
+
+        Concurrent identical requests share one upstream call, which carries on
+        (and fills the cache) if the request that started it is cancelled.
+        """
+        try:
+            return await self.acomplete(prompt, max_tokens, provider)
+        except ProviderError as e:
+            return str(e)
+    
+    async def acomplete(self, prompt: str, max_tokens: int = 1500, provider: Optional[str] = None) -> str:
+        """As agenerate, but failures raise ProviderError"""
+        provider, key = self._key(prompt, max_tokens, provider)
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            return cached
+        return await self._async_flights.do(
+            key, lambda: self._agenerate_uncached(key, provider, prompt, max_tokens))
+    
+    async def _agenerate_uncached(self, key: str, provider: str, prompt: str, max_tokens: int) -> str:
+        cached = await asyncio.to_thread(self.cache.get, key, False)
+        if cached is not None:
+            return cached
+        self.upstream_calls += 1
+        if provider == 'openai':
+            text = await self._acall_openai(prompt, max_tokens)
+        elif provider == 'gemini':
+            # The SDK blocks; run it on a thread
+            text = await asyncio.to_thread(self._call_gemini, prompt)
+        else:
+            text = await self._acall_stub(prompt, max_tokens)
+        await asyncio.to_thread(self.cache.set, key, text)
+        return text
+    
+    async def astream(self, prompt: str, max_tokens: int = 1500, provider: Optional[str] = None) -> AsyncIterator[str]:
+        """As stream, on the event loop; cancelling the consumer closes the upstream connection"""
+        provider, key = self._key(prompt, max_tokens, provider)
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            yield cached
+            return
+        self.upstream_calls += 1
+        self.streams += 1
+        if provider == 'openai':
+            pieces = self._astream_openai(prompt, max_tokens)
+        elif provider == 'gemini':
+            pieces = self._astream_gemini(prompt)
+        else:
+            pieces = self._astream_stub(prompt, max_tokens)
+        text = []
+        try:
+            async for piece in pieces:
+                text.append(piece)
+                yield piece
+        except (GeneratorExit, asyncio.CancelledError):
+            self.cancelled += 1
+            raise
+        finally:
+            await pieces.aclose()
+        await asyncio.to_thread(self.cache.set, key, ''.join(text))
     
     def generate_with_openai(self, prompt: str, max_tokens: int = 1500) -> str:
-        \"\"\"Generate content using OpenAI API\"\"\"
+        """Generate content using OpenAI API"""
+        return self.generate(prompt, max_tokens, provider='openai')
+    
+    def generate_with_gemini(self, prompt: str) -> str:
+        """Generate content using Google Gemini API"""
+        return self.generate(prompt, provider='gemini')
+    
+    def _call_openai(self, prompt: str, max_tokens: int) -> str:
         if not self.openai_key:
-            return \"OpenAI API key not configured. Please set OPENAI_API_KEY environment variable.\"
+            raise ProviderError("OpenAI API key not configured. Please set OPENAI_API_KEY environment variable.")
         
-        headers = {
-            \"Authorization\": f\"Bearer {self.openai_key}\",
-            \"Content-Type\": \"application/json\"
+        data = {
+            "model": MODELS['openai'],
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": max_tokens,
+            "temperature": 0.7
         }
         
+        try:
+            response = self._client('openai').post_json('/chat/completions', data)
+            return response["choices"][0]["message"]["content"]
+        except Exception as e:
+            raise ProviderError(f"AI generation failed: {str(e)}")
+    
+    async def _acall_openai(self, prompt: str, max_tokens: int) -> str:
+        if not self.openai_key:
+            raise ProviderError("OpenAI API key not configured. Please set OPENAI_API_KEY environment variable.")
+        
         data = {
-            \"model\": \"gpt-3.5-turbo\",
-            \"messages\": [{\"role\": \"user\", \"content\": prompt}],
-            \"max_tokens\": max_tokens,
-            \"temperature\": 0.7
+            "model": MODELS['openai'],
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": max_tokens,
+            "temperature": 0.7
         }
         
         try:
-            response = requests.post(
-                \"https://api.openai.com/v1/chat/completions\",
-                headers=headers,
-                json=data,
-                timeout=30
-            )
-            response.raise_for_status()
-            return response.json()[\"choices\"][0][\"message\"][\"content\"]
+            response = await self._client('openai').apost_json('/chat/completions', data)
+            return response["choices"][0]["message"]["content"]
+        except ImportError:
+            # No httpx: the blocking client, on a thread
+            return await asyncio.to_thread(self._call_openai, prompt, max_tokens)
         except Exception as e:
-            return f\"AI generation failed: {str(e)}\"
+            raise ProviderError(f"AI generation failed: {str(e)}")
     
-    def generate_with_gemini(self, prompt: str) -> str:
-        \"\"\"Generate content using Google Gemini API\"\"\"
+    def _stream_openai(self, prompt: str, max_tokens: int) -> Iterator[str]:
+        if not self.openai_key:
+            raise ProviderError("OpenAI API key not configured. Please set OPENAI_API_KEY environment variable.")
+        
+        data = {
+            "model": MODELS['openai'],
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": max_tokens,
+            "temperature": 0.7,
+            "stream": True
+        }
+        
+        try:
+            response = self._client('openai').post_json('/chat/completions', data, stream=True)
+        except Exception as e:
+            raise ProviderError(f"AI generation failed: {str(e)}")
+        try:
+            # Server-sent events: "data: {chunk}" lines, ending with "data: [DONE]"
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                payload = line[5:].strip()
+                if payload == '[DONE]':
+                    break
+                content = json.loads(payload)["choices"][0]["delta"].get("content")
+                if content:
+                    yield content
+        except Exception as e:
+            raise ProviderError(f"AI generation failed: {str(e)}")
+        finally:
+            # Before the end of the stream this drops the connection, which cancels the completion upstream
+            response.close()
+    
+    async def _astream_openai(self, prompt: str, max_tokens: int) -> AsyncIterator[str]:
+        if not self.openai_key:
+            raise ProviderError("OpenAI API key not configured. Please set OPENAI_API_KEY environment variable.")
+        
+        data = {
+            "model": MODELS['openai'],
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": max_tokens,
+            "temperature": 0.7,
+            "stream": True
+        }
+        
+        try:
+            response = await self._client('openai').apost_json('/chat/completions', data, stream=True)
+        except ImportError:
+            raise ProviderError("Streaming on the async server needs httpx. Run: pip install httpx")
+        except Exception as e:
+            raise ProviderError(f"AI generation failed: {str(e)}")
+        try:
+            async for line in response.aiter_lines():
+                if not line.startswith('data:'):
+                    continue
+                payload = line[5:].strip()
+                if payload == '[DONE]':
+                    break
+                content = json.loads(payload)["choices"][0]["delta"].get("content")
+                if content:
+                    yield content
+        except Exception as e:
+            raise ProviderError(f"AI generation failed: {str(e)}")
+        finally:
+            await response.aclose()
+    
+    def _call_gemini(self, prompt: str) -> str:
         if not self.gemini_key:
-            return \"Gemini API key not configured. Please set GEMINI_API_KEY environment variable.\"
+            raise ProviderError("Gemini API key not configured. Please set GEMINI_API_KEY environment variable.")
         
         try:
-            import google.generativeai as genai
-            genai.configure(api_key=self.gemini_key)
-            model = genai.GenerativeModel('gemini-pro')
-            response = model.generate_content(prompt)
-            return response.text
+            model = self._gemini()
+            return self._client('gemini').call(lambda: self._gemini_generate(model, prompt))
         except ImportError:
-            return \"Google Generative AI package not installed. Run: pip install google-generativeai\"
+            raise ProviderError("Google Generative AI package not installed. Run: pip install google-generativeai")
         except Exception as e:
-            return f\"Gemini generation failed: {str(e)}\"
+            raise ProviderError(f"Gemini generation failed: {str(e)}")
     
-    def generate_audit_plan(self, framework: str, scope: str) -> str:
-        \"\"\"Generate audit plan using AI\"\"\"
-        prompt = f\"\"\"
+    def _gemini(self):
+        """The SDK is imported and configured once; the model object is reused across requests"""
+        if self._gemini_model is None:
+            with self._lock:
+                if self._gemini_model is None:
+                    import google.generativeai as genai
+                    genai.configure(api_key=self.gemini_key)
+                    self._gemini_model = genai.GenerativeModel(MODELS['gemini'])
+        return self._gemini_model
+    
+    def _gemini_generate(self, model, prompt: str) -> str:
+        try:
+            return model.generate_content(prompt).text
+        except Exception as e:
+            # google.api_core errors carry the HTTP status as .code
+            code = getattr(e, 'code', None)
+            raise UpstreamError(str(e), status=code if isinstance(code, int) else None,
+                                retryable=code in RETRY_STATUSES)
+    
+    def _stream_gemini(self, prompt: str) -> Iterator[str]:
+        if not self.gemini_key:
+            raise ProviderError("Gemini API key not configured. Please set GEMINI_API_KEY environment variable.")
+        
+        try:
+            model = self._gemini()
+            response = self._client('gemini').call(lambda: model.generate_content(prompt, stream=True))
+            for chunk in response:
+                yield chunk.text
+        except ImportError:
+            raise ProviderError("Google Generative AI package not installed. Run: pip install google-generativeai")
+        except Exception as e:
+            raise ProviderError(f"Gemini generation failed: {str(e)}")
+    
+    async def _astream_gemini(self, prompt: str) -> AsyncIterator[str]:
+        # The SDK's stream iterator blocks; the whole completion comes back as one piece
+        yield await asyncio.to_thread(self._call_gemini, prompt)
+    
+    def _call_stub(self, prompt: str, max_tokens: int) -> str:
+        """Deterministic offline completion; AI_STUB_LATENCY_MS simulates upstream latency"""
+        time.sleep(float(os.getenv('AI_STUB_LATENCY_MS', '0')) / 1000)
+        return "\n".join(self._stub_lines(prompt))
+    
+    def _stream_stub(self, prompt: str, max_tokens: int) -> Iterator[str]:
+        """The stub completion a line at a time, AI_STUB_LATENCY_MS spread over the lines"""
+        lines = self._stub_lines(prompt)
+        delay = float(os.getenv('AI_STUB_LATENCY_MS', '0')) / 1000 / len(lines)
+        for n, line in enumerate(lines):
+            time.sleep(delay)
+            yield line if n == 0 else "\n" + line
+    
+    async def _acall_stub(self, prompt: str, max_tokens: int) -> str:
+        await asyncio.sleep(float(os.getenv('AI_STUB_LATENCY_MS', '0')) / 1000)
+        return "\n".join(self._stub_lines(prompt))
+    
+    async def _astream_stub(self, prompt: str, max_tokens: int) -> AsyncIterator[str]:
+        lines = self._stub_lines(prompt)
+        delay = float(os.getenv('AI_STUB_LATENCY_MS', '0')) / 1000 / len(lines)
+        for n, line in enumerate(lines):
+            await asyncio.sleep(delay)
+            yield line if n == 0 else "\n" + line
+    
+    def _stub_lines(self, prompt: str):
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:12]
+        lines = [line.strip() for line in prompt.strip().splitlines() if line.strip()]
+        return [f"[stub {digest}] {lines[0] if lines else ''}"] + [f"- {line}" for line in lines[1:]]
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'provider': self.provider,
+            'upstream_calls': self.upstream_calls,
+            'shared_calls': self._flights.shared + self._async_flights.shared,
+            'streams': self.streams,
+            'cancelled_streams': self.cancelled,
+            'cache': self.cache.stats(),
+            'providers': {name: client.stats() for name, client in self._clients.items()}
+        }
+    
+    async def aclose(self):
+        """Close the providers' async connection pools (the async server's shutdown)"""
+        for client in list(self._clients.values()):
+            await client.aclose()
+    
+    def audit_plan_prompt(self, framework: str, scope: str) -> str:
+        return f"""
         As a compliance expert, create a detailed {framework} audit plan for: {scope}
         
         Include:
@@ -66,13 +411,10 @@ class AIService:
         5. Timeline recommendations
         
         Format the response in clear sections with actionable items.
-        \"\"\"
-        
-        return self.generate_with_openai(prompt)
+        """
     
-    def generate_policy(self, policy_type: str, framework: str) -> str:
-        \"\"\"Generate policy using AI\"\"\"
-        prompt = f\"\"\"
+    def policy_prompt(self, policy_type: str, framework: str) -> str:
+        return f"""
         Create a comprehensive {policy_type} policy compliant with {framework} requirements.
         
         Include:
@@ -84,6 +426,34 @@ class AIService:
         6. Review and revision schedule
         
         Make it professional and actionable for implementation.
-        \"\"\"
+        """
+    
+    def procedure_prompt(self, procedure_area: str, framework: str) -> str:
+        return f"""
+        Create a step-by-step {procedure_area} procedure that implements the {procedure_area} policy under {framework}.
         
-        return self.generate_with_openai(prompt)
+        Include:
+        1. Overview and objective
+        2. Prerequisites and responsible roles
+        3. Numbered procedure steps
+        4. Evidence to retain for auditors
+        5. Exception handling
+        
+        Make it specific enough for an operator to follow without further guidance.
+        """
+    
+    def generate_audit_plan(self, framework: str, scope: str) -> str:
+        """Generate audit plan using AI"""
+        return self.generate(self.audit_plan_prompt(framework, scope))
+    
+    def generate_policy(self, policy_type: str, framework: str) -> str:
+        """Generate policy using AI"""
+        return self.generate(self.policy_prompt(policy_type, framework))
+    
+    def stream_audit_plan(self, framework: str, scope: str) -> Iterator[str]:
+        """Audit plan text as it is generated"""
+        return self.stream(self.audit_plan_prompt(framework, scope))
+    
+    def stream_policy(self, policy_type: str, framework: str) -> Iterator[str]:
+        """Policy text as it is generated"""
+        return self.stream(self.policy_prompt(policy_type, framework))
@@ -1,87 +1,130 @@
 import json
-import pandas as pd
-from fpdf import FPDF
 import os
+from collections import Counter
+from collections.abc import Sequence
 from datetime import datetime
+from itertools import chain
+
+from openpyxl import Workbook
+
+# Status values counted on the Summary sheet, in display order
+SUMMARY_STATUSES = ['Implemented', 'In Progress', 'Not Started']
 
 class ExportService:
-    def __init__(self, data_dir=\"data\"):
+    def __init__(self, data_dir="data"):
         self.data_dir = data_dir
     
-    def export_to_excel(self, controls_data, filename=None):
-        \"\"\"Export controls data to Excel format\"\"\"
+    def _columns(self, controls_data):
+        """Header row and an iterator over all rows.
+
+        A list is scanned once for the union of its keys (first-seen order, as
+        pandas did); any other iterable is consumed lazily and takes its columns
+        from the first record.
+        """
+        if isinstance(controls_data, Sequence):
+            columns = {}
+            for control in controls_data:
+                columns.update(dict.fromkeys(control))
+            return list(columns), iter(controls_data)
+        rows = iter(controls_data)
+        first = next(rows, None)
+        if first is None:
+            return [], rows
+        return list(first), chain([first], rows)
+    
+    def _cell(self, value):
+        # Same conversion pandas applied: scalars as-is, containers as their str()
+        if value is None or isinstance(value, (str, int, float, bool, datetime)):
+            return value
+        return str(value)
+    
+    def export_to_excel(self, controls_data, filename=None, columns=None):
+        """Export controls data to Excel format.
+
+        `controls_data` may be a list or any iterable of dicts (e.g. a generator
+        over a large store); rows are streamed through openpyxl's write-only mode
+        and the summary counts are taken in the same pass, so memory stays flat
+        regardless of row count.
+        """
         if not filename:
-            filename = f\"exports/compliance_controls_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx\"
+            filename = f"exports/compliance_controls_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
         
         # Ensure exports directory exists
-        os.makedirs('exports', exist_ok=True)
+        os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+        
+        header, rows = self._columns(controls_data)
+        if columns:
+            header = list(columns)
+        
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('Compliance Controls')
+        if header:
+            sheet.append(header)
         
-        # Create DataFrame from controls data
-        df = pd.DataFrame(controls_data)
-        
-        # Create Excel writer
-        with pd.ExcelWriter(filename, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='Compliance Controls', index=False)
-            
-            # Add summary sheet
-            summary_data = {
-                'Metric': ['Total Controls', 'Implemented', 'In Progress', 'Not Started'],
-                'Count': [
-                    len(controls_data),
-                    len([c for c in controls_data if c.get('status') == 'Implemented']),
-                    len([c for c in controls_data if c.get('status') == 'In Progress']),
-                    len([c for c in controls_data if c.get('status') == 'Not Started'])
-                ]
-            }
-            pd.DataFrame(summary_data).to_excel(writer, sheet_name='Summary', index=False)
+        total, statuses = 0, Counter()
+        for control in rows:
+            sheet.append([self._cell(control.get(column)) for column in header])
+            total += 1
+            statuses[control.get('status')] += 1
         
+        # Add summary sheet
+        summary = workbook.create_sheet('Summary')
+        summary.append(['Metric', 'Count'])
+        summary.append(['Total Controls', total])
+        for status in SUMMARY_STATUSES:
+            summary.append([status, statuses[status]])
+        
+        workbook.save(filename)
         return filename
     
     def export_to_pdf(self, controls_data, framework, filename=None):
-        \"\"\"Export compliance report to PDF\"\"\"
+        """Export compliance report to PDF"""
         if not filename:
-            filename = f\"exports/compliance_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf\"
+            filename = f"exports/compliance_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
         
         # Ensure exports directory exists
         os.makedirs('exports', exist_ok=True)
         
+        # Imported here so the Excel path does not need fpdf installed
+        from fpdf import FPDF
+        
         pdf = FPDF()
         pdf.add_page()
         
         # Title
-        pdf.set_font(\"Arial\", 'B', 16)
-        pdf.cell(0, 10, f\"{framework} Compliance Report\", ln=True, align='C')
+        pdf.set_font("Arial", 'B', 16)
+        pdf.cell(0, 10, f"{framework} Compliance Report", ln=True, align='C')
         pdf.ln(10)
         
         # Date
-        pdf.set_font(\"Arial\", size=12)
-        pdf.cell(0, 10, f\"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\", ln=True)
+        pdf.set_font("Arial", size=12)
+        pdf.cell(0, 10, f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", ln=True)
         pdf.ln(10)
         
         # Summary
-        pdf.set_font(\"Arial\", 'B', 14)
-        pdf.cell(0, 10, \"Executive Summary\", ln=True)
-        pdf.set_font(\"Arial\", size=12)
+        pdf.set_font("Arial", 'B', 14)
+        pdf.cell(0, 10, "Executive Summary", ln=True)
+        pdf.set_font("Arial", size=12)
         
         total = len(controls_data)
         implemented = len([c for c in controls_data if c.get('status') == 'Implemented'])
         compliance_rate = (implemented / total * 100) if total > 0 else 0
         
-        pdf.cell(0, 10, f\"Total Controls: {total}\", ln=True)
-        pdf.cell(0, 10, f\"Implemented: {implemented}\", ln=True)
-        pdf.cell(0, 10, f\"Compliance Rate: {compliance_rate:.1f}%\", ln=True)
+        pdf.cell(0, 10, f"Total Controls: {total}", ln=True)
+        pdf.cell(0, 10, f"Implemented: {implemented}", ln=True)
+        pdf.cell(0, 10, f"Compliance Rate: {compliance_rate:.1f}%", ln=True)
         pdf.ln(10)
         
         # Controls Details
-        pdf.set_font(\"Arial\", 'B', 14)
-        pdf.cell(0, 10, \"Controls Details\", ln=True)
-        pdf.set_font(\"Arial\", size=10)
+        pdf.set_font("Arial", 'B', 14)
+        pdf.cell(0, 10, "Controls Details", ln=True)
+        pdf.set_font("Arial", size=10)
         
         for control in controls_data:
             pdf.ln(5)
-            pdf.multi_cell(0, 8, f\"Control: {control.get('name', 'N/A')}\")
-            pdf.multi_cell(0, 8, f\"Status: {control.get('status', 'N/A')}\")
-            pdf.multi_cell(0, 8, f\"Framework: {control.get('framework', 'N/A')}\")
+            pdf.multi_cell(0, 8, f"Control: {control.get('name', 'N/A')}")
+            pdf.multi_cell(0, 8, f"Status: {control.get('status', 'N/A')}")
+            pdf.multi_cell(0, 8, f"Framework: {control.get('framework', 'N/A')}")
             pdf.ln(2)
         
         pdf.output(filename)
@@ -0,0 +1,287 @@
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+TYPES = ('policy', 'procedure')
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class PolicyStore:
+    """Policies and procedures in a JSON list (data/policies.json), one entry per control and type.
+
+    Saving the same control and type again replaces the content and keeps the
+    id. Each save re-reads the file under a lock shared with other server
+    processes and lands by rename, so concurrent writers never lose an entry.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _file_lock(self):
+        try:
+            import fcntl
+        except ImportError:
+            yield
+            return
+        with open(self.path + ".lock", 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def load(self) -> List[Dict]:
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, 'r') as f:
+            return json.load(f)
+
+    def get(self, ids) -> Dict[str, Dict]:
+        ids = set(ids)
+        return {entry['id']: entry for entry in self.load() if entry.get('id') in ids}
+
+    def save(self, control_id: str, type: str, title: str, content: str, **fields) -> Dict:
+        with self._lock, self._file_lock():
+            policies = self.load()
+            entry = next((p for p in policies if p.get('control_id') == control_id and p.get('type') == type), None)
+            if entry is None:
+                numbers = [int(p['id'].rsplit('_', 1)[1]) for p in policies
+                           if str(p.get('id', '')).rsplit('_', 1)[-1].isdigit()]
+                entry = {'title': title, 'content': content, 'type': type, 'control_id': control_id,
+                         'id': f"policy_{max(numbers, default=0) + 1:03d}"}
+                policies.append(entry)
+            entry.update(title=title, content=content, **fields)
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(policies, f, indent=2)
+            os.replace(tmp_path, self.path)
+            return entry
+
+class PolicyBatches:
+    """Batch policy/procedure generation, persisted in SQLite so a restart resumes it.
+
+    `submit` records one item per control and document type and returns at once.
+    A dispatcher thread claims pending items (atomically, so several server
+    processes can share the table) and runs up to `workers` of them at a time on
+    a thread pool; each upstream call still takes a token from the provider
+    client's rate limit, so `workers` bounds concurrency and the bucket bounds
+    the request rate. Documents are saved to the policy store as they complete.
+    Items left running by a process that has died are pending again on start.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS batches (
+            id TEXT PRIMARY KEY,
+            framework TEXT NOT NULL,
+            status TEXT NOT NULL,
+            total INTEGER NOT NULL,
+            created_at TEXT NOT NULL,
+            finished_at TEXT
+        );
+        CREATE TABLE IF NOT EXISTS batch_items (
+            batch_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            control_id TEXT NOT NULL,
+            area TEXT NOT NULL,
+            type TEXT NOT NULL,
+            status TEXT NOT NULL,
+            owner INTEGER,
+            policy_id TEXT,
+            error TEXT,
+            finished INTEGER,
+            finished_at TEXT,
+            PRIMARY KEY (batch_id, seq)
+        );
+        CREATE INDEX IF NOT EXISTS idx_batch_items_status ON batch_items (status);
+    """
+
+    def __init__(self, db_path: str, ai_service, store: PolicyStore, workers: int = 4):
+        self.ai_service = ai_service
+        self.store = store
+        self.workers = workers
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock)
+        self._running = 0
+        self._pool = None
+        self._dispatcher = None
+        self._stopped = False
+
+    def start(self):
+        """Start dispatching (idempotent); called lazily so a pre-fork master never generates"""
+        if self._dispatcher is not None:
+            return
+        with self._lock:
+            if self._dispatcher is not None or self._stopped:
+                return
+            for batch_id, seq, owner in self._conn.execute(
+                    "SELECT batch_id, seq, owner FROM batch_items WHERE status = ?", (RUNNING,)).fetchall():
+                if owner == os.getpid() or not _pid_alive(owner):
+                    self._conn.execute(
+                        "UPDATE batch_items SET status = ?, owner = NULL WHERE batch_id = ? AND seq = ? AND status = ?",
+                        (PENDING, batch_id, seq, RUNNING))
+            self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='policy-batch')
+            self._dispatcher = threading.Thread(target=self._dispatch, name='policy-batch-dispatcher', daemon=True)
+            self._dispatcher.start()
+
+    def submit(self, framework: str, controls: List[Dict], types=TYPES) -> Dict:
+        """Queue a batch; `controls` are {'control_id', 'area'} with one item per control and type"""
+        self.start()
+        batch_id = uuid.uuid4().hex
+        items = [(batch_id, seq, control['control_id'], control['area'], type, PENDING)
+                 for seq, (control, type) in enumerate((c, t) for c in controls for t in types)]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO batches (id, framework, status, total, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (batch_id, framework, RUNNING if items else DONE, len(items), datetime.now().isoformat()))
+                self._conn.executemany(
+                    "INSERT INTO batch_items (batch_id, seq, control_id, area, type, status) VALUES (?, ?, ?, ?, ?, ?)",
+                    items)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._changed.notify_all()
+        return self.get(batch_id)
+
+    def get(self, batch_id: str) -> Optional[Dict]:
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM batches WHERE id = ?", (batch_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM batch_items WHERE batch_id = ? GROUP BY status", (batch_id,)).fetchall())
+        batch = dict(zip((column[0] for column in cursor.description), row))
+        batch.update({status: counts.get(status, 0) for status in (PENDING, RUNNING, DONE, FAILED)})
+        return batch
+
+    def items(self, batch_id: str, after: int = 0) -> List[Dict]:
+        """Finished items in completion order, from the `after`-th on"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT seq, control_id, area, type, status, policy_id, error, finished, finished_at FROM batch_items "
+                "WHERE batch_id = ? AND finished > ? ORDER BY finished", (batch_id, after))
+            rows = cursor.fetchall()
+        return [dict(zip((column[0] for column in cursor.description), row)) for row in rows]
+
+    def follow(self, batch_id: str) -> Iterator[Dict]:
+        """Each finished item with its document, as it completes, until the batch is finished"""
+        after = 0
+        while True:
+            # Status first: once it reads done, every item is already finished
+            finished = self.get(batch_id)['status'] == DONE
+            items = self.items(batch_id, after)
+            documents = self.store.get(item['policy_id'] for item in items if item['policy_id'])
+            for item in items:
+                after = item['finished']
+                document = documents.get(item['policy_id'], {})
+                item.update(title=document.get('title'), content=document.get('content'))
+                yield item
+            if finished:
+                return
+            if not items:
+                with self._changed:
+                    # Short waits: the batch may be run by another server process sharing the table
+                    self._changed.wait(0.5)
+
+    def _claim(self) -> Optional[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "UPDATE batch_items SET status = ?, owner = ? "
+                "WHERE rowid = (SELECT rowid FROM batch_items WHERE status = ? ORDER BY rowid LIMIT 1) "
+                "RETURNING batch_id, seq, control_id, area, type",
+                (RUNNING, os.getpid(), PENDING)).fetchall()
+            if not rows:
+                return None
+            item = dict(zip(('batch_id', 'seq', 'control_id', 'area', 'type'), rows[0]))
+            item['framework'] = self._conn.execute(
+                "SELECT framework FROM batches WHERE id = ?", (item['batch_id'],)).fetchone()[0]
+            self._running += 1
+        return item
+
+    def _dispatch(self):
+        while not self._stopped:
+            with self._changed:
+                while self._running >= self.workers and not self._stopped:
+                    self._changed.wait()
+            item = None if self._stopped else self._claim()
+            if item is None:
+                with self._changed:
+                    if not self._stopped:
+                        # Also polls for batches submitted through other processes
+                        self._changed.wait(1.0)
+                continue
+            self._pool.submit(self._run, item)
+
+    def _run(self, item: Dict):
+        if item['type'] == 'procedure':
+            prompt = self.ai_service.procedure_prompt(item['area'], item['framework'])
+        else:
+            prompt = self.ai_service.policy_prompt(item['area'], item['framework'])
+        policy_id = error = None
+        try:
+            content = self.ai_service.complete(prompt)
+            entry = self.store.save(item['control_id'], item['type'], f"{item['area']} {item['type'].title()}",
+                                    content, framework=item['framework'], generated_at=datetime.now().isoformat())
+            policy_id = entry['id']
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._running -= 1
+            if self._stopped:
+                # close() has already made this item pending again
+                self._changed.notify_all()
+                return
+            self._conn.execute(
+                "UPDATE batch_items SET status = ?, owner = NULL, policy_id = ?, error = ?, finished_at = ?, "
+                "finished = (SELECT COALESCE(MAX(finished), 0) + 1 FROM batch_items WHERE batch_id = ?) "
+                "WHERE batch_id = ? AND seq = ?",
+                (FAILED if error else DONE, policy_id, error, now, item['batch_id'], item['batch_id'], item['seq']))
+            self._conn.execute(
+                "UPDATE batches SET status = ?, finished_at = ? WHERE id = ? AND status = ? AND NOT EXISTS "
+                "(SELECT 1 FROM batch_items WHERE batch_id = ? AND status IN (?, ?))",
+                (DONE, now, item['batch_id'], RUNNING, item['batch_id'], PENDING, RUNNING))
+            self._changed.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM batch_items GROUP BY status").fetchall())
+        return {status: counts.get(status, 0) for status in (PENDING, RUNNING, DONE, FAILED)}
+
+    def close(self):
+        """Stop dispatching; items this process was running are pending again for the next start"""
+        with self._changed:
+            self._stopped = True
+            pool, self._pool = self._pool, None
+            self._changed.notify_all()
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            self._conn.execute("UPDATE batch_items SET status = ?, owner = NULL WHERE status = ? AND owner = ?",
+                               (PENDING, RUNNING, os.getpid()))
+            self._conn.close()
@@ -1,57 +1,286 @@
+import base64
+import hmac
 import json
 import hashlib
 import secrets
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
 from typing import Dict, Optional
 
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
 class UserManager:
-    def __init__(self, data_dir=\"data\"):
+    """Users in users.json, and the sessions of those who have logged in.
+
+    Passwords are stored as salted scrypt hashes (cost from AUTH_SCRYPT_N) and
+    checked on a small thread pool, so a burst of logins cannot take every
+    request thread. A login returns a token signed with the server secret and
+    carrying the username, role and expiry; later requests are authorized from
+    it without touching the password hash: verified tokens are kept in an
+    in-memory table, so most lookups are a dict hit. Revocations are written to
+    revoked_tokens.json, which every worker process reloads when it changes.
+    """
+    
+    def __init__(self, data_dir="data"):
         self.data_dir = data_dir
-        self.users_file = os.path.join(data_dir, \"users.json\")
+        self.users_file = os.path.join(data_dir, "users.json")
+        self.revoked_file = os.path.join(data_dir, "revoked_tokens.json")
+        self.users = {}
+        self._users_stat = None
+        self.scrypt_n = int(os.getenv('AUTH_SCRYPT_N', str(2 ** 14)))
+        self.token_ttl = float(os.getenv('AUTH_TOKEN_TTL_HOURS', '12')) * 3600
+        self._kdf_pool = ThreadPoolExecutor(int(os.getenv('AUTH_KDF_THREADS', '4')), thread_name_prefix='kdf')
+        self._sessions: "OrderedDict[str, Dict]" = OrderedDict()
+        self._max_sessions = int(os.getenv('AUTH_SESSION_CACHE', '10000'))
+        self._revoked = {'tokens': {}, 'users': {}}
+        self._revoked_stat = None
+        self._lock = threading.Lock()
         self._ensure_data_dir()
+        self._secret = self._load_secret()
         self.load_users()
     
     def _ensure_data_dir(self):
         os.makedirs(self.data_dir, exist_ok=True)
     
+    @contextmanager
+    def _file_lock(self):
+        """Serialize read-modify-write of users.json across server worker processes"""
+        try:
+            import fcntl
+        except ImportError:
+            yield
+            return
+        with open(self.users_file + ".lock", 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+    
     def load_users(self):
         if os.path.exists(self.users_file):
-            with open(self.users_file, 'r') as f:
-                self.users = json.load(f)
+            self._refresh()
         else:
-            self.users = {}
             # Create default admin user
-            self.create_user(\"admin\", \"admin123\", \"administrator\")
+            self.create_user("admin", "admin123", "administrator")
+    
+    def _refresh(self):
+        """Reload users.json if another worker process has rewritten it"""
+        try:
+            stat = os.stat(self.users_file)
+        except FileNotFoundError:
+            return
+        identity = (stat.st_mtime_ns, stat.st_size)
+        if identity != self._users_stat:
+            with open(self.users_file, 'r') as f:
+                self.users = json.load(f)
+            self._users_stat = identity
     
     def save_users(self):
-        with open(self.users_file, 'w') as f:
+        tmp_path = f"{self.users_file}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
             json.dump(self.users, f, indent=2)
+        os.replace(tmp_path, self.users_file)
+        stat = os.stat(self.users_file)
+        self._users_stat = (stat.st_mtime_ns, stat.st_size)
     
     def hash_password(self, password: str) -> str:
-        return hashlib.sha256(password.encode()).hexdigest()
+        """'scrypt$n$r$p$salt$hash', salted and with its cost stored alongside"""
+        salt = secrets.token_bytes(16)
+        n, r, p = self.scrypt_n, 8, 1
+        digest = hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * r * n, dklen=32)
+        return f"scrypt${n}${r}${p}${salt.hex()}${digest.hex()}"
     
-    def create_user(self, username: str, password: str, role: str = \"user\") -> bool:
-        if username in self.users:
-            return False
-        
-        self.users[username] = {
-            \"password_hash\": self.hash_password(password),
-            \"role\": role,
-            \"created_at\": datetime.now().isoformat()
-        }
-        self.save_users()
+    def _verify_password(self, password: str, stored: str) -> bool:
+        if not stored.startswith('scrypt$'):
+            # Unsalted SHA-256 from before; replaced on the next successful login
+            return hmac.compare_digest(stored, hashlib.sha256(password.encode()).hexdigest())
+        _, n, r, p, salt, digest = stored.split('$')
+        n, r, p = int(n), int(r), int(p)
+        computed = hashlib.scrypt(password.encode(), salt=bytes.fromhex(salt), n=n, r=r, p=p,
+                                  maxmem=256 * r * n, dklen=len(digest) // 2)
+        return hmac.compare_digest(computed.hex(), digest)
+    
+    def _needs_rehash(self, stored: str) -> bool:
+        return not stored.startswith(f"scrypt${self.scrypt_n}$8$1$")
+    
+    def create_user(self, username: str, password: str, role: str = "user") -> bool:
+        with self._file_lock():
+            self._refresh()
+            if username in self.users:
+                return False
+            
+            self.users[username] = {
+                "password_hash": self.hash_password(password),
+                "role": role,
+                "created_at": datetime.now().isoformat()
+            }
+            self.save_users()
         return True
     
-    def authenticate(self, username: str, password: str) -> bool:
+    def check_password(self, username: str, password: str) -> "Future[bool]":
+        """Verify on the KDF pool; the future's result says whether the password matches"""
+        return self._kdf_pool.submit(self._check_password, username, password)
+    
+    def _check_password(self, username: str, password: str) -> bool:
+        self._refresh()
         user = self.users.get(username)
         if not user:
+            # Same cost as a real check, so response times do not reveal which usernames exist
+            self._verify_password(password, f"scrypt${self.scrypt_n}$8$1${'00' * 16}${'00' * 32}")
+            return False
+        stored = user["password_hash"]
+        if not self._verify_password(password, stored):
             return False
-        
-        return user[\"password_hash\"] == self.hash_password(password)
+        if self._needs_rehash(stored):
+            with self._file_lock():
+                self._refresh()
+                if username in self.users and self.users[username]["password_hash"] == stored:
+                    self.users[username]["password_hash"] = self.hash_password(password)
+                    self.save_users()
+        return True
+    
+    def authenticate(self, username: str, password: str) -> bool:
+        return self.check_password(username, password).result()
+    
+    def login(self, username: str, password: str) -> Optional[Dict]:
+        """A new session ({'token', 'username', 'role', 'expires_at'}) or None for bad credentials"""
+        if not self.authenticate(username, password):
+            return None
+        return self.issue_token(username)
+    
+    def _load_secret(self) -> bytes:
+        """AUTH_SECRET, or a random key kept in the data directory and shared by every worker"""
+        if os.getenv('AUTH_SECRET'):
+            return os.getenv('AUTH_SECRET').encode()
+        path = os.path.join(self.data_dir, "auth_secret")
+        try:
+            # O_EXCL: of several workers starting at once, exactly one writes the key
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            for _ in range(50):
+                with open(path, 'r') as f:
+                    secret = f.read().strip()
+                if secret:
+                    return bytes.fromhex(secret)
+                time.sleep(0.01)
+            raise RuntimeError(f"{path} is empty")
+        secret = secrets.token_bytes(32)
+        with os.fdopen(fd, 'w') as f:
+            f.write(secret.hex())
+        return secret
+    
+    def _sign(self, payload: bytes) -> str:
+        return _b64encode(hmac.new(self._secret, payload, hashlib.sha256).digest())
+    
+    def issue_token(self, username: str) -> Dict:
+        self._refresh()
+        now = time.time()
+        session = {
+            'sid': secrets.token_hex(16),
+            'username': username,
+            'role': self.users[username].get("role"),
+            'issued_at': now,
+            'expires_at': now + self.token_ttl
+        }
+        payload = json.dumps(session, separators=(',', ':')).encode()
+        token = f"{_b64encode(payload)}.{self._sign(payload)}"
+        self._remember(token, session)
+        return dict(session, token=token)
+    
+    def _remember(self, token: str, session: Dict):
+        with self._lock:
+            self._sessions[token] = session
+            if len(self._sessions) > self._max_sessions:
+                self._sessions.popitem(last=False)
+    
+    def authorize(self, token: Optional[str]) -> Optional[Dict]:
+        """The session for a valid, unexpired, unrevoked token, else None"""
+        if not token:
+            return None
+        self._refresh_revoked()
+        session = self._sessions.get(token)
+        if session is None:
+            session = self._decode(token)
+            if session is None:
+                return None
+            self._remember(token, session)
+        if (session['expires_at'] <= time.time() or session['sid'] in self._revoked['tokens']
+                or session['issued_at'] <= self._revoked['users'].get(session['username'], 0)):
+            with self._lock:
+                self._sessions.pop(token, None)
+            return None
+        return session
+    
+    def _decode(self, token: str) -> Optional[Dict]:
+        """Verify the signature of a token this process has not seen (issued by another worker)"""
+        payload, _, signature = token.partition('.')
+        try:
+            payload = _b64decode(payload)
+            # Bytes: compare_digest refuses str with non-ASCII characters
+            if not hmac.compare_digest(signature.encode(), self._sign(payload).encode()):
+                return None
+            session = json.loads(payload)
+        except ValueError:
+            # Malformed base64, UTF-8 or JSON
+            return None
+        return session if isinstance(session, dict) else None
+    
+    def revoke(self, token: str) -> bool:
+        """Log a session out everywhere; False for a token that is not valid anyway"""
+        session = self.authorize(token)
+        if session is None:
+            return False
+        self._update_revoked(tokens={session['sid']: session['expires_at']})
+        return True
+    
+    def revoke_user(self, username: str):
+        """Invalidate every token issued to `username` so far (password change, removal)"""
+        self._update_revoked(users={username: time.time()})
+    
+    def _update_revoked(self, tokens: Optional[Dict] = None, users: Optional[Dict] = None):
+        with self._file_lock():
+            self._revoked_stat = None
+            self._refresh_revoked()
+            revoked = {'tokens': dict(self._revoked['tokens'], **(tokens or {})),
+                       'users': dict(self._revoked['users'], **(users or {}))}
+            # Revoked tokens past their expiry are rejected anyway
+            now = time.time()
+            revoked['tokens'] = {sid: expires for sid, expires in revoked['tokens'].items() if expires > now}
+            tmp_path = f"{self.revoked_file}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(revoked, f)
+            os.replace(tmp_path, self.revoked_file)
+            self._revoked = revoked
+            stat = os.stat(self.revoked_file)
+            self._revoked_stat = (stat.st_mtime_ns, stat.st_size)
+    
+    def _refresh_revoked(self):
+        """Reload revoked_tokens.json if any worker process has rewritten it"""
+        try:
+            stat = os.stat(self.revoked_file)
+        except FileNotFoundError:
+            return
+        identity = (stat.st_mtime_ns, stat.st_size)
+        if identity != self._revoked_stat:
+            with open(self.revoked_file, 'r') as f:
+                self._revoked = json.load(f)
+            self._revoked_stat = identity
     
     def get_user_role(self, username: str) -> Optional[str]:
+        self._refresh()
         user = self.users.get(username)
-        return user.get(\"role\") if user else None
+        return user.get("role") if user else None
     
     def get_all_users(self) -> Dict:
+        self._refresh()
         return self.users
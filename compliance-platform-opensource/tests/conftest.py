@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The app imports its services package relative to this directory, as local_server.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,169 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from services.ai_cache import AsyncSingleFlight, ResponseCache, SingleFlight
+from services.ai_service import AIService
+
+
+def test_hit_rate_is_a_percentage(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'ai_cache.db'))
+    key = ResponseCache.key('openai', 'gpt', 'prompt', {})
+    assert cache.stats()['hit_rate'] == 0.0
+    cache.get(key)
+    cache.set(key, 'answer')
+    cache.get(key)
+    cache.get(key)
+    # Uncounted lookups leave the rate alone
+    cache.get(key, count=False)
+    assert cache.stats() == {'hits': 2, 'misses': 1, 'hit_rate': 66.7, 'entries': 1, 'bytes': 6}
+
+
+def test_entries_expire_after_the_ttl(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'ai_cache.db'), ttl=0.05)
+    cache.set('a', 'answer')
+    assert cache.get('a') == 'answer'
+    time.sleep(0.06)
+    assert cache.get('a') is None
+    # Expired entries are dropped on the next write
+    cache.set('b', 'answer')
+    assert cache.stats()['entries'] == 1
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'ai_cache.db'), max_entries=2)
+    cache.set('a', 'first')
+    time.sleep(0.01)
+    cache.set('b', 'second')
+    time.sleep(0.01)
+    cache.get('a')
+    time.sleep(0.01)
+    cache.set('c', 'third')
+    assert cache.get('a') == 'first'
+    assert cache.get('b') is None
+    assert cache.get('c') == 'third'
+
+
+def test_eviction_keeps_the_total_size_under_max_bytes(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'ai_cache.db'), max_bytes=10)
+    cache.set('a', 'x' * 6)
+    time.sleep(0.01)
+    cache.set('b', 'y' * 6)
+    assert cache.get('a') is None
+    assert cache.stats()['bytes'] == 6
+
+
+def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return 'result'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flights.do('k', fn))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    # Wait until every follower has joined the leader's call
+    while flights.shared < 4:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+    assert results == ['result'] * 5
+    # The key is free again once the call finishes
+    assert flights.do('k', lambda: 'again') == 'again'
+
+
+def test_a_failed_call_raises_in_every_waiter():
+    flights = SingleFlight()
+    release = threading.Event()
+
+    def fn():
+        release.wait(5)
+        raise ValueError('upstream failed')
+
+    errors = []
+
+    def run():
+        try:
+            flights.do('k', fn)
+        except ValueError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=run) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    while flights.shared < 2:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert errors == ['upstream failed'] * 3
+
+
+def test_a_cancelled_caller_leaves_the_shared_call_running():
+    flights = AsyncSingleFlight()
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 'result'
+
+    async def run():
+        first = asyncio.ensure_future(flights.do('k', fn))
+        second = asyncio.ensure_future(flights.do('k', fn))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == 'result'
+    assert calls == [1]
+    assert flights.shared == 1
+
+
+def test_service_caches_completions_and_coalesces_identical_prompts(tmp_path, monkeypatch):
+    monkeypatch.setenv('AI_STUB_LATENCY_MS', '50')
+    service = AIService(str(tmp_path), provider='stub')
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(service.generate('Write a policy')))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(results)) == 1
+    assert results[0].startswith('[stub ')
+    assert service.generate('Write a policy') == results[0]
+    stats = service.stats()
+    assert stats['upstream_calls'] == 1
+    assert stats['cache']['entries'] == 1
+
+
+def test_async_service_shares_the_upstream_call(tmp_path, monkeypatch):
+    monkeypatch.setenv('AI_STUB_LATENCY_MS', '20')
+    service = AIService(str(tmp_path), provider='stub')
+
+    async def run():
+        return await asyncio.gather(*(service.agenerate('Write a policy') for _ in range(3)))
+
+    results = asyncio.run(run())
+    assert len(set(results)) == 1
+    assert service.stats()['upstream_calls'] == 1
+    assert service.stats()['shared_calls'] == 2
+
+
+def test_provider_errors_are_not_cached(tmp_path, monkeypatch):
+    monkeypatch.delenv('OPENAI_API_KEY', raising=False)
+    service = AIService(str(tmp_path), provider='openai')
+    assert 'not configured' in service.generate('Write a policy')
+    assert service.stats()['cache']['entries'] == 0
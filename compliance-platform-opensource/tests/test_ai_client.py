@@ -0,0 +1,174 @@
+import asyncio
+import time
+
+import pytest
+
+from services.ai_client import CircuitBreaker, CircuitOpen, ProviderClient, TokenBucket, UpstreamError
+
+
+def open_client():
+    """A client whose breaker has just opened and is ready for a trial call"""
+    client = ProviderClient('test', rate=1000, burst=1000, max_retries=0,
+                            breaker=CircuitBreaker(threshold=1, reset_timeout=0.05))
+
+    def fail():
+        raise UpstreamError("down", status=503, retryable=True)
+
+    with pytest.raises(UpstreamError):
+        client.call(fail)
+    assert client.breaker.state == 'open'
+    with pytest.raises(CircuitOpen):
+        client.call(lambda: 'refused')
+    time.sleep(0.06)
+    return client
+
+
+def test_cancelled_async_trial_releases_the_breaker():
+    client = open_client()
+
+    async def run():
+        started = asyncio.Event()
+
+        async def slow():
+            started.set()
+            await asyncio.sleep(10)
+
+        trial = asyncio.ensure_future(client.acall(slow))
+        await started.wait()
+        assert client.breaker.state == 'half_open'
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+
+        async def ok():
+            return 'ok'
+
+        return await client.acall(ok)
+
+    assert asyncio.run(run()) == 'ok'
+    assert client.breaker.state == 'closed'
+
+
+def test_interrupted_sync_trial_releases_the_breaker():
+    client = open_client()
+
+    def interrupted():
+        raise KeyboardInterrupt()
+
+    with pytest.raises(KeyboardInterrupt):
+        client.call(interrupted)
+    assert client.breaker.state == 'open'
+    assert client.call(lambda: 'ok') == 'ok'
+    assert client.breaker.state == 'closed'
+
+
+def test_cancelling_a_call_that_is_not_the_trial_leaves_the_breaker_alone():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=60)
+    assert breaker.allow() is False
+    breaker.failure()
+    breaker.abandon(False)
+    assert breaker.state == 'open'
+
+
+def flaky(failures, status=503):
+    """A call that fails `failures` times with `status`, then returns 'ok'"""
+    attempts = []
+
+    def fn():
+        attempts.append(1)
+        if len(attempts) <= failures:
+            raise UpstreamError("busy", status=status, retryable=status in (429, 503))
+        return 'ok'
+
+    return fn, attempts
+
+
+def test_retryable_errors_are_retried():
+    client = ProviderClient('test', rate=1000, burst=1000, max_retries=3, backoff=0.001)
+    fn, attempts = flaky(2)
+    assert client.call(fn) == 'ok'
+    assert len(attempts) == 3
+    stats = client.stats()
+    assert stats['retries'] == 2
+    assert stats['failures'] == 0
+    assert stats['circuit'] == 'closed'
+
+
+def test_retries_give_up_after_max_retries():
+    client = ProviderClient('test', rate=1000, burst=1000, max_retries=2, backoff=0.001)
+    fn, attempts = flaky(5)
+    with pytest.raises(UpstreamError):
+        client.call(fn)
+    assert len(attempts) == 3
+    assert client.stats()['failures'] == 1
+
+
+def test_client_errors_are_not_retried_and_do_not_trip_the_breaker():
+    client = ProviderClient('test', rate=1000, burst=1000, max_retries=3,
+                            breaker=CircuitBreaker(threshold=1, reset_timeout=60))
+    fn, attempts = flaky(1, status=400)
+    with pytest.raises(UpstreamError):
+        client.call(fn)
+    assert len(attempts) == 1
+    assert client.breaker.state == 'closed'
+
+
+def test_retry_after_sets_the_delay():
+    client = ProviderClient('test', rate=1000, burst=1000, max_retries=1)
+    error = UpstreamError("rate limited", status=429, retryable=True, retry_after=0.05)
+    assert client._failed(error, 0, 0.0) == 0.05
+    # Never longer than max_backoff
+    error.retry_after = 600
+    assert client._failed(error, 0, 0.0) == client.max_backoff
+
+
+def test_async_calls_are_retried():
+    client = ProviderClient('test', rate=1000, burst=1000, max_retries=3, backoff=0.001)
+    fn, attempts = flaky(1)
+
+    async def afn():
+        return fn()
+
+    assert asyncio.run(client.acall(afn)) == 'ok'
+    assert len(attempts) == 2
+
+
+def test_token_bucket_allows_a_burst_then_the_rate():
+    bucket = TokenBucket(rate=20, burst=3)
+    start = time.monotonic()
+    for _ in range(3):
+        assert bucket.acquire(timeout=0)
+    assert time.monotonic() - start < 0.04
+    assert not bucket.acquire(timeout=0)
+    # The next token arrives after 1 / rate seconds
+    assert bucket.acquire(timeout=0.2)
+    assert time.monotonic() - start >= 0.04
+
+
+def test_breaker_opens_after_consecutive_failures():
+    client = ProviderClient('test', rate=1000, burst=1000, max_retries=0,
+                            breaker=CircuitBreaker(threshold=3, reset_timeout=60))
+    for _ in range(3):
+        with pytest.raises(UpstreamError):
+            client.call(flaky(1)[0])
+    with pytest.raises(CircuitOpen):
+        client.call(lambda: 'refused')
+    assert client.stats()['circuit'] == 'open'
+    assert client.stats()['circuit_opened'] == 1
+
+
+def test_a_successful_call_resets_the_failure_count():
+    breaker = CircuitBreaker(threshold=2, reset_timeout=60)
+    breaker.failure()
+    breaker.success()
+    breaker.failure()
+    assert breaker.state == 'closed'
+
+
+def test_a_failed_trial_reopens_the_breaker():
+    client = open_client()
+    with pytest.raises(UpstreamError):
+        client.call(flaky(1)[0])
+    assert client.breaker.state == 'open'
+    with pytest.raises(CircuitOpen):
+        client.call(lambda: 'refused')
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                'benchmarks'))
+from mock_ai_server import MockAIServer  # noqa: E402
+
+
+@pytest.fixture
+def mock():
+    server = MockAIServer(latency=0.5, tokens=5).start()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def asgi(tmp_path, monkeypatch, mock):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('AI_PROVIDER', 'stub')
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    monkeypatch.setenv('OPENAI_BASE_URL', mock.url)
+    monkeypatch.setenv('AI_RATE_LIMIT', '1000')
+    monkeypatch.setenv('AI_MAX_RETRIES', '0')
+    import asgi
+    from services.ai_client import CircuitBreaker
+    from services.ai_service import AIService
+    service = AIService(data_dir=str(tmp_path), provider='openai')
+    service._client('openai').breaker = CircuitBreaker(threshold=1, reset_timeout=0.05)
+    monkeypatch.setattr(asgi, 'ai_service', service)
+    return asgi
+
+
+async def request(app, path, body, disconnect=None):
+    """Run one request through the ASGI app; the client disconnects when `disconnect` is set"""
+    sent = []
+    messages = [{'type': 'http.request', 'body': json.dumps(body).encode(), 'more_body': False}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await (disconnect.wait() if disconnect else asyncio.Event().wait())
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': 'POST', 'path': path, 'query_string': b'', 'headers': [],
+             'http_version': '1.1'}
+    await app(scope, receive, send)
+    return sent
+
+
+def test_disconnect_during_half_open_trial_does_not_stop_ai_traffic(asgi):
+    breaker = asgi.ai_service._client('openai').breaker
+
+    async def run():
+        breaker.failure()
+        await asyncio.sleep(0.06)
+        disconnect = asyncio.Event()
+        stream = asyncio.ensure_future(
+            request(asgi.app, '/generate-policy/stream', {'policy_type': 'Trial', 'framework': 'SOC 2'}, disconnect))
+        # The trial call is waiting on the upstream when the browser tab closes
+        while breaker.state != 'half_open':
+            await asyncio.sleep(0.01)
+        disconnect.set()
+        await stream
+        assert breaker.state == 'open'
+        return await request(asgi.app, '/generate-policy/stream', {'policy_type': 'Next', 'framework': 'SOC 2'})
+
+    sent = asyncio.run(run())
+    body = b''.join(message.get('body', b'') for message in sent)
+    assert b'event: done' in body
+    assert b'token0' in body
+    assert breaker.state == 'closed'
+
+
+def test_bodies_past_the_spool_size_reach_the_route(asgi):
+    payload = json.dumps({'policy_type': 'Large', 'framework': 'SOC 2', 'notes': 'x' * (2 * asgi.SPOOL_BYTES)}).encode()
+    chunks = [payload[i:i + 256 * 1024] for i in range(0, len(payload), 256 * 1024)]
+    messages = [{'type': 'http.request', 'body': chunk, 'more_body': i < len(chunks) - 1}
+                for i, chunk in enumerate(chunks)]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.Event().wait()
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': 'POST', 'path': '/generate-policy', 'query_string': b'', 'headers': [],
+             'http_version': '1.1'}
+    asyncio.run(asgi.app(scope, receive, send))
+    assert sent[0]['status'] == 200
+    assert 'policy_content' in json.loads(sent[1]['body'])
+
+
+def test_unhandled_wsgi_errors_are_logged_and_answered_with_500(asgi, caplog):
+    def broken(environ, start_response):
+        raise RuntimeError("boom")
+
+    bridge = asgi.WSGIBridge(broken, 1, 'test')
+    sent = []
+
+    async def run():
+        body = await asgi.read_body(lambda: asyncio.sleep(0, {'type': 'http.request', 'body': b''}))
+
+        async def receive():
+            await asyncio.Event().wait()
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'method': 'GET', 'path': '/broken', 'query_string': b'', 'headers': [],
+                 'http_version': '1.1'}
+        await bridge(scope, receive, send, body)
+
+    with caplog.at_level('ERROR', logger='asgi'):
+        asyncio.run(run())
+    bridge.close()
+    assert sent[0]['status'] == 500
+    record, = caplog.records
+    assert record.getMessage() == "Unhandled error in GET /broken"
+    assert isinstance(record.exc_info[1], RuntimeError)
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('AI_PROVIDER', 'stub')
+    monkeypatch.setenv('AUTH_SCRYPT_N', '16')
+    monkeypatch.delenv('AUTH_SECRET', raising=False)
+    import local_server
+    from services.user_manager import UserManager
+    # Serve from a tree laid out like the app directory, with the data directory inside it
+    (tmp_path / 'css').mkdir()
+    (tmp_path / 'css' / 'site.css').write_text('body {}')
+    (tmp_path / 'index.html').write_text('<html></html>')
+    monkeypatch.setattr(local_server.app, 'root_path', str(tmp_path))
+    monkeypatch.setattr(local_server, 'user_manager', UserManager(str(tmp_path / 'data')))
+    monkeypatch.setattr(local_server, 'AUTH_REQUIRED', True)
+    return local_server.app.test_client()
+
+
+def test_data_files_are_not_served(client, tmp_path):
+    assert (tmp_path / 'data' / 'auth_secret').exists()
+    assert (tmp_path / 'data' / 'users.json').exists()
+    for path in ('/data/auth_secret', '/data/users.json', '/local_server.py', '/css/../data/auth_secret'):
+        assert client.get(path).status_code == 404, path
+
+
+def test_static_assets_stay_public(client):
+    response = client.get('/css/site.css')
+    assert response.status_code == 200
+    assert response.data == b'body {}'
+
+
+def test_token_is_required_and_accepted(client):
+    assert client.get('/frameworks').status_code == 401
+    token = client.post('/auth/login', json={'username': 'admin', 'password': 'admin123'}).json['token']
+    response = client.get('/auth/session', headers={'Authorization': f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.json['username'] == 'admin'
+
+
+def login(client, username, password):
+    token = client.post('/auth/login', json={'username': username, 'password': password}).json.get('token')
+    return {'Authorization': f"Bearer {token}"} if token else None
+
+
+@pytest.mark.parametrize('token', ['abc.é', 'é', 'eyJ9.sig', '.', 'bm90IGpzb24.x'])
+def test_malformed_tokens_are_rejected_not_errors(client, token):
+    headers = {'Authorization': f"Bearer {token}"}
+    assert client.get('/', headers=headers).status_code == 200
+    assert client.get('/css/site.css', headers=headers).status_code == 200
+    assert client.get('/frameworks', headers=headers).status_code == 401
+
+
+def test_only_admins_register_users_when_auth_is_required(client):
+    anonymous = client.post('/auth/register', json={'username': 'eve', 'password': 'pw'})
+    assert anonymous.status_code == 401
+    assert login(client, 'eve', 'pw') is None
+
+    admin = login(client, 'admin', 'admin123')
+    created = client.post('/auth/register', json={'username': 'bob', 'password': 'pw'}, headers=admin)
+    assert created.json['success'] is True
+    bob = login(client, 'bob', 'pw')
+    assert client.post('/auth/register', json={'username': 'carol', 'password': 'pw'}, headers=bob).status_code == 403
+    assert client.post('/save-controls', json=[], headers={}).status_code == 401
+
+
+def test_open_registration_without_auth_required(client, monkeypatch):
+    import local_server
+    monkeypatch.setattr(local_server, 'AUTH_REQUIRED', False)
+    assert client.post('/auth/register', json={'username': 'dave', 'password': 'pw'}).json['success'] is True
@@ -0,0 +1,206 @@
+import json
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from services.ai_service import AIService, ProviderError
+from services.policy_batch import DONE, FAILED, PENDING, RUNNING, PolicyBatches, PolicyStore
+
+CONTROLS = [{'control_id': 'AC-1', 'area': 'Access Control'}, {'control_id': 'IR-1', 'area': 'Incident Response'}]
+
+
+class GatedService(AIService):
+    """Stub completions that wait for `gate`, recording the peak number running at once"""
+
+    def __init__(self, data_dir, fail=()):
+        super().__init__(data_dir, provider='stub')
+        self.gate = threading.Event()
+        self.fail = fail
+        self.active = 0
+        self.peak = 0
+        self._count = threading.Lock()
+
+    def complete(self, prompt, max_tokens=1500, provider=None):
+        with self._count:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            self.gate.wait(5)
+            if any(area in prompt for area in self.fail):
+                raise ProviderError("AI generation failed: upstream down")
+            return super().complete(prompt, max_tokens, provider)
+        finally:
+            with self._count:
+                self.active -= 1
+
+
+@pytest.fixture
+def service(tmp_path):
+    service = GatedService(str(tmp_path))
+    yield service
+    service.gate.set()
+
+
+def batches(tmp_path, service, workers=4):
+    return PolicyBatches(str(tmp_path / 'policy_batches.db'), service,
+                         PolicyStore(str(tmp_path / 'policies.json')), workers=workers)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_batch_generates_every_control_and_type(tmp_path, service):
+    service.gate.set()
+    runner = batches(tmp_path, service)
+    try:
+        batch = runner.submit('SOC 2', CONTROLS)
+        assert batch['total'] == 4
+        items = list(runner.follow(batch['id']))
+        assert sorted((item['control_id'], item['type']) for item in items) == [
+            ('AC-1', 'policy'), ('AC-1', 'procedure'), ('IR-1', 'policy'), ('IR-1', 'procedure')]
+        assert [item['finished'] for item in items] == [1, 2, 3, 4]
+        assert all(item['status'] == DONE and item['content'] for item in items)
+        assert runner.get(batch['id'])['status'] == DONE
+        assert runner.stats() == {PENDING: 0, RUNNING: 0, DONE: 4, FAILED: 0}
+    finally:
+        runner.close()
+    policies = json.loads((tmp_path / 'policies.json').read_text())
+    assert len(policies) == 4
+    assert {p['title'] for p in policies} >= {'Access Control Policy', 'Incident Response Procedure'}
+    assert all(p['framework'] == 'SOC 2' for p in policies)
+
+
+def test_workers_bound_the_concurrent_generations(tmp_path, service):
+    runner = batches(tmp_path, service, workers=2)
+    try:
+        batch = runner.submit('SOC 2', CONTROLS * 2)
+        wait_for(lambda: service.active == 2)
+        time.sleep(0.05)
+        assert runner.get(batch['id'])[RUNNING] == 2
+        assert runner.get(batch['id'])[PENDING] == 6
+        service.gate.set()
+        assert len(list(runner.follow(batch['id']))) == 8
+        assert service.peak == 2
+    finally:
+        runner.close()
+
+
+def test_failed_items_do_not_stop_the_batch(tmp_path):
+    service = GatedService(str(tmp_path), fail=('Incident Response',))
+    service.gate.set()
+    runner = batches(tmp_path, service)
+    try:
+        batch = runner.submit('SOC 2', CONTROLS, types=('policy',))
+        items = {item['control_id']: item for item in runner.follow(batch['id'])}
+        assert items['AC-1']['status'] == DONE
+        assert items['IR-1']['status'] == FAILED
+        assert 'upstream down' in items['IR-1']['error']
+        assert items['IR-1']['policy_id'] is None
+        finished = runner.get(batch['id'])
+        assert (finished['status'], finished[DONE], finished[FAILED]) == (DONE, 1, 1)
+    finally:
+        runner.close()
+
+
+def test_unfinished_items_resume_after_a_restart(tmp_path, service):
+    runner = batches(tmp_path, service, workers=1)
+    batch = runner.submit('SOC 2', CONTROLS)
+    wait_for(lambda: service.active == 1)
+    runner.close()
+    # The interrupted generation finishing late records nothing
+    service.gate.set()
+    wait_for(lambda: service.active == 0)
+
+    restarted = batches(tmp_path, service)
+    try:
+        assert restarted.get(batch['id'])[PENDING] == 4
+        restarted.start()
+        items = list(restarted.follow(batch['id']))
+        assert len(items) == 4
+        assert restarted.get(batch['id'])['status'] == DONE
+    finally:
+        restarted.close()
+
+
+def test_items_of_a_dead_process_are_pending_again_on_start(tmp_path, service):
+    runner = batches(tmp_path, service)
+    runner._stopped = True
+    batch = runner.submit('SOC 2', CONTROLS[:1], types=('policy',))
+    dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+    dead.wait()
+    runner._conn.execute("UPDATE batch_items SET status = ?, owner = ?", (RUNNING, dead.pid))
+    runner.close()
+
+    service.gate.set()
+    restarted = batches(tmp_path, service)
+    try:
+        restarted.start()
+        assert [item['status'] for item in restarted.follow(batch['id'])] == [DONE]
+    finally:
+        restarted.close()
+
+
+def test_saving_a_control_again_replaces_it(tmp_path):
+    store = PolicyStore(str(tmp_path / 'policies.json'))
+    first = store.save('AC-1', 'policy', 'Access Control Policy', 'v1')
+    other = store.save('AC-1', 'procedure', 'Access Control Procedure', 'v1')
+    again = store.save('AC-1', 'policy', 'Access Control Policy', 'v2')
+    assert again['id'] == first['id'] != other['id']
+    assert [p['content'] for p in store.load()] == ['v2', 'v1']
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch, service):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('AI_PROVIDER', 'stub')
+    import local_server
+    service.gate.set()
+    runner = batches(tmp_path, service)
+    monkeypatch.setattr(local_server, 'policy_batches', runner)
+    monkeypatch.setattr(local_server, 'ai_service', service)
+    monkeypatch.setattr(local_server, 'AUTH_REQUIRED', False)
+    yield local_server
+    runner.close()
+
+
+def test_batch_route_validates_the_request(server):
+    client = server.app.test_client()
+    assert client.post('/generate-policies/batch', json={'controls': ['Access Control']}).status_code == 400
+    assert client.post('/generate-policies/batch', json={'framework': 'SOC 2', 'controls': [{}]}).status_code == 400
+    response = client.post('/generate-policies/batch',
+                           json={'framework': 'SOC 2', 'controls': ['Access Control'], 'types': ['memo']})
+    assert response.status_code == 400
+
+
+def test_batch_route_streams_items_then_done(server):
+    client = server.app.test_client()
+    response = client.post('/generate-policies/batch', json={
+        'framework': 'SOC 2',
+        'controls': [{'control_id': 'AC-1', 'control_area': 'Access Control'}, 'Incident Response']})
+    assert response.mimetype == 'text/event-stream'
+    received = [block.split('\n', 1) for block in response.get_data(as_text=True).strip().split('\n\n')]
+    names = [event for event, data in received]
+    assert names == ['event: batch'] + ['event: item'] * 4 + ['event: done']
+    done = json.loads(received[-1][1][len('data: '):])
+    assert (done['status'], done[DONE]) == (DONE, 4)
+
+
+def test_batch_can_be_submitted_and_polled(server):
+    client = server.app.test_client()
+    response = client.post('/generate-policies/batch?stream=0',
+                           json={'framework': 'SOC 2', 'controls': ['Access Control'], 'types': ['policy']})
+    assert response.status_code == 202
+    batch_id = response.get_json()['id']
+    wait_for(lambda: client.get(f'/generate-policies/batch/{batch_id}').get_json()['status'] == DONE)
+    batch = client.get(f'/generate-policies/batch/{batch_id}').get_json()
+    assert [item['control_id'] for item in batch['items']] == ['Access Control']
+    assert client.get('/ai/stats').get_json()['batch_items'][DONE] == 1
+    assert client.get('/generate-policies/batch/missing').status_code == 404
+    assert client.get('/generate-policies/batch/missing/stream').status_code == 404
@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('AI_PROVIDER', 'stub')
+    monkeypatch.delenv('OPENAI_API_KEY', raising=False)
+    import local_server
+    from services.ai_service import AIService
+    monkeypatch.setattr(local_server, 'ai_service', AIService(str(tmp_path), provider='stub'))
+    monkeypatch.setattr(local_server, 'AUTH_REQUIRED', False)
+    return local_server
+
+
+def events(body):
+    """(event, data) for each server-sent event in `body`, skipping comments"""
+    parsed = []
+    for block in body.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+        if fields:
+            parsed.append((fields.get('event', 'message'), json.loads(fields['data'])))
+    return parsed
+
+
+def test_policy_streams_pieces_then_done(server):
+    response = server.app.test_client().post(
+        '/generate-policy/stream', json={'policy_type': 'Access Control', 'framework': 'SOC 2'})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    received = events(response.get_data(as_text=True))
+    assert received[-1] == ('done', {})
+    pieces = [data['text'] for event, data in received[:-1]]
+    assert len(pieces) > 1
+    assert all(event == 'message' for event, data in received[:-1])
+    # The pieces make up the same text the blocking route returns
+    policy = server.app.test_client().post(
+        '/generate-policy', json={'policy_type': 'Access Control', 'framework': 'SOC 2'}).get_json()
+    assert ''.join(pieces) == policy['policy_content']
+
+
+def test_audit_plan_streams_from_query_parameters(server):
+    response = server.app.test_client().get('/generate-audit-plan/stream?framework=HIPAA&scope=Billing')
+    received = events(response.get_data(as_text=True))
+    assert received[-1] == ('done', {})
+    assert 'HIPAA audit plan for: Billing' in received[0][1]['text']
+
+
+def test_finished_stream_is_cached(server):
+    client = server.app.test_client()
+    body = {'policy_type': 'Access Control', 'framework': 'SOC 2'}
+    first = events(client.post('/generate-policy/stream', json=body).get_data(as_text=True))
+    second = events(client.post('/generate-policy/stream', json=body).get_data(as_text=True))
+    # From the cache the whole text is one event
+    assert len(second) == 2
+    assert second[0][1]['text'] == ''.join(data['text'] for event, data in first[:-1])
+    stats = client.get('/ai/stats').get_json()
+    assert stats['streams'] == 1
+    assert stats['upstream_calls'] == 1
+
+
+def test_provider_failure_is_an_error_event(server, tmp_path, monkeypatch):
+    from services.ai_service import AIService
+    monkeypatch.setattr(server, 'ai_service', AIService(str(tmp_path), provider='openai'))
+    response = server.app.test_client().post(
+        '/generate-policy/stream', json={'policy_type': 'Access Control', 'framework': 'SOC 2'})
+    assert response.status_code == 200
+    received = events(response.get_data(as_text=True))
+    assert len(received) == 1
+    event, data = received[0]
+    assert event == 'error'
+    assert 'not configured' in data['error']
+    assert server.ai_service.stats()['cache']['entries'] == 0
+
+
+def test_client_disconnect_cancels_the_generation(server):
+    response = server.app.test_client().post(
+        '/generate-policy/stream', json={'policy_type': 'Access Control', 'framework': 'SOC 2'}, buffered=False)
+    chunks = iter(response.response)
+    assert next(chunks).startswith(b': generating')
+    assert next(chunks).startswith(b'data: ')
+    response.close()
+    stats = server.ai_service.stats()
+    assert stats['cancelled_streams'] == 1
+    # A partial completion is not cached
+    assert stats['cache']['entries'] == 0
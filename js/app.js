@@ -728,11 +728,31 @@ class CompliancePlatform {
         }
     }
 
-    exportReport(reportId, format) {
+    async exportReport(reportId, format) {
         this.showNotification("Exporting report as " + format.toUpperCase() + "...", 'info');
-        setTimeout(() => {
+        try {
+            const response = await fetch('/api/reports/export/' + format, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({})
+            });
+            let job = await response.json();
+            if (!response.ok) {
+                throw new Error(job.error || response.statusText);
+            }
+            // Long-poll until the export job has finished rendering
+            while (job.status === 'queued' || job.status === 'running') {
+                job = await (await fetch(job.status_url + '?wait=25')).json();
+            }
+            if (job.status !== 'done') {
+                throw new Error(job.error || job.status);
+            }
+            window.location.href = job.download_url;
             this.showNotification("Report exported successfully as " + format.toUpperCase(), 'success');
-        }, 1500);
+        } catch (error) {
+            console.error('Error exporting report:', error);
+            this.showNotification("Report export failed: " + error.message, 'error');
+        }
     }
 
     exportData() {
@@ -1,9 +1,228 @@
-﻿from flask import Flask, jsonify, request, send_file, send_from_directory
+﻿from flask import Flask, g, jsonify, request, send_file, send_from_directory
+import argparse
+import functools
+import glob
+import hashlib
 import json
 import os
+import sys
+import time
 from datetime import datetime
+from services.app_logging import configure_logging, get_logger
+from services.assets import AssetPipeline
+from services.compliance_counters import ComplianceCounters, compliance_score
+from services.control_catalog import ControlCatalog
+from services.export_cache import ExportCache
+from services.export_jobs import ExportJobs, QueueFull
+from services.compression import base_etag, compress, compress_stream, encoded_etag, etag_matches, negotiate
+from services.gap_engine import GapEngine
+from services.ingest import DEFAULTS, EXTERNAL_ID, ParseError, parse_records
+from services.metrics import Metrics, instrument_storage
+from services.pagination import decode_cursor, encode_cursor, parse_fields, shape
+from services.read_cache import ReadCache
+from services.record_index import RecordIndex
+from services.report_export import FORMATS as REPORT_FORMATS, init_worker as init_report_worker, render as render_report
+from services.storage import ConflictError, DuplicateIdError, open_storage, record_etag
 
 app = Flask(__name__)
+# Compact JSON even under the debugger; indentation only inflates responses
+app.json.compact = True
+
+# Queue-backed logging; verbosity set with LOG_LEVEL (DEBUG, INFO, WARNING, ...)
+configure_logging()
+logger = get_logger('compliance')
+
+# Per-route latency, status and size metrics plus storage timings, served on /metrics
+metrics = Metrics()
+
+DATA_DIR = os.getenv('COMPLIANCE_DATA_DIR', 'data')
+
+# All handlers read and write through the storage layer (SQLite by default,
+# legacy data/*.json files are imported on first start)
+storage = instrument_storage(open_storage(data_dir=DATA_DIR), metrics)
+
+# id -> record maps behind the per-record endpoints
+record_indexes = {
+    'assessments': RecordIndex(storage, 'assessments'),
+    'controls': RecordIndex(storage, 'controls')
+}
+
+# Compliance score totals, kept up to date as assessments are written
+compliance_counters = ComplianceCounters(storage)
+
+# Failing controls ranked by risk; weights can be tuned with GAP_WEIGHTS (JSON)
+gap_engine = GapEngine(storage, weights=json.loads(os.getenv('GAP_WEIGHTS', '{}')))
+
+# css/, js/ and the HTML pages, fingerprinted and precompressed in memory
+assets = AssetPipeline(os.path.dirname(os.path.abspath(__file__)))
+
+# Control templates for /api/generate-controls (CONTROL_CATALOG overrides the bundled file)
+control_catalog = ControlCatalog(os.getenv('CONTROL_CATALOG') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'services', 'control_catalog.json'))
+
+# Finished exports keyed by data version, format and parameters, evicted LRU by
+# size and age (EXPORT_CACHE_MAX_MB, EXPORT_CACHE_MAX_AGE_HOURS)
+EXPORT_DIR = os.getenv('EXPORT_DIR', 'exports')
+export_cache = ExportCache(EXPORT_DIR, max_bytes=int(float(os.getenv('EXPORT_CACHE_MAX_MB', '500')) * 1024 * 1024),
+                           max_age=float(os.getenv('EXPORT_CACHE_MAX_AGE_HOURS', '168')) * 3600)
+
+# Report exports rendered off the request path on a process pool; the job table
+# survives restarts (EXPORT_WORKERS, EXPORT_QUEUE_LIMIT, EXPORT_JOBS_KEEP finished jobs)
+export_jobs = ExportJobs(os.path.join(DATA_DIR, 'export_jobs.db'), EXPORT_DIR, render_report, init_report_worker,
+                         context={'backend': storage.name, 'data_dir': os.path.abspath(DATA_DIR)},
+                         max_workers=int(os.getenv('EXPORT_WORKERS', '2')),
+                         max_queued=int(os.getenv('EXPORT_QUEUE_LIMIT', '100')),
+                         cache=export_cache, max_finished=int(os.getenv('EXPORT_JOBS_KEEP', '1000')))
+
+# Parsed and serialized list responses, reused until a write bumps the version
+read_cache = ReadCache(storage, dumps=app.json.dumps)
+metrics.add_collector(lambda: [
+    '# HELP read_cache_requests_total Read cache lookups by result',
+    '# TYPE read_cache_requests_total counter',
+    f'read_cache_requests_total{{result="hit"}} {read_cache.stats()["hits"]}',
+    f'read_cache_requests_total{{result="miss"}} {read_cache.stats()["misses"]}'
+])
+metrics.add_collector(lambda: [
+    '# HELP export_jobs Export jobs by status',
+    '# TYPE export_jobs gauge'
+] + [f'export_jobs{{status="{status}"}} {count}' for status, count in export_jobs.stats().items()])
+metrics.add_collector(lambda: [
+    '# HELP export_cache_requests_total Export requests by how they were served',
+    '# TYPE export_cache_requests_total counter',
+    f'export_cache_requests_total{{result="hit"}} {export_cache.hits}',
+    f'export_cache_requests_total{{result="shared"}} {export_jobs.shared}',
+    f'export_cache_requests_total{{result="miss"}} {export_cache.misses}',
+    '# HELP export_cache_evictions_total Export artifacts removed by age or size',
+    '# TYPE export_cache_evictions_total counter',
+    f'export_cache_evictions_total {export_cache.evictions}'
+])
+
+# Part of every data ETag, so a deploy that changes response formats also changes the tags
+def _code_version():
+    root = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha1()
+    for path in [os.path.join(root, 'local_server.py')] + sorted(glob.glob(os.path.join(root, 'services', '*.py'))):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+CODE_VERSION = _code_version()
+
+def data_etag(collections):
+    """Strong ETag from the storage versions of `collections` plus the request's URL and Accept header"""
+    versions = ','.join(f"{c}={storage.version(c)}" for c in collections)
+    key = f"{CODE_VERSION}|{storage.instance_id}|{versions}|{request.full_path}|{request.headers.get('Accept', '')}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def conditional(*collections):
+    """GET responses tagged with data_etag(collections); a matching If-None-Match gets 304
+    before the handler runs, so unchanged polls do no reads or aggregation."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET':
+                return view(*args, **kwargs)
+            # Versions are read before the handler: a write racing with it can only make the tag stale
+            etag = data_etag(collections)
+            if etag_matches(request.if_none_match, etag):
+                return not_modified(etag)
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+            return response
+        return wrapper
+    return decorator
+
+def not_modified(etag):
+    """304 echoing whichever representation's ETag (plain or compressed) the client holds"""
+    response = app.response_class(status=304)
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate(request.accept_encodings)
+    held = encoded_etag(etag, encoding) if encoding else None
+    response.set_etag(held if held and request.if_none_match.contains(held) else etag)
+    return response
+
+# API JSON bodies smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', '1024'))
+
+MAX_PAGE_SIZE = 500
+DEFAULT_PAGE_SIZE = 100
+
+STREAM_CHUNK_BYTES = 64 * 1024
+
+def stream_response(collection, fields=None, summary=False, ndjson=False):
+    """Chunked JSON array or NDJSON generated straight from the storage iterator"""
+    def generate():
+        if fields or summary:
+            items = (app.json.dumps(shape(r, fields, summary)) for r in storage.iter(collection))
+        else:
+            items = storage.iter_raw(collection)
+        chunk, size = ([] if ndjson else ['[']), 0
+        for index, item in enumerate(items):
+            if ndjson:
+                chunk.append(item + '\n')
+            else:
+                chunk.append(item if index == 0 else ',' + item)
+            size += len(item)
+            if size >= STREAM_CHUNK_BYTES:
+                yield ''.join(chunk)
+                chunk, size = [], 0
+        if not ndjson:
+            chunk.append(']')
+        if chunk:
+            yield ''.join(chunk)
+    
+    mimetype = 'application/x-ndjson' if ndjson else 'application/json'
+    return app.response_class(generate(), mimetype=mimetype)
+
+def list_response(collection):
+    """GET handler for a collection.
+    
+    Supports ?limit=&cursor= paging (next cursor in X-Next-Cursor), ?fields=a,b
+    projection, ?summary=1, which replaces embedded lists such as an
+    assessment's controls with their count, and ?stream=json|ndjson.
+    """
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor')
+    fields = parse_fields(request.args.get('fields'))
+    summary = request.args.get('summary', '').lower() in ('1', 'true', 'yes')
+    stream = request.args.get('stream', '').lower()
+    
+    if stream in ('1', 'true', 'json', 'ndjson') or request.accept_mimetypes.best == 'application/x-ndjson':
+        ndjson = stream == 'ndjson' or request.accept_mimetypes.best == 'application/x-ndjson'
+        return stream_response(collection, fields, summary, ndjson)
+    
+    if limit is None and cursor is None:
+        # Whole collection: served from the read cache, one entry per shape
+        if fields or summary:
+            entry = read_cache.get(collection, variant=(tuple(fields or ()), summary),
+                                   build=lambda: [shape(r, fields, summary) for r in storage.iter(collection)])
+        else:
+            entry = read_cache.get(collection)
+        response = app.response_class(entry.body, mimetype='application/json')
+        # Lets compress_response reuse the entry's compressed bytes
+        response.cache_entry = entry
+        return response
+    
+    limit = min(max(limit or DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE)
+    try:
+        after = decode_cursor(cursor, (int,))[0] if cursor else 0
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    records, next_seq = storage.page(collection, after=after, limit=limit)
+    response = jsonify([shape(r, fields, summary) for r in records])
+    if next_seq is not None:
+        response.headers['X-Next-Cursor'] = encode_cursor((next_seq,))
+    return response
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.before_request
+def start_export_jobs():
+    # On the first request rather than at import, so a pre-fork master never runs jobs
+    export_jobs.start()
 
 # Enable CORS for all routes
 @app.after_request
@@ -11,235 +230,272 @@ def after_request(response):
     response.headers.add('Access-Control-Allow-Origin', '*')
     response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
     response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
+    compress_response(response)
+    record_request_metrics(response)
     return response
 
+def compress_response(response):
+    """Negotiated gzip/br/zstd for API JSON responses; read-cache hits reuse compressed bytes"""
+    if not request.path.startswith('/api/') or response.status_code != 200:
+        return
+    if response.mimetype not in ('application/json', 'application/x-ndjson') or 'Content-Encoding' in response.headers:
+        return
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate(request.accept_encodings)
+    if encoding is None:
+        return
+    if response.is_streamed:
+        response.response = compress_stream(response.iter_encoded(), encoding)
+    elif response.content_length < COMPRESS_MIN_BYTES:
+        return
+    else:
+        entry = getattr(response, 'cache_entry', None)
+        response.set_data(entry.encoded(encoding, compress) if entry else compress(response.get_data(), encoding))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(encoded_etag(etag, encoding))
+
+def record_request_metrics(response):
+    """Latency (up to the first byte for streamed bodies), status and sizes per route template"""
+    start = g.pop('request_start', None)
+    if start is None:
+        return
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.observe_request(request.method, route, response.status_code, time.perf_counter() - start,
+                            request_bytes=request.content_length,
+                            response_bytes=None if response.is_streamed else response.content_length)
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text exposition of this process's metrics"""
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+def asset_response(path):
+    asset = assets.get(path)
+    if asset is None:
+        return None
+    return assets.response(asset, request, app.response_class)
+
 # Serve main application
 @app.route('/')
 def index():
-    return send_file('index.html')
+    return asset_response('index.html') or send_file('index.html')
 
 # Serve static files
 @app.route('/<path:path>')
 def serve_static(path):
-    return send_from_directory('.', path)
+    return asset_response(path) or send_from_directory('.', path)
 
 # ============================================================================
 # CORE PLATFORM APIs
 # ============================================================================
 
 @app.route('/api/assessments', methods=['GET', 'POST'])
+@conditional('assessments')
 def handle_assessments():
     if request.method == 'GET':
         try:
-            os.makedirs('data', exist_ok=True)
-            if not os.path.exists('data/assessments.json'):
-                return jsonify([])
-                
-            with open('data/assessments.json', 'r') as f:
-                assessments = json.load(f)
-            return jsonify(assessments)
+            return list_response('assessments')
         except Exception as e:
-            print(f"Error loading assessments: {e}")
+            logger.error("Error loading assessments: %s", e)
             return jsonify([])
     
     elif request.method == 'POST':
         try:
             data = request.json
-            os.makedirs('data', exist_ok=True)
-            
-            if os.path.exists('data/assessments.json'):
-                with open('data/assessments.json', 'r') as f:
-                    assessments = json.load(f)
-            else:
-                assessments = []
-            
-            new_assessment = {
-                'id': len(assessments) + 1,
+            new_assessment = storage.insert('assessments', {
                 'name': data.get('name', 'New Assessment'),
                 'framework': data.get('framework', 'SOC 2'),
                 'infrastructure': data.get('infrastructure', []),
                 'controls': data.get('controls', []),
                 'created_at': datetime.now().isoformat()
-            }
-            
-            assessments.append(new_assessment)
-            
-            with open('data/assessments.json', 'w') as f:
-                json.dump(assessments, f, indent=2)
+            }, assign_id=True)
             
             return jsonify(new_assessment)
         except Exception as e:
-            print(f"Error saving assessment: {e}")
+            logger.error("Error saving assessment: %s", e)
             return jsonify({'error': str(e)}), 500
 
 @app.route('/api/controls', methods=['GET', 'POST'])
+@conditional('controls')
 def handle_controls():
     if request.method == 'GET':
         try:
-            os.makedirs('data', exist_ok=True)
-            if not os.path.exists('data/controls.json'):
-                return jsonify([])
-                
-            with open('data/controls.json', 'r') as f:
-                controls = json.load(f)
-            return jsonify(controls)
+            return list_response('controls')
         except Exception as e:
-            print(f"Error loading controls: {e}")
+            logger.error("Error loading controls: %s", e)
             return jsonify([])
     
     elif request.method == 'POST':
         try:
             data = request.json
-            os.makedirs('data', exist_ok=True)
-            
-            if os.path.exists('data/controls.json'):
-                with open('data/controls.json', 'r') as f:
-                    controls = json.load(f)
-            else:
-                controls = []
-            
-            controls.append(data)
-            
-            with open('data/controls.json', 'w') as f:
-                json.dump(controls, f, indent=2)
-            
+            storage.insert('controls', data)
             return jsonify(data)
         except Exception as e:
-            print(f"Error saving control: {e}")
+            logger.error("Error saving control: %s", e)
             return jsonify({'error': str(e)}), 500
 
+def record_response(collection, record_id):
+    """GET/PATCH/DELETE one record by id.
+    
+    Responses carry the record's ETag; PATCH and DELETE honour If-Match so a
+    stale edit gets 412 instead of overwriting someone else's change.
+    """
+    if request.method == 'GET':
+        record = record_indexes[collection].get(record_id)
+        if record is None:
+            return jsonify({'error': f'{collection} record {record_id} not found'}), 404
+        etag = record_etag(record)
+        if etag_matches(request.if_none_match, etag):
+            return not_modified(etag)
+        response = jsonify(record)
+        response.set_etag(etag)
+        return response
+    
+    # Clients may echo the ETag of a compressed representation
+    expected_etags = None if request.if_match.star_tag else {base_etag(tag) for tag in request.if_match}
+    try:
+        if request.method == 'PATCH':
+            changes = request.get_json(silent=True)
+            if not isinstance(changes, dict):
+                return jsonify({'error': 'PATCH body must be a JSON object'}), 400
+            record = storage.update(collection, record_id, changes, expected_etags=expected_etags)
+        else:
+            record = storage.delete(collection, record_id, expected_etags=expected_etags)
+    except ConflictError as e:
+        response = jsonify({'error': str(e), 'current': e.current})
+        response.set_etag(record_etag(e.current))
+        return response, 412
+    
+    if record is None:
+        return jsonify({'error': f'{collection} record {record_id} not found'}), 404
+    if request.method == 'DELETE':
+        return jsonify({'deleted': True, 'id': record.get('id')})
+    response = jsonify(record)
+    response.set_etag(record_etag(record))
+    return response
+
+@app.route('/api/assessments/<record_id>', methods=['GET', 'PATCH', 'DELETE'])
+def handle_assessment(record_id):
+    return record_response('assessments', record_id)
+
+@app.route('/api/controls/<record_id>', methods=['GET', 'PATCH', 'DELETE'])
+def handle_control(record_id):
+    return record_response('controls', record_id)
+
+@app.route('/api/controls/update', methods=['POST'])
+def update_control():
+    """Partial control update used by js/app.js ({id, progress, status})"""
+    data = request.get_json(silent=True) or {}
+    if data.get('id') is None:
+        return jsonify({'error': 'Control id is required'}), 400
+    changes = {k: v for k, v in data.items() if k != 'id'}
+    control = storage.update('controls', data['id'], changes)
+    if control is None:
+        return jsonify({'error': f"controls record {data['id']} not found"}), 404
+    return jsonify(control)
+
+@app.route('/api/assessments/bulk', methods=['POST'])
+def bulk_assessments():
+    return bulk_ingest('assessments')
+
+@app.route('/api/controls/bulk', methods=['POST'])
+def bulk_controls():
+    return bulk_ingest('controls')
+
+def bulk_ingest(collection):
+    """Write an NDJSON or JSON array body in one transaction.
+
+    Records are parsed and validated as the body streams in; invalid ones are
+    reported by index and skipped, the rest are committed together. With
+    ?upsert=1 records are matched on external_id and merged into the existing
+    record instead of inserted. A body that cannot be parsed to the end is
+    rejected as a whole.
+    """
+    upsert = request.args.get('upsert', '').lower() in ('1', 'true', 'yes')
+    records, positions, errors = [], [], []
+    try:
+        for index, record, error in parse_records(request.stream, request.mimetype, collection, upsert):
+            if error is None:
+                records.append(record)
+                positions.append(index)
+            else:
+                errors.append({'index': index, 'error': error})
+    except UnicodeDecodeError as e:
+        return jsonify({'error': f"Body is not valid UTF-8: {e.reason}"}), 400
+    except ParseError as e:
+        return jsonify({'error': str(e), 'index': e.index}), 400
+    received = len(records) + len(errors)
+    
+    try:
+        written = storage.bulk_write(collection, records, upsert_key=EXTERNAL_ID if upsert else None,
+                                     defaults=DEFAULTS[collection]()) if records else []
+    except DuplicateIdError as e:
+        return jsonify({'error': str(e), 'index': positions[e.index]}), 409
+    except Exception as e:
+        logger.error("Error in bulk write to %s: %s", collection, e)
+        return jsonify({'error': str(e)}), 500
+    
+    results = [{'index': index, 'id': record.get('id'), 'action': action}
+               for index, (action, record) in zip(positions, written)]
+    inserted = sum(1 for result in results if result['action'] == 'inserted')
+    return jsonify({
+        'received': received,
+        'inserted': inserted,
+        'updated': len(results) - inserted,
+        'failed': len(errors),
+        'errors': errors,
+        'results': results
+    }), 200 if records or not errors else 400
+
 @app.route('/api/audit-plans', methods=['GET', 'POST'])
+@conditional('audit_plans')
 def handle_audit_plans():
     if request.method == 'GET':
         try:
-            os.makedirs('data', exist_ok=True)
-            if not os.path.exists('data/audit_plans.json'):
-                return jsonify([])
-                
-            with open('data/audit_plans.json', 'r') as f:
-                audit_plans = json.load(f)
-            return jsonify(audit_plans)
+            return list_response('audit_plans')
         except Exception as e:
-            print(f"Error loading audit plans: {e}")
+            logger.error("Error loading audit plans: %s", e)
             return jsonify([])
     
     elif request.method == 'POST':
         try:
             data = request.json
-            os.makedirs('data', exist_ok=True)
-            
-            if os.path.exists('data/audit_plans.json'):
-                with open('data/audit_plans.json', 'r') as f:
-                    audit_plans = json.load(f)
-            else:
-                audit_plans = []
-            
-            audit_plans.append(data)
-            
-            with open('data/audit_plans.json', 'w') as f:
-                json.dump(audit_plans, f, indent=2)
-            
+            storage.insert('audit_plans', data)
             return jsonify(data)
         except Exception as e:
-            print(f"Error saving audit plan: {e}")
+            logger.error("Error saving audit plan: %s", e)
             return jsonify({'error': str(e)}), 500
 
 @app.route('/api/reports', methods=['GET'])
+@conditional('reports')
 def handle_reports():
     try:
-        os.makedirs('data', exist_ok=True)
-        if not os.path.exists('data/reports.json'):
-            return jsonify([])
-            
-        with open('data/reports.json', 'r') as f:
-            reports = json.load(f)
-        return jsonify(reports)
+        return list_response('reports')
     except Exception as e:
-        print(f"Error loading reports: {e}")
+        logger.error("Error loading reports: %s", e)
         return jsonify([])
 
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Read cache hit/miss counters; export cache hits, evictions and size under 'exports'"""
+    return jsonify({**read_cache.stats(), 'exports': {**export_cache.stats(), 'shared': export_jobs.shared}})
+
 @app.route('/api/generate-controls', methods=['POST'])
 def generate_controls():
+    """Controls for a framework and infrastructure, from the control catalog.
+    
+    infrastructure may list component types (["Firewall", "Database"]) or an
+    inventory of assets ([{"type": "database", "name": "orders-db"}, ...]).
+    """
     try:
         data = request.json
         framework = data.get('framework', 'SOC 2')
-        infrastructure = data.get('infrastructure', [])
-        
-        # Sample control generation logic
-        controls = []
-        control_id = 1
-        
-        if 'firewall' in infrastructure:
-            controls.append({
-                'id': f"{framework}-{control_id}",
-                'name': 'Firewall Configuration Management',
-                'description': 'Ensure firewall rules are properly configured and monitored',
-                'type': 'automatic',
-                'risk_level': 'High',
-                'status': 'not_started',
-                'test_status': 'not_tested',
-                'test_result': 'fail',
-                'progress': 0
-            })
-            control_id += 1
-        
-        if 'cloud' in infrastructure:
-            controls.append({
-                'id': f"{framework}-{control_id}",
-                'name': 'Cloud Security Monitoring',
-                'description': 'Monitor cloud infrastructure for security events',
-                'type': 'automatic',
-                'risk_level': 'High',
-                'status': 'not_started',
-                'test_status': 'not_tested',
-                'test_result': 'fail',
-                'progress': 0
-            })
-            control_id += 1
-        
-        if 'database' in infrastructure:
-            controls.append({
-                'id': f"{framework}-{control_id}",
-                'name': 'Database Access Controls',
-                'description': 'Implement role-based access control for databases',
-                'type': 'manual',
-                'risk_level': 'Medium',
-                'status': 'not_started',
-                'test_status': 'not_tested',
-                'test_result': 'fail',
-                'progress': 0
-            })
-            control_id += 1
-        
-        # Add generic controls
-        controls.extend([
-            {
-                'id': f"{framework}-{control_id}",
-                'name': 'Security Awareness Training',
-                'description': 'Provide regular security awareness training to employees',
-                'type': 'manual',
-                'risk_level': 'Medium',
-                'status': 'not_started',
-                'test_status': 'not_tested',
-                'test_result': 'fail',
-                'progress': 0
-            },
-            {
-                'id': f"{framework}-{control_id+1}",
-                'name': 'Incident Response Plan',
-                'description': 'Maintain and test incident response procedures',
-                'type': 'manual',
-                'risk_level': 'High',
-                'status': 'not_started',
-                'test_status': 'not_tested',
-                'test_result': 'fail',
-                'progress': 0
-            }
-        ])
-        
-        return jsonify(controls)
+        infrastructure = data.get('infrastructure', data.get('infrastructure_components', []))
+        return jsonify(control_catalog.generate(framework, infrastructure))
     except Exception as e:
-        print(f"Error generating controls: {e}")
+        logger.error("Error generating controls: %s", e)
         return jsonify({'error': str(e)}), 500
 
 # ============================================================================
@@ -247,102 +503,31 @@ def generate_controls():
 # ============================================================================
 
 @app.route('/api/analytics/compliance-score', methods=['GET'])
+@conditional('assessments')
 def get_compliance_score():
     """Calculate overall compliance score across all frameworks"""
     try:
-        print("Calculating compliance score...")
-        
-        # Ensure data directory exists
-        os.makedirs('data', exist_ok=True)
-        
-        # Initialize with empty list if file doesn't exist or is invalid
-        if not os.path.exists('data/assessments.json'):
-            print("No assessments file found, returning demo data")
-            return jsonify({
-                'overall_score': 75.0,
-                'implementation_score': 80.0,
-                'testing_score': 65.0,
-                'total_controls': 20,
-                'implemented_controls': 16,
-                'tested_controls': 13,
-                'passed_controls': 15,
-                'message': 'Using demo data - no assessments found'
-            })
-        
-        # Read and parse assessments
-        with open('data/assessments.json', 'r') as f:
-            content = f.read().strip()
-            if not content:
-                assessments = []
-            else:
-                assessments = json.loads(content)
+        framework = request.args.get('framework')
+        assessment_id = request.args.get('assessment_id')
         
-        print(f"Loaded {len(assessments)} assessments")
-        
-        total_controls = 0
-        implemented_controls = 0
-        tested_controls = 0
-        passed_controls = 0
-        
-        for assessment in assessments:
-            controls = assessment.get('controls', [])
-            print(f"Assessment '{assessment.get('name')}' has {len(controls)} controls")
-            
-            for control in controls:
-                total_controls += 1
-                if control.get('status') == 'implemented':
-                    implemented_controls += 1
-                if control.get('test_status') == 'tested':
-                    tested_controls += 1
-                if control.get('test_result') == 'pass':
-                    passed_controls += 1
-        
-        print(f"Counted: {total_controls} total, {implemented_controls} implemented, {tested_controls} tested, {passed_controls} passed")
+        # O(1) read of the counters maintained on every assessment write
+        counts = compliance_counters.counts(framework=framework, assessment_id=assessment_id)
         
         # Handle case where no controls exist
-        if total_controls == 0:
+        if counts['total_controls'] == 0:
             return jsonify({
-                'overall_score': 0.0,
-                'implementation_score': 0.0,
-                'testing_score': 0.0,
-                'total_controls': 0,
-                'implemented_controls': 0,
-                'tested_controls': 0,
-                'passed_controls': 0,
+                **compliance_score(counts),
                 'message': 'No controls found. Generate assessments first.'
             })
         
-        implementation_score = (implemented_controls / total_controls * 100)
-        testing_score = (tested_controls / total_controls * 100)
-        compliance_score = (passed_controls / total_controls * 100)
-        
-        result = {
-            'overall_score': round(compliance_score, 1),
-            'implementation_score': round(implementation_score, 1),
-            'testing_score': round(testing_score, 1),
-            'total_controls': total_controls,
-            'implemented_controls': implemented_controls,
-            'tested_controls': tested_controls,
-            'passed_controls': passed_controls
-        }
+        result = compliance_score(counts)
+        if framework is None and assessment_id is None:
+            result['framework_scores'] = compliance_counters.framework_scores()
         
-        print(f"Compliance score result: {result}")
         return jsonify(result)
         
-    except json.JSONDecodeError as e:
-        print(f"JSON decode error: {e}")
-        return jsonify({
-            'overall_score': 70.0,
-            'implementation_score': 75.0,
-            'testing_score': 60.0,
-            'total_controls': 15,
-            'implemented_controls': 11,
-            'tested_controls': 9,
-            'passed_controls': 10,
-            'message': 'Using demo data - invalid JSON in assessments'
-        })
     except Exception as e:
-        print(f"Unexpected error in compliance score: {e}")
+        logger.error("Unexpected error in compliance score: %s", e)
         return jsonify({
             'overall_score': 65.0,
             'implementation_score': 70.0,
@@ -354,67 +539,35 @@ def get_compliance_score():
             'message': f'Using demo data - error: {str(e)}'
         }), 200  # Return 200 with demo data instead of 500
 
+@app.route('/api/analytics/compliance-score/rebuild', methods=['POST'])
+def rebuild_compliance_score():
+    """Recompute the compliance counters from scratch and report any drift"""
+    return jsonify(compliance_counters.rebuild_and_verify())
+
+def _filter_values(name):
+    """Comma-separated query filter, e.g. ?risk_level=High,Critical"""
+    value = request.args.get(name)
+    return {v.strip() for v in value.split(',') if v.strip()} if value else None
+
 @app.route('/api/analytics/gap-analysis', methods=['GET'])
+@conditional('assessments')
 def get_gap_analysis():
     """Identify compliance gaps across frameworks"""
     try:
-        print("Generating gap analysis...")
+        limit = min(max(request.args.get('limit', 10, type=int), 1), MAX_PAGE_SIZE)
+        cursor = request.args.get('cursor')
         
-        # Ensure data directory exists
-        os.makedirs('data', exist_ok=True)
+        # Ranked by risk from the maintained gap index; only the requested page is built
+        gaps, next_cursor = gap_engine.query(
+            limit=limit,
+            cursor=cursor,
+            framework=_filter_values('framework'),
+            risk_level=_filter_values('risk_level'),
+            status=_filter_values('status')
+        )
         
-        # Initialize with empty list if file doesn't exist or is invalid
-        if not os.path.exists('data/assessments.json'):
-            print("No assessments file found, returning demo gaps")
-            return jsonify([
-                {
-                    'framework': 'SOC 2',
-                    'control_name': 'Access Management',
-                    'description': 'Multi-factor authentication not implemented for admin accounts',
-                    'risk_level': 'High',
-                    'status': 'not_started',
-                    'test_result': 'not_tested'
-                },
-                {
-                    'framework': 'HIPAA',
-                    'control_name': 'Data Encryption',
-                    'description': 'Encryption at rest not enabled for patient databases',
-                    'risk_level': 'Medium',
-                    'status': 'in_progress',
-                    'test_result': 'fail'
-                }
-            ])
-        
-        # Read and parse assessments
-        with open('data/assessments.json', 'r') as f:
-            content = f.read().strip()
-            if not content:
-                assessments = []
-            else:
-                assessments = json.loads(content)
-        
-        gaps = []
-        for assessment in assessments:
-            framework = assessment.get('framework', 'Unknown Framework')
-            controls = assessment.get('controls', [])
-            
-            for control in controls:
-                status = control.get('status', 'not_started')
-                test_result = control.get('test_result', 'not_tested')
-                
-                # Consider it a gap if not implemented OR not passing tests
-                if status != 'implemented' or test_result not in ['pass', 'passed']:
-                    gaps.append({
-                        'framework': framework,
-                        'control_name': control.get('name', 'Unknown Control'),
-                        'description': control.get('description', 'No description available'),
-                        'risk_level': control.get('risk_level', 'Medium'),
-                        'status': status,
-                        'test_result': test_result
-                    })
-        
-        # If no gaps found, return sample data for demo
-        if not gaps:
+        # If no gaps exist at all, return sample data for demo
+        if not gaps and cursor is None and gap_engine.total() == 0:
             gaps = [
                 {
                     'framework': 'SOC 2',
@@ -426,23 +579,15 @@ def get_gap_analysis():
                 }
             ]
         
-        print(f"Found {len(gaps)} gaps")
-        return jsonify(gaps[:10])  # Return top 10 gaps
+        response = jsonify(gaps)
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
         
-    except json.JSONDecodeError as e:
-        print(f"JSON decode error in gap analysis: {e}")
-        return jsonify([
-            {
-                'framework': 'SOC 2',
-                'control_name': 'Data Protection',
-                'description': 'Data encryption controls need implementation',
-                'risk_level': 'High',
-                'status': 'not_started',
-                'test_result': 'not_tested'
-            }
-        ])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        print(f"Unexpected error in gap analysis: {e}")
+        logger.error("Unexpected error in gap analysis: %s", e)
         return jsonify([
             {
                 'framework': 'General',
@@ -455,6 +600,7 @@ def get_gap_analysis():
         ]), 200  # Return 200 with demo data instead of 500
 
 @app.route('/api/analytics/trends', methods=['GET'])
+@conditional()
 def get_compliance_trends():
     """Get compliance trends over time"""
     try:
@@ -463,7 +609,7 @@ def get_compliance_trends():
             'scores': [65, 70, 75, 80, 85, 88]
         })
     except Exception as e:
-        print(f"Error in trends API: {e}")
+        logger.error("Error in trends API: %s", e)
         return jsonify({
             'labels': ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun'],
             'scores': [60, 65, 70, 75, 80, 85]
@@ -471,54 +617,90 @@ def get_compliance_trends():
 
 @app.route('/api/reports/export/<format>', methods=['POST'])
 def export_report(format):
-    """Export reports in various formats"""
+    """Queue a report export (pdf, excel, csv); returns 202 with the job's status and download URLs.
+
+    Optional JSON body: {"framework": "SOC 2", "assessment_ids": [1, 2]}.
+    """
+    format = format.lower()
+    if format not in REPORT_FORMATS:
+        return jsonify({'error': f"Unsupported export format: {format}"}), 400
+    data = request.get_json(silent=True) or {}
+    params = {key: data[key] for key in ('framework', 'assessment_ids') if data.get(key)}
+    # Same data, format and parameters -> same artifact
+    key = export_cache.key(CODE_VERSION, storage.instance_id, storage.version('assessments'), format, params)
     try:
-        # Simulate report generation
-        report_data = {
-            'format': format,
-            'timestamp': datetime.now().isoformat(),
-            'status': 'generated',
-            'download_url': f'/downloads/report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{format}',
-            'message': f'{format.upper()} report generated successfully'
-        }
-        
-        # Ensure data directory exists
-        os.makedirs('data', exist_ok=True)
-        
-        # Initialize with empty list if file doesn't exist
-        if not os.path.exists('data/reports.json'):
-            with open('data/reports.json', 'w') as f:
-                json.dump([], f)
-        
-        # Save report metadata
-        with open('data/reports.json', 'r+') as f:
-            try:
-                content = f.read().strip()
-                reports = json.loads(content) if content else []
-            except:
-                reports = []
-            
-            reports.append(report_data)
-            f.seek(0)
-            json.dump(reports, f, indent=2)
-            f.truncate()
-        
-        return jsonify(report_data)
+        job = export_jobs.submit(format, params, REPORT_FORMATS[format], key=key)
+    except QueueFull as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '10'}
     except Exception as e:
-        print(f"Error in export report: {e}")
-        return jsonify({
+        logger.error("Error queueing export: %s", e)
+        return jsonify({'error': str(e)}), 500
+    
+    payload = job_payload(job)
+    if not job['new']:
+        # Served by an existing job, which already has its reports entry
+        return jsonify(payload), 202, {'Location': payload['status_url']}
+    try:
+        # Report metadata for the reports list
+        storage.insert('reports', {
             'format': format,
-            'timestamp': datetime.now().isoformat(),
-            'status': 'generated',
-            'message': f'{format.upper()} report generated (demo)',
-            'note': 'Demo data used due to error'
-        }), 200
+            'timestamp': job['created_at'],
+            'job_id': job['id'],
+            'status_url': payload['status_url'],
+            'download_url': payload['download_url'],
+            'message': f'{format.upper()} report queued'
+        })
+    except Exception as e:
+        logger.error("Error saving report metadata: %s", e)
+    return jsonify(payload), 202, {'Location': payload['status_url']}
+
+def job_payload(job):
+    return {
+        'id': job['id'],
+        'format': job['format'],
+        'status': job['status'],
+        'params': job['params'],
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at'],
+        'status_url': f"/api/jobs/{job['id']}",
+        'download_url': f"/api/jobs/{job['id']}/download"
+    }
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    return jsonify([job_payload(job) for job in export_jobs.list(request.args.get('limit', 50, type=int))])
+
+@app.route('/api/jobs/<job_id>', methods=['GET', 'DELETE'])
+def handle_job(job_id):
+    """Job status; ?wait=N holds the request up to N seconds (max 30) until the job finishes"""
+    if request.method == 'DELETE':
+        job = export_jobs.cancel(job_id)
+    else:
+        job = export_jobs.wait(job_id, min(request.args.get('wait', 0, type=float), 30.0))
+    if job is None:
+        return jsonify({'error': f"Export job {job_id} not found"}), 404
+    return jsonify(job_payload(job))
+
+@app.route('/api/jobs/<job_id>/download', methods=['GET'])
+def download_job(job_id):
+    job = export_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': f"Export job {job_id} not found"}), 404
+    if job['status'] != 'done':
+        return jsonify(job_payload(job)), 409
+    if not os.path.exists(job['path']):
+        return jsonify({'error': "Export file no longer exists"}), 410
+    created = datetime.fromisoformat(job['created_at']).strftime('%Y%m%d_%H%M%S')
+    return send_file(os.path.abspath(job['path']), as_attachment=True,
+                     download_name=f"compliance_report_{created}.{job['extension']}")
 
 @app.route('/analytics')
 def analytics_dashboard():
     """Serve the advanced analytics dashboard"""
     try:
-        return send_file('analytics.html')
+        return asset_response('analytics.html') or send_file('analytics.html')
     except Exception as e:
         return f"Error loading analytics dashboard: {e}", 500
 
@@ -527,42 +709,42 @@ def analytics_dashboard():
 # ============================================================================
 
 if __name__ == '__main__':
-    # Ensure data directory exists
-    os.makedirs('data', exist_ok=True)
+    parser = argparse.ArgumentParser(description='AI Audit Compliance Platform server')
+    parser.add_argument('command', nargs='?', default='dev', choices=['dev', 'serve', 'rebuild-counters'],
+                        help='dev: run the development server (default); '
+                             'serve: run the production multi-worker server; '
+                             'rebuild-counters: recompute and verify compliance counters')
+    parser.add_argument('--host', help='bind address (dev: 127.0.0.1, serve: 0.0.0.0)')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=None, help='serve: worker processes (default: CPU count)')
+    parser.add_argument('--threads', type=int, default=8, help='serve: request threads per worker')
+    args = parser.parse_args()
     
-    # Initialize data files if they don't exist
-    data_files = {
-        'assessments.json': [],
-        'controls.json': [],
-        'audit_plans.json': [],
-        'reports.json': []
-    }
+    if args.command == 'rebuild-counters':
+        report = compliance_counters.rebuild_and_verify()
+        for mismatch in report['mismatches']:
+            print(f"Mismatch: {mismatch}")
+        print(f"Counted: {report['total_controls']} total, {report['implemented_controls']} implemented, "
+              f"{report['tested_controls']} tested, {report['passed_controls']} passed")
+        print("Counters verified" if report['verified'] else "Counters rebuilt after drift")
+        sys.exit(0 if report['verified'] else 1)
     
-    for filename, default_data in data_files.items():
-        filepath = f'data/{filename}'
-        if not os.path.exists(filepath):
-            with open(filepath, 'w') as f:
-                json.dump(default_data, f, indent=2)
-            print(f"Created {filepath}")
-        else:
-            # Validate existing files
-            try:
-                with open(filepath, 'r') as f:
-                    content = f.read().strip()
-                    if content:
-                        json.loads(content)
-                    else:
-                        # File exists but is empty, initialize it
-                        with open(filepath, 'w') as f:
-                            json.dump(default_data, f, indent=2)
-                        print(f"Initialized empty {filepath}")
-            except json.JSONDecodeError:
-                # File contains invalid JSON, recreate it
-                print(f"Recreating {filepath} with valid JSON")
-                with open(filepath, 'w') as f:
-                    json.dump(default_data, f, indent=2)
+    print(f"Storage backend: {storage.name} ({DATA_DIR})")
+    
+    if args.command == 'serve':
+        from services import prefork
+        # Each worker imports this module afresh and opens its own storage handle
+        storage.close()
+        export_jobs.close()
+        prefork.serve('local_server:app', host=args.host or '0.0.0.0', port=args.port,
+                      workers=args.workers, threads=args.threads)
+        sys.exit(0)
     
-    print("Enhanced compliance server running at http://localhost:8000")
-    print("Analytics dashboard available at http://localhost:8000/analytics")
+    host = args.host or '127.0.0.1'
+    # Pick up edits to css/, js/ and the pages without a restart
+    assets.watch = True
+    print(f"Enhanced compliance server running at http://localhost:{args.port}")
+    print(f"Analytics dashboard available at http://localhost:{args.port}/analytics")
     print("All endpoints are now protected against data errors")
-    app.run(host='0.0.0.0', port=8000, debug=True)
+    print("Development server only: use 'python local_server.py serve' in production")
+    app.run(host=host, port=args.port, debug=os.environ.get('FLASK_DEBUG', '1') == '1')
@@ -0,0 +1,50 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from typing import Optional
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional[logging.handlers.QueueHandler] = None
+
+
+def configure_logging(level: Optional[str] = None):
+    """Route all logging through a queue drained by a background thread.
+
+    Request threads only enqueue records; formatting and the stderr write happen
+    on the listener thread. The level comes from LOG_LEVEL (default INFO).
+    """
+    global _listener, _handler
+    if _listener is not None:
+        return
+    records = queue.SimpleQueue()
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(logging.Formatter('%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s'))
+    root = logging.getLogger()
+    root.setLevel((level or os.getenv('LOG_LEVEL', 'INFO')).upper())
+    _handler = logging.handlers.QueueHandler(records)
+    root.addHandler(_handler)
+    _listener = logging.handlers.QueueListener(records, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_stop)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_restart_in_child)
+
+
+def _restart_in_child():
+    """fork() copies the queue but not the listener thread: give a forked worker its own pair"""
+    global _listener
+    records = queue.SimpleQueue()
+    _handler.queue = records
+    _listener = logging.handlers.QueueListener(records, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def _stop():
+    _listener.stop()
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
@@ -0,0 +1,131 @@
+import copy
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from typing import Dict, Iterable, Optional
+
+from services.compression import ENCODINGS, STATIC_LEVELS, compress, encoded_etag, negotiate
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+# href="css/tailwind.css" / src="/js/app.js" in the HTML pages
+_REFERENCE = re.compile(r'''(\b(?:href|src)=["'])(/?)([^"'?#]+)(["'])''')
+
+
+class Asset:
+    """One static file held in memory with its precompressed variants"""
+
+    def __init__(self, path: str, content: bytes, fingerprint: bool):
+        self.path = path
+        self.digest = hashlib.sha256(content).hexdigest()[:16]
+        if fingerprint:
+            stem, ext = os.path.splitext(path)
+            self.url_path = f"{stem}.{self.digest}{ext}"
+        else:
+            self.url_path = path
+        self.mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.cache_control = IMMUTABLE if fingerprint else REVALIDATE
+        self.variants: Dict[str, bytes] = {'identity': content}
+        for encoding in ENCODINGS:
+            compressed = compress(content, encoding, STATIC_LEVELS[encoding])
+            if len(compressed) < len(content):
+                self.variants[encoding] = compressed
+
+    def etag(self, encoding: str) -> str:
+        return self.digest if encoding == 'identity' else encoded_etag(self.digest, encoding)
+
+    def etags(self) -> Iterable[str]:
+        return (self.etag(encoding) for encoding in self.variants)
+
+
+class AssetPipeline:
+    """Fingerprinted, precompressed static assets built once at startup.
+
+    Every file under `asset_dirs` is served from memory under a content-hashed
+    name (css/tailwind.<hash>.css) with a one-year immutable Cache-Control; the
+    HTML `pages` are rewritten to reference those names and served with
+    `no-cache`, so browsers revalidate the page (cheap 304) and pick up new
+    asset URLs after a deploy. Original asset paths keep working, revalidated.
+    With watch=True (dev server) edits on disk trigger a rebuild.
+    """
+
+    def __init__(self, root: str = '.', asset_dirs=('css', 'js'), pages=('index.html', 'analytics.html'),
+                 watch: bool = False):
+        self.root = root
+        self.asset_dirs = asset_dirs
+        self.pages = pages
+        self.watch = watch
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._by_url: Dict[str, Asset] = {}
+        self.build()
+
+    def _files(self) -> Iterable[str]:
+        for directory in self.asset_dirs:
+            for dirpath, _, filenames in os.walk(os.path.join(self.root, directory)):
+                for filename in sorted(filenames):
+                    yield os.path.relpath(os.path.join(dirpath, filename), self.root).replace(os.sep, '/')
+
+    def _snapshot(self):
+        stamp = []
+        for path in list(self._files()) + list(self.pages):
+            try:
+                stat = os.stat(os.path.join(self.root, path))
+            except FileNotFoundError:
+                continue
+            stamp.append((path, stat.st_mtime_ns, stat.st_size))
+        return tuple(stamp)
+
+    def build(self):
+        stamp = self._snapshot()
+        assets = {}
+        for path in self._files():
+            with open(os.path.join(self.root, path), 'rb') as f:
+                assets[path] = Asset(path, f.read(), fingerprint=True)
+
+        def rewrite(match):
+            asset = assets.get(match.group(3))
+            if asset is None:
+                return match.group(0)
+            return f"{match.group(1)}{match.group(2)}{asset.url_path}{match.group(4)}"
+
+        by_url = {}
+        for asset in assets.values():
+            by_url[asset.url_path] = asset
+            # Unhashed path: same bytes, but revalidated since its content can change
+            original = copy.copy(asset)
+            original.url_path, original.cache_control = asset.path, REVALIDATE
+            by_url[asset.path] = original
+        for page in self.pages:
+            try:
+                with open(os.path.join(self.root, page), 'r', encoding='utf-8-sig') as f:
+                    html = f.read()
+            except FileNotFoundError:
+                continue
+            by_url[page] = Asset(page, _REFERENCE.sub(rewrite, html).encode('utf-8'), fingerprint=False)
+        with self._lock:
+            self._by_url = by_url
+            self._stamp = stamp
+
+    def get(self, path: str) -> Optional[Asset]:
+        if self.watch and self._snapshot() != self._stamp:
+            self.build()
+        return self._by_url.get(path.lstrip('/'))
+
+    def response(self, asset: Asset, request, response_class):
+        """200 with the best encoding the client accepts, or 304 if its copy is current"""
+        encoding = negotiate(request.accept_encodings)
+        if encoding not in asset.variants:
+            encoding = 'identity'
+        headers = {'Cache-Control': asset.cache_control, 'Vary': 'Accept-Encoding'}
+        if any(request.if_none_match.contains(etag) for etag in asset.etags()):
+            response = response_class(status=304, headers=headers)
+        else:
+            response = response_class(asset.variants[encoding], mimetype=asset.mimetype, headers=headers)
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(asset.etag(encoding))
+        return response
@@ -0,0 +1,103 @@
+from typing import Dict, Iterable, List, Optional
+
+from services.derived_index import DerivedIndex
+
+COUNT_FIELDS = ('total_controls', 'implemented_controls', 'tested_controls', 'passed_controls')
+
+
+def count_controls(controls: Iterable[Dict]) -> Dict[str, int]:
+    """Tally one list of controls the same way the compliance score always has"""
+    counts = dict.fromkeys(COUNT_FIELDS, 0)
+    for control in controls:
+        counts['total_controls'] += 1
+        if control.get('status') == 'implemented':
+            counts['implemented_controls'] += 1
+        if control.get('test_status') == 'tested':
+            counts['tested_controls'] += 1
+        if control.get('test_result') == 'pass':
+            counts['passed_controls'] += 1
+    return counts
+
+
+def compliance_score(counts: Dict[str, int]) -> Dict:
+    """Turn raw counters into the /api/analytics/compliance-score payload"""
+    total = counts['total_controls']
+    return {
+        'overall_score': round(counts['passed_controls'] / total * 100, 1) if total else 0.0,
+        'implementation_score': round(counts['implemented_controls'] / total * 100, 1) if total else 0.0,
+        'testing_score': round(counts['tested_controls'] / total * 100, 1) if total else 0.0,
+        **counts
+    }
+
+
+def _add(target: Dict[str, int], counts: Dict[str, int], sign: int):
+    for field in COUNT_FIELDS:
+        target[field] = target.get(field, 0) + sign * counts[field]
+
+
+class ComplianceCounters(DerivedIndex):
+    """Control totals overall, per framework and per assessment, updated on every write"""
+
+    def __init__(self, storage, collection="assessments"):
+        super().__init__(storage, collection)
+
+    def _empty_state(self) -> Dict:
+        return {'totals': dict.fromkeys(COUNT_FIELDS, 0), 'frameworks': {}, 'assessments': {}}
+
+    def _apply(self, state: Dict, assessment: Dict, sign: int):
+        counts = count_controls(assessment.get('controls') or [])
+        framework = assessment.get('framework', 'Unknown Framework')
+        key = str(assessment.get('id'))
+        _add(state['totals'], counts, sign)
+        for index, name in ((state['frameworks'], framework), (state['assessments'], key)):
+            entry = index.setdefault(name, dict.fromkeys(COUNT_FIELDS, 0))
+            _add(entry, counts, sign)
+            if sign < 0 and not any(entry.values()):
+                del index[name]
+
+    def counts(self, framework: Optional[str] = None, assessment_id=None) -> Dict[str, int]:
+        self._ensure_current()
+        with self._lock:
+            if assessment_id is not None:
+                source = self._state['assessments'].get(str(assessment_id))
+            elif framework is not None:
+                source = self._state['frameworks'].get(framework)
+            else:
+                source = self._state['totals']
+            return dict(source) if source else dict.fromkeys(COUNT_FIELDS, 0)
+
+    def framework_scores(self) -> Dict[str, float]:
+        self._ensure_current()
+        with self._lock:
+            return {name: compliance_score(counts)['overall_score']
+                    for name, counts in sorted(self._state['frameworks'].items())}
+
+    def verify(self) -> List[str]:
+        """Compare the live counters with a plain rescan of the stored data"""
+        self._ensure_current()
+        expected = dict.fromkeys(COUNT_FIELDS, 0)
+        expected_frameworks: Dict[str, Dict[str, int]] = {}
+        for assessment in self.storage.iter(self.collection):
+            counts = count_controls(assessment.get('controls') or [])
+            _add(expected, counts, 1)
+            framework = assessment.get('framework', 'Unknown Framework')
+            _add(expected_frameworks.setdefault(framework, {}), counts, 1)
+
+        with self._lock:
+            actual = dict(self._state['totals'])
+            actual_frameworks = dict(self._state['frameworks'])
+        mismatches = [f"total {field}: counter={actual.get(field, 0)} stored={expected[field]}"
+                      for field in COUNT_FIELDS if actual.get(field, 0) != expected[field]]
+        for framework in sorted(set(expected_frameworks) | set(actual_frameworks)):
+            want = expected_frameworks.get(framework, {})
+            have = actual_frameworks.get(framework, {})
+            mismatches.extend(
+                f"{framework} {field}: counter={have.get(field, 0)} stored={want.get(field, 0)}"
+                for field in COUNT_FIELDS if have.get(field, 0) != want.get(field, 0))
+        return mismatches
+
+    def rebuild_and_verify(self) -> Dict:
+        """Report drift between the live counters and the stored data, then rebuild"""
+        mismatches = self.verify()
+        self.rebuild()
+        return {'verified': not mismatches, 'mismatches': mismatches, **self.counts()}
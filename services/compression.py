@@ -0,0 +1,82 @@
+import gzip
+import zlib
+from typing import Iterable, Iterator, Optional
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional: pip install zstandard
+    zstandard = None
+
+# Server preference when the client weights several encodings equally
+ENCODINGS = tuple(name for name, available in (('zstd', zstandard), ('br', brotli), ('gzip', True)) if available)
+
+# Levels for responses compressed per request (fast) and for assets compressed once (smallest)
+DYNAMIC_LEVELS = {'gzip': 6, 'br': 5, 'zstd': 3}
+STATIC_LEVELS = {'gzip': 9, 'br': 11, 'zstd': 19}
+
+_ETAG_SUFFIXES = tuple(f"-{name}" for name in ('gzip', 'br', 'zstd'))
+
+
+def negotiate(accept_encodings) -> Optional[str]:
+    """Best available encoding from a parsed Accept-Encoding header (request.accept_encodings)"""
+    best, best_quality = None, 0
+    for name in ENCODINGS:
+        quality = accept_encodings[name]
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+def compress(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    level = DYNAMIC_LEVELS[encoding] if level is None else level
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def compress_stream(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    """Compress a streamed body chunk by chunk, flushing after each so clients see progress"""
+    if encoding == 'gzip':
+        compressor = zlib.compressobj(DYNAMIC_LEVELS['gzip'], zlib.DEFLATED, 31)
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+    elif encoding == 'br':
+        compressor = brotli.Compressor(quality=DYNAMIC_LEVELS['br'])
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+    elif encoding == 'zstd':
+        compressor = zstandard.ZstdCompressor(level=DYNAMIC_LEVELS['zstd']).compressobj()
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        yield compressor.flush()
+    else:
+        raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """Strong ETag of the `encoding` representation of a body tagged `etag`"""
+    return f"{etag}-{encoding}"
+
+
+def etag_matches(etags, etag: str) -> bool:
+    """True if a parsed If-None-Match/If-Match list holds `etag` or one of its encoded forms"""
+    return etags.contains(etag) or any(etags.contains(etag + suffix) for suffix in _ETAG_SUFFIXES)
+
+
+def base_etag(tag: str) -> str:
+    """Inverse of encoded_etag"""
+    for suffix in _ETAG_SUFFIXES:
+        if tag.endswith(suffix):
+            return tag[:-len(suffix)]
+    return tag
@@ -0,0 +1,139 @@
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+DEFAULT_CATALOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'control_catalog.json')
+
+# Every generated control starts out in this state
+INITIAL_STATE = {
+    'status': 'not_started',
+    'test_status': 'not_tested',
+    'test_result': 'fail',
+    'progress': 0
+}
+
+GENERIC = '*'
+
+
+class ControlCatalog:
+    """Framework x domain x infrastructure type -> control templates, loaded from a JSON file.
+
+    Lookup tables per (framework, infrastructure type) are compiled once at load
+    time and the merged template list for each (framework, set of types) is
+    memoized, so generating controls for a large inventory is a dict lookup and
+    a copy per control.
+    """
+
+    def __init__(self, path: str = DEFAULT_CATALOG):
+        self.path = path
+        with open(path, 'r', encoding='utf-8') as f:
+            catalog = json.load(f)
+        self.frameworks: Dict[str, List[str]] = catalog['frameworks']
+        self.infrastructure_types: List[str] = catalog['infrastructure_types']
+        self.aliases: Dict[str, str] = catalog.get('aliases', {})
+        self.controls: List[Dict] = catalog['controls']
+        self._validate()
+        self._tables = self._compile()
+        # Bound per instance so each catalog has its own memo
+        self.templates = lru_cache(maxsize=4096)(self._templates)
+        # Keyed by client-supplied names, so bounded
+        self._normalized = lru_cache(maxsize=1024)(self._normalize)
+
+    def _validate(self):
+        known = set(self.infrastructure_types) | {GENERIC}
+        for control in self.controls:
+            for infrastructure in control['infrastructure']:
+                if infrastructure not in known:
+                    raise ValueError(f"{control['key']}: unknown infrastructure type {infrastructure}")
+            for framework, domain in control['domains'].items():
+                if domain not in self.frameworks.get(framework, ()):
+                    raise ValueError(f"{control['key']}: {domain} is not a {framework} domain")
+
+    def _compile(self) -> Dict[Tuple[Optional[str], str], Tuple[Dict, ...]]:
+        """(framework, infrastructure type) -> templates in catalog order.
+
+        Framework None holds the templates used for frameworks the catalog does not know.
+        """
+        tables: Dict[Tuple[Optional[str], str], List[Dict]] = {}
+        for framework in list(self.frameworks) + [None]:
+            for control in self.controls:
+                if framework is None and control.get('frameworks'):
+                    continue
+                if framework is not None and framework not in control.get('frameworks', [framework]):
+                    continue
+                template = {
+                    'name': control['name'],
+                    'description': control['description'],
+                    'type': control['type'],
+                    'risk_level': control['risk_level'],
+                    'domain': control['domains'].get(framework),
+                    'catalog_key': control['key']
+                }
+                for infrastructure in control['infrastructure']:
+                    tables.setdefault((framework, infrastructure), []).append(template)
+        return {key: tuple(entries) for key, entries in tables.items()}
+
+    def normalize(self, infrastructure: str) -> Optional[str]:
+        """'Identity Management' -> 'identity_management'; aliases resolved; None if unknown"""
+        return self._normalized(str(infrastructure).strip().casefold())
+
+    def _normalize(self, infrastructure: str) -> Optional[str]:
+        name = re.sub(r'[\s\-]+', '_', infrastructure)
+        name = self.aliases.get(name, name)
+        return name if name in self.infrastructure_types else None
+
+    def _templates(self, framework: str, infrastructure: FrozenSet[str]) -> Tuple:
+        """Memoized: ((infrastructure type, templates), ...) in catalog order, then the generic templates"""
+        key = framework if framework in self.frameworks else None
+        per_type = []
+        for name in sorted(infrastructure, key=self.infrastructure_types.index):
+            per_type.append((name, self._tables.get((key, name), ())))
+        return tuple(per_type), self._tables.get((key, GENERIC), ())
+
+    def generate(self, framework: str, infrastructure: Iterable) -> List[Dict]:
+        """Controls for `framework` covering `infrastructure`.
+
+        Entries are type names ('database') or inventory items ({'type': 'database',
+        'name': 'orders-db'}). Type names get each applicable control once, as before;
+        inventory items get their own copy of their type's controls, tagged with the
+        asset. Generic controls are added once at the end. Unknown types are ignored.
+        """
+        types, assets = set(), []
+        for entry in infrastructure or []:
+            if isinstance(entry, dict):
+                name = self.normalize(entry.get('type', ''))
+                if name:
+                    assets.append((name, entry.get('name') or entry.get('id')))
+            else:
+                name = self.normalize(entry)
+                if name:
+                    types.add(name)
+
+        per_type, generic = self.templates(framework, frozenset(types | {name for name, _ in assets}))
+        by_type = dict(per_type)
+        controls = []
+
+        def add(template, **extra):
+            controls.append({'id': f"{framework}-{len(controls) + 1}", **template, **INITIAL_STATE, **extra})
+
+        if types:
+            # A control that covers several selected types is generated once
+            seen = set()
+            for name, templates in per_type:
+                if name not in types:
+                    continue
+                for template in templates:
+                    if template['catalog_key'] not in seen:
+                        seen.add(template['catalog_key'])
+                        add(template, infrastructure=name)
+        for name, asset in assets:
+            for template in by_type[name]:
+                add(template, infrastructure=name, asset=asset)
+        for template in generic:
+            add(template)
+        return controls
+
+    def cache_info(self):
+        return self.templates.cache_info()
@@ -0,0 +1,57 @@
+import threading
+from typing import Any, Dict, Optional
+
+
+class DerivedIndex:
+    """In-memory structure derived from one collection and kept in step with storage writes.
+
+    Subclasses provide _empty_state() and _apply(state, record, sign); the base class
+    applies each write incrementally and falls back to a full rebuild whenever the
+    storage version shows a write it did not see.
+    """
+
+    def __init__(self, storage, collection: str):
+        self.storage = storage
+        self.collection = collection
+        self._lock = threading.RLock()
+        self._version = None
+        self._state = self._empty_state()
+        storage.subscribe(self._on_write)
+
+    def _empty_state(self) -> Any:
+        raise NotImplementedError
+
+    def _apply(self, state: Any, record: Dict, sign: int):
+        raise NotImplementedError
+
+    def _finalize(self, state: Any):
+        """Hook run once after a full rebuild, before the new state is published"""
+
+    def _on_write(self, collection: str, version: int, old: Optional[Dict], new: Optional[Dict]):
+        if collection != self.collection:
+            return
+        with self._lock:
+            if self._version is None or version != self._version + 1:
+                # A write we did not see (another process, or a rebuild in flight)
+                self._version = None
+                return
+            if old:
+                self._apply(self._state, old, -1)
+            if new:
+                self._apply(self._state, new, 1)
+            self._version = version
+
+    def rebuild(self):
+        """Recompute the whole structure from the stored records"""
+        version = self.storage.version(self.collection)
+        state = self._empty_state()
+        for record in self.storage.iter(self.collection):
+            self._apply(state, record, 1)
+        self._finalize(state)
+        with self._lock:
+            self._state = state
+            self._version = version
+
+    def _ensure_current(self):
+        if self._version is None or self._version != self.storage.version(self.collection):
+            self.rebuild()
@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+# Partial files younger than this may belong to a render still in progress
+PARTIAL_GRACE_SECONDS = 3600
+
+
+class ExportCache:
+    """Content-addressed export artifacts in one directory, evicted least recently used.
+
+    An artifact is named after a hash of everything that determines its content
+    (code version, data version, format, parameters), so an identical request
+    finds the finished file by name. Hits refresh the file's mtime; `evict`
+    removes files older than `max_age` and then the least recently used ones
+    until the directory is under `max_bytes`.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 500 * 1024 * 1024, max_age: float = 7 * 24 * 3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(*parts) -> str:
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:32]
+
+    def path(self, key: str, extension: str) -> str:
+        return os.path.join(self.directory, f"{key}.{extension}")
+
+    def lookup(self, key: str, extension: str) -> Optional[str]:
+        """Path of the cached artifact, or None (counted as a miss)"""
+        path = self.path(key, extension)
+        try:
+            if time.time() - os.stat(path).st_mtime <= self.max_age:
+                os.utime(path)
+                with self._lock:
+                    self.hits += 1
+                return path
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def evict(self):
+        """Drop expired artifacts, then least recently used ones until under max_bytes"""
+        now = time.time()
+        files, total = [], 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+                age = now - stat.st_mtime
+                if entry.name.endswith('.part'):
+                    if age > max(self.max_age, PARTIAL_GRACE_SECONDS):
+                        self._remove(entry.path)
+                    continue
+                if age > self.max_age:
+                    self._remove(entry.path)
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self.evictions += 1
+
+    def stats(self) -> Dict:
+        files = size = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.endswith('.part'):
+                    files += 1
+                    size += entry.stat().st_size
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups * 100, 1) if lookups else 0.0,
+                'evictions': self.evictions,
+                'files': files,
+                'bytes': size
+            }
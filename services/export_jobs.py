@@ -0,0 +1,371 @@
+import functools
+import json
+import logging
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from multiprocessing import spawn
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class QueueFull(Exception):
+    """More jobs are waiting than the queue accepts"""
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# Set while this thread starts a render process
+_launching = threading.local()
+
+
+def _preparation_data(name):
+    data = _get_preparation_data(name)
+    if getattr(_launching, 'render', False):
+        # Not the parent's __main__: for local_server.py that is the whole app
+        # (storage, job table, caches); render processes import only the renderer
+        data.pop('init_main_from_name', None)
+        data.pop('init_main_from_path', None)
+    return data
+
+
+_get_preparation_data = spawn.get_preparation_data
+spawn.get_preparation_data = _preparation_data
+
+
+class _RenderProcess(multiprocessing.context.SpawnProcess):
+    @staticmethod
+    def _Popen(process_obj):
+        _launching.render = True
+        try:
+            return multiprocessing.context.SpawnProcess._Popen(process_obj)
+        finally:
+            _launching.render = False
+
+
+class _RenderContext(multiprocessing.context.SpawnContext):
+    """spawn, minus re-running the parent's main script in every process"""
+    Process = _RenderProcess
+
+
+class ExportJobs:
+    """Export jobs persisted in SQLite and rendered on a bounded process pool.
+
+    `submit` records a queued job and returns at once; a dispatcher thread claims
+    queued jobs (atomically, so several server processes can share one table)
+    while fewer than `max_workers` are running in all of those processes
+    together, and hands them to a process pool
+    that calls `renderer(format, params, path)`; each pool process first runs
+    `initializer(**context)` once, e.g. to open its storage. Output is written to
+    a temporary name and renamed into `export_dir` when complete. Jobs that were
+    running in a process that has since died are queued again, so a restart
+    does not lose work. Only the newest `max_finished` finished jobs
+    are kept.
+
+    With a `cache`, jobs submitted with a content `key` are written to the
+    cache's content-addressed path: a request whose artifact already exists
+    gets the finished job that rendered it, and one whose identical job is
+    still queued or running gets that job instead of a second render.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            format TEXT NOT NULL,
+            params TEXT NOT NULL,
+            extension TEXT NOT NULL,
+            status TEXT NOT NULL,
+            owner INTEGER,
+            path TEXT,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            key TEXT,
+            created_at TEXT NOT NULL,
+            started_at TEXT,
+            finished_at TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+    """
+
+    INDEXES = """
+        CREATE INDEX IF NOT EXISTS idx_jobs_key ON jobs (key, status);
+    """
+
+    def __init__(self, db_path: str, export_dir: str, renderer: Callable, initializer: Optional[Callable] = None,
+                 context: Optional[Dict] = None, max_workers: int = 2, max_queued: int = 100, max_attempts: int = 3,
+                 cache=None, max_finished: int = 1000):
+        self.db_path = db_path
+        self.export_dir = export_dir
+        self.renderer = renderer
+        self.initializer = initializer
+        self.context = context or {}
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.max_attempts = max_attempts
+        self.cache = cache
+        self.max_finished = max_finished
+        # Submissions answered by a job already queued or running for the same key
+        self.shared = 0
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        os.makedirs(export_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if 'key' not in columns:
+            # Job tables created before artifacts were cached
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN key TEXT")
+        self._conn.executescript(self.INDEXES)
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock)
+        self._running = 0
+        self._pool = None
+        self._dispatcher = None
+        self._stopped = False
+
+    def start(self):
+        """Start dispatching (idempotent); called lazily so a pre-fork master never runs jobs"""
+        if self._dispatcher is not None:
+            return
+        with self._lock:
+            if self._dispatcher is not None or self._stopped:
+                return
+            self._requeue_orphans()
+            self._prune()
+            if self.cache is not None:
+                self.cache.evict()
+            self._dispatcher = threading.Thread(target=self._dispatch, name='export-dispatcher', daemon=True)
+            self._dispatcher.start()
+
+    def _requeue_orphans(self, own: bool = True):
+        """Queue again the running jobs of dead processes (and, on start, this pid's from an earlier life)"""
+        rows = self._conn.execute("SELECT id, owner FROM jobs WHERE status = ?", (RUNNING,)).fetchall()
+        for job_id, owner in rows:
+            if (own and owner == os.getpid()) or not _pid_alive(owner):
+                self._conn.execute("UPDATE jobs SET status = ?, owner = NULL WHERE id = ? AND status = ?",
+                                   (QUEUED, job_id, RUNNING))
+                logger.info("Requeued export job %s", job_id)
+
+    def submit(self, format: str, params: Dict, extension: str, key: Optional[str] = None) -> Dict:
+        """Queue a job; raises QueueFull when `max_queued` jobs are already waiting.
+
+        The returned job's 'new' is True only when this call queued a render;
+        requests answered from the cache or by a job already in flight get the
+        existing job.
+        """
+        self.start()
+        if key is not None and self.cache is not None:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE key = ? AND status IN (?, ?) ORDER BY created_at LIMIT 1",
+                    (key, QUEUED, RUNNING)).fetchone()
+                if row:
+                    self.shared += 1
+            if row:
+                return {**self.get(row[0]), 'new': False}
+            path = self.cache.lookup(key, extension)
+            if path is not None:
+                with self._lock:
+                    row = self._conn.execute(
+                        "SELECT id FROM jobs WHERE key = ? AND status = ? ORDER BY finished_at DESC LIMIT 1",
+                        (key, DONE)).fetchone()
+                    if row is None:
+                        # The job that rendered it has been pruned
+                        now = datetime.now().isoformat()
+                        row = (uuid.uuid4().hex,)
+                        self._conn.execute(
+                            "INSERT INTO jobs (id, format, params, extension, status, path, key, created_at, "
+                            "started_at, finished_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            (row[0], format, json.dumps(params, sort_keys=True), extension, DONE, path, key,
+                             now, now, now))
+                        self._prune()
+                return {**self.get(row[0]), 'new': False}
+        with self._lock:
+            queued = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+            if queued >= self.max_queued:
+                raise QueueFull(f"{queued} export jobs already queued")
+            job_id = uuid.uuid4().hex
+            self._conn.execute(
+                "INSERT INTO jobs (id, format, params, extension, status, key, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, format, json.dumps(params, sort_keys=True), extension, QUEUED, key,
+                 datetime.now().isoformat()))
+            self._changed.notify_all()
+        return {**self.get(job_id), 'new': True}
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        job = dict(zip((column[0] for column in cursor.description), row))
+        job['params'] = json.loads(job['params'])
+        return job
+
+    def list(self, limit: int = 50) -> List[Dict]:
+        with self._lock:
+            ids = [row[0] for row in self._conn.execute(
+                "SELECT id FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,))]
+        return [job for job in (self.get(job_id) for job_id in ids) if job]
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict]:
+        """The job once it has finished, or as it stands after `timeout` seconds (long polling)"""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job['status'] in FINISHED or remaining <= 0:
+                return job
+            with self._changed:
+                # Short waits: the job may be run by another server process sharing the table
+                self._changed.wait(min(remaining, 0.5))
+
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        """Cancel a job that has not started yet; running jobs finish"""
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+                               (CANCELLED, datetime.now().isoformat(), job_id, QUEUED))
+            self._prune()
+            self._changed.notify_all()
+        return self.get(job_id)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {status: counts.get(status, 0) for status in (QUEUED, RUNNING, DONE, FAILED, CANCELLED)}
+
+    def _prune(self):
+        """Delete the oldest finished jobs beyond `max_finished`, with their uncached files"""
+        rows = self._conn.execute(
+            "SELECT id, key, path FROM jobs WHERE status IN (?, ?, ?) ORDER BY finished_at DESC LIMIT -1 OFFSET ?",
+            (*FINISHED, self.max_finished)).fetchall()
+        for job_id, key, path in rows:
+            self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            if path and (key is None or self.cache is None):
+                # Cached artifacts are shared by key and left to the cache's eviction
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def _claim(self) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE jobs SET status = ?, owner = ?, started_at = ?, attempts = attempts + 1 "
+                "WHERE id = (SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1) "
+                # max_workers is a limit for the whole server, not per pre-forked worker
+                "AND (SELECT COUNT(*) FROM jobs WHERE status = ?) < ? "
+                "RETURNING id",
+                (RUNNING, os.getpid(), datetime.now().isoformat(), QUEUED, RUNNING, self.max_workers)).fetchall()
+        return self.get(row[0][0]) if row else None
+
+    def _dispatch(self):
+        while not self._stopped:
+            with self._changed:
+                while self._running >= self.max_workers and not self._stopped:
+                    self._changed.wait()
+            job = None if self._stopped else self._claim()
+            if job is None:
+                with self._changed:
+                    if not self._stopped:
+                        # A render slot held by a process that died is freed here
+                        self._requeue_orphans(own=False)
+                        # Also polls for jobs submitted through other processes
+                        self._changed.wait(1.0)
+                continue
+            self._run(job)
+
+    def _path(self, job: Dict) -> str:
+        if job['key'] is not None and self.cache is not None:
+            return self.cache.path(job['key'], job['extension'])
+        return os.path.join(self.export_dir, f"{job['id']}.{job['extension']}")
+
+    def _run(self, job: Dict):
+        # Per-job partial name: two processes may render the same key at once
+        partial = f"{self._path(job)}.{job['id']}.part"
+        with self._lock:
+            self._running += 1
+            if self._pool is None:
+                # spawn: forking a process that runs threads (writer, logging) is not safe
+                initializer = self.initializer and functools.partial(self.initializer, **self.context)
+                self._pool = ProcessPoolExecutor(self.max_workers, mp_context=_RenderContext(),
+                                                 initializer=initializer)
+            pool = self._pool
+        try:
+            future = pool.submit(self.renderer, job['format'], job['params'], partial)
+        except (BrokenProcessPool, RuntimeError) as e:
+            self._finish(job, pool, None, e)
+            return
+        future.add_done_callback(lambda done: self._finish(job, pool, done, None))
+
+    def _finish(self, job: Dict, pool, future, error: Optional[BaseException]):
+        path = self._path(job)
+        partial = f"{path}.{job['id']}.part"
+        if future is not None:
+            error = future.exception() if not future.cancelled() else RuntimeError("cancelled")
+        with self._lock:
+            self._running -= 1
+            if self._stopped:
+                # close() has already queued this process's running jobs again
+                self._changed.notify_all()
+                return
+            if isinstance(error, BrokenProcessPool) and self._pool is pool:
+                # A render process died (e.g. killed); start a fresh pool for the next job
+                self._pool = None
+                pool.shutdown(wait=False, cancel_futures=True)
+            now = datetime.now().isoformat()
+            if error is None:
+                try:
+                    os.replace(partial, path)
+                except OSError as e:
+                    error = e
+            if error is None:
+                self._conn.execute("UPDATE jobs SET status = ?, path = ?, error = NULL, finished_at = ? WHERE id = ?",
+                                   (DONE, path, now, job['id']))
+            else:
+                logger.error("Export job %s failed: %s", job['id'], error)
+                retry = isinstance(error, BrokenProcessPool) and job['attempts'] < self.max_attempts
+                self._conn.execute("UPDATE jobs SET status = ?, owner = NULL, error = ?, finished_at = ? WHERE id = ?",
+                                   (QUEUED if retry else FAILED, str(error) or type(error).__name__,
+                                    None if retry else now, job['id']))
+                try:
+                    os.remove(partial)
+                except FileNotFoundError:
+                    pass
+            self._prune()
+            self._changed.notify_all()
+        if error is None and self.cache is not None:
+            self.cache.evict()
+
+    def close(self):
+        """Stop dispatching; jobs this process was running are queued again for the next start"""
+        with self._changed:
+            self._stopped = True
+            pool, self._pool = self._pool, None
+            self._changed.notify_all()
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET status = ?, owner = NULL WHERE status = ? AND owner = ?",
+                               (QUEUED, RUNNING, os.getpid()))
+            self._conn.close()
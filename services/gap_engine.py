@@ -0,0 +1,164 @@
+import bisect
+import heapq
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from services.derived_index import DerivedIndex
+from services.pagination import decode_cursor, encode_cursor
+
+DEFAULT_WEIGHTS = {
+    # Base score for each risk level; unknown levels score as Medium
+    'risk_level': {'Critical': 4.0, 'High': 3.0, 'Medium': 2.0, 'Low': 1.0},
+    # Multiplier per framework name, e.g. {"HIPAA": 1.5}
+    'framework': {},
+    # Score added per day since the assessment was created
+    'age_per_day': 0.0,
+}
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Gap fields with an ordered entry list per value, so filtered queries skip other gaps
+INDEXED_FIELDS = ('framework', 'risk_level')
+
+
+def is_gap(control: Dict) -> bool:
+    """A control is a gap if it is not implemented or not passing its tests"""
+    return (control.get('status', 'not_started') != 'implemented'
+            or control.get('test_result', 'not_tested') not in ['pass', 'passed'])
+
+
+class GapEngine(DerivedIndex):
+    """Failing controls kept in risk order so top-K and paging never scan every control.
+
+    Entries are sorted on (rank, position, control index), overall and per framework and
+    risk level for filtered queries. With a linear age weight the
+    score of every gap grows at the same rate, so ranking by base score minus
+    age_per_day * creation day gives the same order at any point in time.
+    """
+
+    def __init__(self, storage, weights: Optional[Dict] = None, collection="assessments"):
+        self.weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        super().__init__(storage, collection)
+
+    def _empty_state(self) -> Dict:
+        return {'order': [], 'by_field': {field: {} for field in INDEXED_FIELDS}, 'gaps': {}, 'by_assessment': {},
+                'positions': {}, 'next_position': 0, 'building': True}
+
+    @staticmethod
+    def _orders(state: Dict, gap: Dict) -> List[List]:
+        """The ordered entry lists a gap belongs to"""
+        return [state['order']] + [state['by_field'][field].setdefault(gap[field], []) for field in INDEXED_FIELDS]
+
+    def _finalize(self, state: Dict):
+        # A rebuild appends unsorted and sorts once instead of inserting one by one
+        state['order'].sort()
+        for values in state['by_field'].values():
+            for order in values.values():
+                order.sort()
+        state['building'] = False
+
+    def _rank(self, framework: str, control: Dict, created_day: float) -> float:
+        risk_weights = self.weights['risk_level']
+        base = risk_weights.get(control.get('risk_level', 'Medium'), risk_weights.get('Medium', 2.0))
+        base *= self.weights['framework'].get(framework, 1.0)
+        return round(self.weights['age_per_day'] * created_day - base, 6)
+
+    @staticmethod
+    def _created_day(assessment: Dict) -> float:
+        try:
+            created = datetime.fromisoformat(str(assessment.get('created_at')).replace('Z', '+00:00'))
+            created = created.replace(tzinfo=None)
+        except ValueError:
+            # Fixed, so a record's rank does not depend on when it was indexed
+            created = _EPOCH
+        return (created - _EPOCH).total_seconds() / 86400
+
+    def _apply(self, state: Dict, assessment: Dict, sign: int):
+        key = str(assessment.get('id'))
+        if sign < 0:
+            for entry in state['by_assessment'].pop(key, []):
+                gap = state['gaps'].pop(entry, None)
+                if gap is None:
+                    continue
+                for order in self._orders(state, gap):
+                    index = bisect.bisect_left(order, entry)
+                    if index < len(order) and order[index] == entry:
+                        del order[index]
+            return
+
+        # Keep a record's place in the tie-break order across updates
+        position = state['positions'].get(key)
+        if position is None or key in state['by_assessment']:
+            position = state['next_position']
+            state['next_position'] += 1
+            state['positions'].setdefault(key, position)
+
+        framework = assessment.get('framework', 'Unknown Framework')
+        created_day = self._created_day(assessment)
+        entries = state['by_assessment'].setdefault(key, [])
+        for index, control in enumerate(assessment.get('controls') or []):
+            if not is_gap(control):
+                continue
+            entry = (self._rank(framework, control, created_day), position, index)
+            gap = {
+                'framework': framework,
+                'control_name': control.get('name', 'Unknown Control'),
+                'description': control.get('description', 'No description available'),
+                'risk_level': control.get('risk_level', 'Medium'),
+                'status': control.get('status', 'not_started'),
+                'test_result': control.get('test_result', 'not_tested'),
+                'assessment_id': assessment.get('id'),
+            }
+            if 'id' in control:
+                gap['control_id'] = control['id']
+            for order in self._orders(state, gap):
+                if state['building']:
+                    order.append(entry)
+                else:
+                    bisect.insort(order, entry)
+            state['gaps'][entry] = gap
+            entries.append(entry)
+
+    def total(self) -> int:
+        self._ensure_current()
+        with self._lock:
+            return len(self._state['order'])
+
+    def query(self, limit: int = 10, cursor: Optional[str] = None,
+              framework: Optional[Set[str]] = None, risk_level: Optional[Set[str]] = None,
+              status: Optional[Set[str]] = None) -> Tuple[List[Dict], Optional[str]]:
+        """Return up to `limit` gaps in risk order after `cursor`, plus the cursor for the next page"""
+        after = decode_cursor(cursor, (float, int, int)) if cursor else None
+        self._ensure_current()
+        gaps, last = [], None
+        with self._lock:
+            details = self._state['gaps']
+            for entry in self._candidates(after, framework=framework, risk_level=risk_level):
+                gap = details[entry]
+                if framework and gap['framework'] not in framework:
+                    continue
+                if risk_level and gap['risk_level'] not in risk_level:
+                    continue
+                if status and gap['status'] not in status:
+                    continue
+                gaps.append(dict(gap))
+                last = entry
+                if len(gaps) >= limit:
+                    break
+        next_cursor = encode_cursor(last) if last is not None and len(gaps) >= limit else None
+        return gaps, next_cursor
+
+    def _candidates(self, after: Optional[Tuple], **filters: Optional[Set[str]]) -> Iterator[Tuple]:
+        """Entries after `after` in risk order, from the smallest index covering the filters (lock held)"""
+        orders = [self._state['order']]
+        for field, values in filters.items():
+            if values:
+                by_value = self._state['by_field'][field]
+                lists = [by_value[value] for value in values if value in by_value]
+                if sum(map(len, lists)) < sum(map(len, orders)):
+                    orders = lists
+        tails = []
+        for order in orders:
+            start = bisect.bisect_right(order, after) if after else 0
+            tails.append(map(order.__getitem__, range(start, len(order))))
+        return heapq.merge(*tails)
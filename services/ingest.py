@@ -0,0 +1,186 @@
+import codecs
+import json
+from datetime import datetime
+from typing import BinaryIO, Callable, Dict, Iterator, Optional, Tuple
+
+CHUNK_SIZE = 64 * 1024
+
+# Field bulk upserts match existing records on
+EXTERNAL_ID = 'external_id'
+
+
+class ParseError(ValueError):
+    """Malformed body element; `fatal` when the rest of the body cannot be parsed either"""
+
+    def __init__(self, message: str, fatal: bool = False):
+        super().__init__(message)
+        self.fatal = fatal
+        self.index: Optional[int] = None
+
+
+def _chunks(stream: BinaryIO) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    while True:
+        data = stream.read(CHUNK_SIZE)
+        if not data:
+            tail = decoder.decode(b'', final=True)
+            if tail:
+                yield tail
+            return
+        yield decoder.decode(data)
+
+
+def iter_ndjson(stream: BinaryIO) -> Iterator[object]:
+    """One parsed value per non-blank line; a bad line yields a ParseError and parsing continues"""
+    buffer = ''
+    for chunk in _chunks(stream):
+        buffer += chunk
+        *lines, buffer = buffer.split('\n')
+        for line in lines:
+            if line.strip():
+                yield _loads(line)
+    if buffer.strip():
+        yield _loads(buffer)
+
+
+def _loads(line: str):
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError as e:
+        return ParseError(f"Invalid JSON: {e.msg}")
+
+
+def iter_json_array(stream: BinaryIO) -> Iterator[object]:
+    """Elements of a top-level JSON array, decoded as the body arrives"""
+    decoder = json.JSONDecoder()
+    chunks = _chunks(stream)
+    buffer, position, started, done = '', 0, False, False
+
+    def more() -> bool:
+        nonlocal buffer, position
+        chunk = next(chunks, None)
+        if chunk is None:
+            return False
+        buffer = buffer[position:] + chunk
+        position = 0
+        return True
+
+    while not done:
+        # Skip whitespace and separators until the next value (or the end of the array)
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n':
+                position += 1
+            if position < len(buffer) or not more():
+                break
+        if position >= len(buffer):
+            yield ParseError("Unexpected end of body: JSON array not closed", fatal=True)
+            return
+        char = buffer[position]
+        if not started:
+            if char != '[':
+                yield ParseError("Body must be a JSON array or NDJSON", fatal=True)
+                return
+            started = True
+            position += 1
+            continue
+        if char == ']':
+            done = True
+            continue
+        if char == ',':
+            position += 1
+            continue
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as e:
+                # Possibly just cut off at the chunk boundary
+                if more():
+                    continue
+                yield ParseError(f"Invalid JSON: {e.msg}", fatal=True)
+                return
+            # A number at the end of the buffer might continue in the next chunk
+            if end == len(buffer) and more():
+                continue
+            break
+        position = end
+        yield value
+
+
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/jsonl', 'application/json-seq')
+
+
+def iter_records(stream: BinaryIO, mimetype: str) -> Iterator[object]:
+    """Records of an NDJSON (application/x-ndjson) or JSON array body"""
+    if mimetype in NDJSON_MIMETYPES:
+        return iter_ndjson(stream)
+    return iter_json_array(stream)
+
+
+def validate_assessment(record: Dict) -> Dict:
+    """Type checks matching what POST /api/assessments stores; raises ValueError"""
+    for field, kind in (('name', str), ('framework', str), ('infrastructure', list), ('controls', list)):
+        if field in record and not isinstance(record[field], kind):
+            raise ValueError(f"{field} must be a {'string' if kind is str else 'list'}")
+    if not all(isinstance(control, dict) for control in record.get('controls', [])):
+        raise ValueError("controls must be a list of objects")
+    return record
+
+
+def assessment_defaults() -> Dict:
+    """Fields POST /api/assessments fills in; applied to inserted records only, never to upserted ones"""
+    return {
+        'name': 'New Assessment',
+        'framework': 'SOC 2',
+        'infrastructure': [],
+        'controls': [],
+        'created_at': datetime.now().isoformat()
+    }
+
+
+def validate_control(record: Dict) -> Dict:
+    if not isinstance(record.get('name'), str) or not record['name'].strip():
+        raise ValueError("name is required")
+    if 'progress' in record and not (isinstance(record['progress'], (int, float)) and 0 <= record['progress'] <= 100):
+        raise ValueError("progress must be a number between 0 and 100")
+    return record
+
+
+VALIDATORS: Dict[str, Callable[[Dict], Dict]] = {
+    'assessments': validate_assessment,
+    'controls': validate_control
+}
+
+DEFAULTS: Dict[str, Callable[[], Dict]] = {
+    'assessments': assessment_defaults,
+    'controls': dict
+}
+
+
+def parse_records(stream: BinaryIO, mimetype: str, collection: str,
+                  upsert: bool = False) -> Iterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    """(index, validated record, None) or (index, None, error) for each element of the body.
+
+    Raises ParseError when the body cannot be parsed past `index` (truncated or
+    malformed JSON array); a bad NDJSON line is reported like an invalid record.
+    """
+    validate = VALIDATORS[collection]
+    for index, value in enumerate(iter_records(stream, mimetype)):
+        if isinstance(value, ParseError):
+            if value.fatal:
+                value.index = index
+                raise value
+            yield index, None, str(value)
+            continue
+        if not isinstance(value, dict):
+            yield index, None, "Record must be a JSON object"
+            continue
+        if upsert and value.get(EXTERNAL_ID) in (None, ''):
+            yield index, None, f"{EXTERNAL_ID} is required in upsert mode"
+            continue
+        if upsert and (isinstance(value[EXTERNAL_ID], bool) or not isinstance(value[EXTERNAL_ID], (str, int))):
+            yield index, None, f"{EXTERNAL_ID} must be a string or an integer"
+            continue
+        try:
+            yield index, validate(value), None
+        except ValueError as e:
+            yield index, None, str(e)
@@ -0,0 +1,157 @@
+"""Request and storage instrumentation, rendered in Prometheus text format.
+
+Metrics are kept per process: under `local_server.py serve` each worker reports
+its own numbers, identified by the `pid` label on compliance_process_info.
+"""
+import bisect
+import functools
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+STORAGE_READS = ('list', 'iter', 'iter_raw', 'count', 'page', 'get')
+STORAGE_WRITES = ('insert', 'update', 'delete', 'bulk_write')
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def lines(self, name: str, labels: str) -> Iterable[str]:
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels}le="{bound}"}} {cumulative}'
+        cumulative += self.counts[-1]
+        yield f'{name}_bucket{{{labels}le="+Inf"}} {cumulative}'
+        yield f'{name}_sum{{{labels.rstrip(",")}}} {self.sum}'
+        yield f'{name}_count{{{labels.rstrip(",")}}} {cumulative}'
+
+
+def _labels(**labels) -> str:
+    def escape(value) -> str:
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ''.join(f'{key}="{escape(value)}",' for key, value in labels.items())
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.request_latency: Dict[Tuple[str, str], Histogram] = {}
+        self.request_size: Dict[str, Histogram] = {}
+        self.response_size: Dict[str, Histogram] = {}
+        self.responses: Dict[Tuple[str, str, int], int] = {}
+        self.storage_latency: Dict[Tuple[str, str], Histogram] = {}
+        self._collectors: List[Callable[[], Iterable[str]]] = []
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float,
+                        request_bytes: Optional[int] = None, response_bytes: Optional[int] = None):
+        with self._lock:
+            self._histogram(self.request_latency, (method, route), LATENCY_BUCKETS).observe(seconds)
+            key = (method, route, status)
+            self.responses[key] = self.responses.get(key, 0) + 1
+            if request_bytes is not None:
+                self._histogram(self.request_size, route, SIZE_BUCKETS).observe(request_bytes)
+            if response_bytes is not None:
+                self._histogram(self.response_size, route, SIZE_BUCKETS).observe(response_bytes)
+
+    def observe_storage(self, operation: str, collection: str, seconds: float):
+        with self._lock:
+            self._histogram(self.storage_latency, (operation, collection), LATENCY_BUCKETS).observe(seconds)
+
+    def add_collector(self, collect: Callable[[], Iterable[str]]):
+        """Extra exposition lines computed at scrape time (e.g. cache or write-batch counters)"""
+        self._collectors.append(collect)
+
+    @staticmethod
+    def _histogram(histograms: Dict, key, buckets: Sequence[float]) -> Histogram:
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = Histogram(buckets)
+        return histogram
+
+    def render(self) -> str:
+        lines = [
+            '# HELP compliance_process_info Worker process serving this scrape',
+            '# TYPE compliance_process_info gauge',
+            f'compliance_process_info{{pid="{os.getpid()}"}} 1',
+            '# HELP compliance_process_start_time_seconds Start time of the process since unix epoch',
+            '# TYPE compliance_process_start_time_seconds gauge',
+            f'compliance_process_start_time_seconds {self.started}',
+        ]
+        with self._lock:
+            lines += ['# HELP http_request_duration_seconds Request latency by route',
+                      '# TYPE http_request_duration_seconds histogram']
+            for (method, route), histogram in sorted(self.request_latency.items()):
+                lines.extend(histogram.lines('http_request_duration_seconds', _labels(method=method, route=route)))
+            lines += ['# HELP http_requests_total Responses by route and status code',
+                      '# TYPE http_requests_total counter']
+            for (method, route, status), count in sorted(self.responses.items()):
+                lines.append(f'http_requests_total{{{_labels(method=method, route=route, status=status).rstrip(",")}}} {count}')
+            for name, histograms, help_text in (
+                    ('http_request_size_bytes', self.request_size, 'Request body size by route'),
+                    ('http_response_size_bytes', self.response_size, 'Response body size by route (buffered responses only)')):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for route, histogram in sorted(histograms.items()):
+                    lines.extend(histogram.lines(name, _labels(route=route)))
+            lines += ['# HELP storage_operation_duration_seconds Storage call latency by operation and collection',
+                      '# TYPE storage_operation_duration_seconds histogram']
+            for (operation, collection), histogram in sorted(self.storage_latency.items()):
+                lines.extend(histogram.lines('storage_operation_duration_seconds',
+                                             _labels(operation=operation, collection=collection)))
+        for collect in self._collectors:
+            lines.extend(collect())
+        return '\n'.join(lines) + '\n'
+
+
+def instrument_storage(storage, metrics: Metrics):
+    """Time the storage backend's read and write calls.
+
+    Iterators are timed from the call until they are exhausted, so streamed
+    listings report the full time spent reading rows.
+    """
+    def timed(operation: str, method: Callable) -> Callable:
+        @functools.wraps(method)
+        def call(collection, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(collection, *args, **kwargs)
+            finally:
+                metrics.observe_storage(operation, collection, time.perf_counter() - start)
+        return call
+
+    def timed_iter(operation: str, method: Callable) -> Callable:
+        @functools.wraps(method)
+        def call(collection, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                yield from method(collection, *args, **kwargs)
+            finally:
+                metrics.observe_storage(operation, collection, time.perf_counter() - start)
+        return call
+
+    for operation in STORAGE_READS + STORAGE_WRITES:
+        wrap = timed_iter if operation in ('iter', 'iter_raw') else timed
+        setattr(storage, operation, wrap(operation, getattr(storage, operation)))
+
+    def write_batches() -> Iterable[str]:
+        stats = storage.write_stats()
+        return ['# HELP storage_writes_total Writes committed through the group-commit writer',
+                '# TYPE storage_writes_total counter',
+                f'storage_writes_total {stats["writes"]}',
+                '# HELP storage_write_batches_total Transactions (fsyncs) used for those writes',
+                '# TYPE storage_write_batches_total counter',
+                f'storage_write_batches_total {stats["batches"]}']
+    metrics.add_collector(write_batches)
+    return storage
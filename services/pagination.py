@@ -0,0 +1,56 @@
+import base64
+import binascii
+import json
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+def encode_cursor(key: Sequence) -> str:
+    """Opaque, URL-safe cursor for a position in an ordered listing"""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip('=')
+
+
+def _is_kind(value, kind: type) -> bool:
+    # JSON true/false decode to bool, which is an int subclass; a float position also takes ints
+    if isinstance(value, bool):
+        return False
+    return isinstance(value, (int, float) if kind is float else kind)
+
+
+def decode_cursor(cursor: str, kinds: Sequence[type] = (int,)) -> Tuple:
+    """Inverse of encode_cursor; raises ValueError unless it holds one value of each of `kinds` (int, str or float)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        key = tuple(json.loads(base64.urlsafe_b64decode(padded.encode())))
+    except (ValueError, TypeError, binascii.Error):
+        key = ()
+    if len(key) != len(kinds) or not all(_is_kind(part, kind) for part, kind in zip(key, kinds)):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return key
+
+
+def parse_fields(value: Optional[str]) -> Optional[List[str]]:
+    """?fields=id,name,framework -> ['id', 'name', 'framework']"""
+    if not value:
+        return None
+    return [field.strip() for field in value.split(',') if field.strip()]
+
+
+def project(record: Dict, fields: List[str]) -> Dict:
+    return {field: record[field] for field in fields if field in record}
+
+
+def summarize(record: Dict) -> Dict:
+    """Drop embedded lists of objects (e.g. assessment controls), keeping only their length"""
+    summary = {}
+    for key, value in record.items():
+        if isinstance(value, list) and any(isinstance(item, dict) for item in value):
+            summary[f"{key}_count"] = len(value)
+        else:
+            summary[key] = value
+    return summary
+
+
+def shape(record: Dict, fields: Optional[List[str]] = None, summary: bool = False) -> Dict:
+    if summary:
+        record = summarize(record)
+    return project(record, fields) if fields else record
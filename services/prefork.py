@@ -0,0 +1,195 @@
+"""Pre-forking, threaded WSGI server for production use.
+
+The master process binds the listening socket once and forks `workers`
+processes that each import the app fresh (so no SQLite handle or writer
+thread crosses a fork) and serve it with `threads` request threads.
+
+Signals sent to the master:
+  SIGHUP         graceful restart: start a new generation of workers, then let
+                 the old ones finish their in-flight requests and exit
+  SIGTERM/SIGINT graceful shutdown
+Workers that die unexpectedly are replaced.
+
+Usage: python services/prefork.py local_server:app --workers 4 --threads 8
+       python services/prefork.py local_server:app --chdir compliance-platform-opensource
+"""
+import argparse
+import importlib
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, Optional
+
+
+def load_app(spec: str):
+    """'module:attribute' -> WSGI app"""
+    module_name, _, attribute = spec.partition(':')
+    module = importlib.import_module(module_name)
+    return getattr(module, attribute or 'app')
+
+
+def _run_worker(spec: str, sock: socket.socket, threads: int):
+    from werkzeug.serving import ThreadedWSGIServer
+
+    for sig in (signal.SIGHUP, signal.SIGINT):
+        signal.signal(sig, signal.SIG_IGN)
+    app = load_app(spec)
+    host, port = sock.getsockname()[:2]
+    server = ThreadedWSGIServer(host, port, app, fd=sock.fileno())
+    # Non-daemon request threads let server_close() wait for in-flight requests
+    server.daemon_threads = False
+    # At most `threads` requests in flight; beyond that this worker stops accepting
+    # and the kernel hands new connections to the other workers
+    slots = threading.BoundedSemaphore(threads)
+    spawn_request_thread = server.process_request
+
+    def process_request(request, client_address):
+        slots.acquire()
+        try:
+            spawn_request_thread(request, client_address)
+        except Exception:
+            slots.release()
+            raise
+
+    def process_request_thread(request, client_address):
+        try:
+            type(server).process_request_thread(server, request, client_address)
+        finally:
+            slots.release()
+
+    server.process_request = process_request
+    server.process_request_thread = process_request_thread
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+    os._exit(0)
+
+
+class Master:
+    def __init__(self, spec: str, sock: socket.socket, workers: int, threads: int, timeout: float = 30):
+        self.spec = spec
+        self.sock = sock
+        self.workers = workers
+        self.threads = threads
+        self.timeout = timeout
+        self.generation = 0
+        self.children: Dict[int, int] = {}  # pid -> generation
+        self.started: Dict[int, float] = {}
+        self._respawn_at = 0.0
+        self._restart = False
+        self._stopping = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _run_worker(self.spec, self.sock, self.threads)
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                os._exit(1)
+        self.children[pid] = self.generation
+        self.started[pid] = time.monotonic()
+        return pid
+
+    def stop_generation(self, generation: Optional[int] = None):
+        for pid, gen in list(self.children.items()):
+            if generation is None or gen == generation:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+
+    def reap(self) -> bool:
+        reaped = False
+        while self.children:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                break
+            if pid == 0:
+                break
+            self.children.pop(pid, None)
+            if not self._stopping and time.monotonic() - self.started.pop(pid, 0) < 1:
+                # Crashed on startup (e.g. import error): don't respawn in a tight loop
+                self._respawn_at = time.monotonic() + 5
+            reaped = True
+        return reaped
+
+    def run(self):
+        signal.signal(signal.SIGHUP, lambda *_: setattr(self, '_restart', True))
+        signal.signal(signal.SIGTERM, lambda *_: setattr(self, '_stopping', True))
+        signal.signal(signal.SIGINT, lambda *_: setattr(self, '_stopping', True))
+        for _ in range(self.workers):
+            self.spawn()
+        print(f"Master {os.getpid()} serving {self.spec} with {self.workers} workers x {self.threads} threads")
+
+        while not self._stopping:
+            time.sleep(0.2)
+            self.reap()
+            if self._restart:
+                self._restart = False
+                old = self.generation
+                self.generation += 1
+                for _ in range(self.workers):
+                    self.spawn()
+                self.stop_generation(old)
+                print(f"Graceful restart: generation {self.generation} started")
+            if time.monotonic() < self._respawn_at:
+                continue
+            current = sum(1 for gen in self.children.values() if gen == self.generation)
+            for _ in range(self.workers - current):
+                self.spawn()
+
+        self.stop_generation()
+        deadline = time.monotonic() + self.timeout
+        while self.children and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in list(self.children):
+            os.kill(pid, signal.SIGKILL)
+        self.reap()
+        self.sock.close()
+
+
+def serve(spec: str, host: str = '0.0.0.0', port: int = 8000, workers: Optional[int] = None,
+          threads: int = 8, timeout: float = 30):
+    """Serve `spec` ('module:app') with a pre-forked worker pool"""
+    workers = workers or os.cpu_count() or 2
+    if not hasattr(os, 'fork'):
+        # No fork() (Windows): one process with a bounded number of threads
+        from werkzeug.serving import run_simple
+        print("os.fork() is not available; serving with a single threaded process")
+        run_simple(host, port, load_app(spec), threaded=True, use_reloader=False, use_debugger=False)
+        return
+    sock = socket.create_server((host, port), backlog=1024, reuse_port=False)
+    sock.set_inheritable(True)
+    Master(spec, sock, workers, threads, timeout).run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-forking WSGI server')
+    parser.add_argument('app', help="WSGI app as 'module:attribute', e.g. local_server:app")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--threads', type=int, default=8, help='request threads per worker')
+    parser.add_argument('--timeout', type=float, default=30, help='seconds to wait for workers on shutdown')
+    parser.add_argument('--chdir', help='directory containing the app module')
+    args = parser.parse_args()
+
+    if args.chdir:
+        os.chdir(args.chdir)
+    sys.path.insert(0, os.getcwd())
+    serve(args.app, args.host, args.port, args.workers, args.threads, args.timeout)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class CacheEntry:
+    """Parsed records plus their serialized response body for one storage version"""
+
+    def __init__(self, version: int, data: Any, dumps: Callable[[Any], str]):
+        self.version = version
+        self.data = data
+        self._dumps = dumps
+        self._body = None
+        self._encoded: Dict[str, bytes] = {}
+
+    @property
+    def body(self) -> bytes:
+        if self._body is None:
+            self._body = self._dumps(self.data).encode('utf-8')
+        return self._body
+
+    def encoded(self, encoding: str, compress: Callable[[bytes, str], bytes]) -> bytes:
+        """Body compressed with `encoding`, computed once per entry"""
+        if encoding not in self._encoded:
+            self._encoded[encoding] = compress(self.body, encoding)
+        return self._encoded[encoding]
+
+
+class ReadCache:
+    """Shared cache for collection reads, invalidated by the storage version counter"""
+
+    def __init__(self, storage, dumps: Callable[[Any], str]):
+        self.storage = storage
+        self.dumps = dumps
+        self._entries: Dict[Hashable, CacheEntry] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, collection: str, variant: Hashable = None,
+            build: Optional[Callable[[], Any]] = None) -> CacheEntry:
+        """Return the cached entry for (collection, variant), rebuilding it if the data changed"""
+        # Read the version before the data so a concurrent write can only make the entry stale
+        version = self.storage.version(collection)
+        key = (collection, variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.version == version:
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        data = build() if build else self.storage.list(collection)
+        entry = CacheEntry(version, data, self.dumps)
+        with self._lock:
+            current = self._entries.get(key)
+            if current is None or current.version <= version:
+                self._entries[key] = entry
+        return entry
+
+    def invalidate(self, collection: Optional[str] = None):
+        with self._lock:
+            if collection is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if k[0] == collection]:
+                    del self._entries[key]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups * 100, 1) if lookups else 0.0,
+                "entries": len(self._entries)
+            }
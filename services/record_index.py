@@ -0,0 +1,30 @@
+from typing import Dict, Optional
+
+from services.derived_index import DerivedIndex
+
+
+class RecordIndex(DerivedIndex):
+    """In-memory id -> record map for one collection, so lookups by id skip storage"""
+
+    def _empty_state(self) -> Dict[str, Dict]:
+        return {}
+
+    def _apply(self, state: Dict[str, Dict], record: Dict, sign: int):
+        if record.get('id') is None:
+            return
+        key = str(record['id'])
+        if sign < 0:
+            state.pop(key, None)
+        else:
+            # Like storage.get(), the first record stored under an id wins
+            state.setdefault(key, record)
+
+    def get(self, key) -> Optional[Dict]:
+        self._ensure_current()
+        with self._lock:
+            return self._state.get(str(key))
+
+    def __len__(self) -> int:
+        self._ensure_current()
+        with self._lock:
+            return len(self._state)
@@ -0,0 +1,150 @@
+import csv
+from datetime import datetime
+from typing import Dict, Iterator, Optional, Tuple
+
+from services.compliance_counters import COUNT_FIELDS, compliance_score, count_controls
+from services.storage import open_storage
+
+# Columns of the per-control rows in every format
+COLUMNS = [
+    ('assessment_id', 'Assessment ID'),
+    ('assessment', 'Assessment'),
+    ('framework', 'Framework'),
+    ('control_id', 'Control ID'),
+    ('control', 'Control'),
+    ('status', 'Status'),
+    ('test_status', 'Test Status'),
+    ('test_result', 'Test Result'),
+    ('risk_level', 'Risk Level'),
+    ('progress', 'Progress')
+]
+
+# format -> file extension
+FORMATS = {'excel': 'xlsx', 'xlsx': 'xlsx', 'pdf': 'pdf', 'csv': 'csv'}
+
+
+def _selected(assessment: Dict, params: Dict) -> bool:
+    if params.get('framework') and assessment.get('framework') != params['framework']:
+        return False
+    ids = params.get('assessment_ids')
+    return not ids or str(assessment.get('id')) in {str(i) for i in ids}
+
+
+def iter_rows(storage, params: Dict, totals: Dict[str, Dict[str, int]]) -> Iterator[Tuple[Dict, Dict]]:
+    """(assessment, row) per control of the selected assessments, streamed from storage.
+
+    Control counts per framework are added to `totals` on the way through, so
+    the summary needs no second pass.
+    """
+    for assessment in storage.iter('assessments'):
+        if not _selected(assessment, params):
+            continue
+        controls = assessment.get('controls') or []
+        counts = count_controls(controls)
+        entry = totals.setdefault(assessment.get('framework', 'Unknown Framework'), dict.fromkeys(COUNT_FIELDS, 0))
+        for field in COUNT_FIELDS:
+            entry[field] += counts[field]
+        for control in controls:
+            yield assessment, {
+                'assessment_id': assessment.get('id'),
+                'assessment': assessment.get('name'),
+                'framework': assessment.get('framework'),
+                'control_id': control.get('id'),
+                'control': control.get('name'),
+                'status': control.get('status'),
+                'test_status': control.get('test_status'),
+                'test_result': control.get('test_result'),
+                'risk_level': control.get('risk_level'),
+                'progress': control.get('progress')
+            }
+
+
+def _summary(totals: Dict[str, Dict[str, int]]) -> Iterator[Tuple[str, Dict]]:
+    overall = dict.fromkeys(COUNT_FIELDS, 0)
+    for framework in sorted(totals):
+        for field in COUNT_FIELDS:
+            overall[field] += totals[framework][field]
+        yield framework, compliance_score(totals[framework])
+    yield 'All frameworks', compliance_score(overall)
+
+
+def _cell(value):
+    return value if value is None or isinstance(value, (str, int, float, bool)) else str(value)
+
+
+def write_excel(storage, params: Dict, path: str):
+    from openpyxl import Workbook
+
+    totals = {}
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Controls')
+    sheet.append([title for _, title in COLUMNS])
+    for _, row in iter_rows(storage, params, totals):
+        sheet.append([_cell(row[key]) for key, _ in COLUMNS])
+    summary = workbook.create_sheet('Summary')
+    summary.append(['Framework', 'Controls', 'Implemented', 'Tested', 'Passed', 'Compliance %'])
+    for framework, score in _summary(totals):
+        summary.append([framework, score['total_controls'], score['implemented_controls'],
+                        score['tested_controls'], score['passed_controls'], score['overall_score']])
+    workbook.save(path)
+
+
+def write_csv(storage, params: Dict, path: str):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow([title for _, title in COLUMNS])
+        for _, row in iter_rows(storage, params, {}):
+            writer.writerow([row[key] for key, _ in COLUMNS])
+
+
+def write_pdf(storage, params: Dict, path: str):
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+    pdf.set_font('Helvetica', 'B', 16)
+    pdf.cell(0, 10, f"{params.get('framework') or 'Compliance'} Report", new_x='LMARGIN', new_y='NEXT', align='C')
+    pdf.set_font('Helvetica', size=10)
+    pdf.cell(0, 8, f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", new_x='LMARGIN', new_y='NEXT')
+
+    totals, current = {}, None
+    for assessment, row in iter_rows(storage, params, totals):
+        if assessment.get('id') != current:
+            current = assessment.get('id')
+            pdf.ln(4)
+            pdf.set_font('Helvetica', 'B', 12)
+            pdf.multi_cell(0, 7, f"{assessment.get('name')} ({assessment.get('framework')})",
+                           new_x='LMARGIN', new_y='NEXT')
+            pdf.set_font('Helvetica', size=9)
+        pdf.multi_cell(0, 5, f"{row['control_id']}  {row['control']}  -  {row['status']}, "
+                             f"{row['test_status']}/{row['test_result']}, risk {row['risk_level']}",
+                       new_x='LMARGIN', new_y='NEXT')
+
+    pdf.add_page()
+    pdf.set_font('Helvetica', 'B', 14)
+    pdf.cell(0, 10, "Summary", new_x='LMARGIN', new_y='NEXT')
+    pdf.set_font('Helvetica', size=10)
+    for framework, score in _summary(totals):
+        pdf.cell(0, 7, f"{framework}: {score['total_controls']} controls, {score['implemented_controls']} implemented, "
+                       f"{score['passed_controls']} passed ({score['overall_score']}%)", new_x='LMARGIN', new_y='NEXT')
+    pdf.output(path)
+
+
+WRITERS = {'xlsx': write_excel, 'csv': write_csv, 'pdf': write_pdf}
+
+
+# The export worker process's storage handle, opened once by init_worker
+_storage = None
+
+
+def init_worker(backend: Optional[str] = None, data_dir: Optional[str] = None):
+    """Process pool initializer: one read-only storage handle per export worker, reused by every render"""
+    global _storage
+    _storage = open_storage(backend, data_dir, readonly=True)
+
+
+def render(format: str, params: Dict, path: str, storage=None) -> str:
+    """Write the compliance report to `path` from `storage` (default: the worker's read-only handle)"""
+    WRITERS[FORMATS[format]](storage or _storage, params, path)
+    return path
@@ -0,0 +1,728 @@
+import copy
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Callable, Collection, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+COLLECTIONS = ("assessments", "controls", "audit_plans", "reports")
+
+
+def _record_key(record: Dict) -> Optional[str]:
+    key = record.get('id') if isinstance(record, dict) else None
+    return None if key is None else str(key)
+
+
+def record_etag(record: Dict) -> str:
+    """Content hash of a record, used as its ETag for optimistic concurrency"""
+    canonical = json.dumps(record, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+class ConflictError(Exception):
+    """The record changed since the caller read it (If-Match did not match)"""
+
+    def __init__(self, current: Dict):
+        super().__init__("Record was modified by another request")
+        self.current = current
+
+
+class DuplicateIdError(ValueError):
+    """A bulk-written record carries the id of a stored record (or of an earlier one in the bulk)"""
+
+    def __init__(self, key: str, index: int):
+        super().__init__(f"id {key} is already taken")
+        self.key = key
+        self.index = index
+
+
+def _check_etag(record: Dict, expected_etags: Optional[Collection[str]]):
+    if expected_etags and record_etag(record) not in expected_etags:
+        raise ConflictError(record)
+
+
+def _apply_changes(record: Dict, changes: Dict) -> Dict:
+    """Shallow merge of a partial update; the record id never changes"""
+    updated = {**record, **changes}
+    if 'id' in record:
+        updated['id'] = record['id']
+    return updated
+
+
+def _atomic_write_json(path: str, data):
+    """Write to a temp file, fsync, then rename over the target so readers never see a partial file"""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class GroupCommitter:
+    """Single writer thread that commits concurrent writes together.
+
+    Callers block in submit() until their write is durable. The writer takes every
+    write already queued and, when the previous batch showed concurrent writers,
+    waits up to `window` seconds for more, then hands the batch to `commit`, which
+    applies it in one transaction (one fsync) and returns a result or exception
+    per write.
+    """
+
+    def __init__(self, commit: Callable[[List[Callable]], List], window: float = 0.002,
+                 max_batch: int = 256):
+        self._commit = commit
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._last_batch_size = 0
+        self.batches = 0
+        self.writes = 0
+        self._thread = threading.Thread(target=self._run, name="storage-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, op: Callable):
+        future = Future()
+        self._queue.put((op, future))
+        return future.result()
+
+    def _collect(self) -> List:
+        batch = [self._queue.get()]
+        wait = self.window if self._last_batch_size > 1 else 0
+        deadline = time.monotonic() + wait
+        while len(batch) < self.max_batch and batch[-1] is not None:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0
+                             else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            stop = batch[-1] is None
+            writes = [item for item in batch if item is not None]
+            if writes:
+                try:
+                    results = self._commit([op for op, _ in writes])
+                except Exception as e:
+                    results = [e] * len(writes)
+                for (_, future), result in zip(writes, results):
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+                self._last_batch_size = len(writes)
+                self.batches += 1
+                self.writes += len(writes)
+            if stop:
+                return
+
+    def stats(self) -> Dict:
+        return {
+            "writes": self.writes,
+            "batches": self.batches,
+            "writes_per_batch": round(self.writes / self.batches, 2) if self.batches else 0.0
+        }
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+
+class _ReadOnlyWriter:
+    """Stands in for the GroupCommitter of a storage opened read-only"""
+
+    def submit(self, op: Callable):
+        raise PermissionError("Storage is open read-only")
+
+    def stats(self) -> Dict:
+        return {}
+
+    def close(self):
+        pass
+
+
+@contextmanager
+def _interprocess_lock(path: str):
+    """Exclusive advisory lock on `path`, shared by every worker process using the data dir"""
+    try:
+        import fcntl
+    except ImportError:  # Windows: single-process serving only
+        yield
+        return
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class _Listeners:
+    """Write notifications for derived indexes: fn(collection, version, old, new)"""
+
+    def subscribe(self, listener: Callable[[str, int, Optional[Dict], Optional[Dict]], None]):
+        self._listeners.append(listener)
+
+    def _notify(self, collection: str, version: int, old: Optional[Dict], new: Optional[Dict]):
+        for listener in self._listeners:
+            listener(collection, version, old, new)
+
+
+class JSONStorage(_Listeners):
+    """Legacy backend: one JSON list per collection, rewritten (atomically) on every commit"""
+
+    name = "json"
+
+    def __init__(self, data_dir="data", group_commit_window: float = 0.002, readonly: bool = False):
+        self.data_dir = data_dir
+        self._lock = threading.RLock()
+        self._listeners = []
+        self._cache = {}
+        self._versions = {}
+        self._next_ids = {}
+        self._working = None
+        # Versions are counted per process here, so they only mean something within it
+        self.instance_id = f"{os.getpid()}-{uuid.uuid4().hex}"
+        os.makedirs(self.data_dir, exist_ok=True)
+        self._writer = _ReadOnlyWriter() if readonly else GroupCommitter(self._commit_batch, window=group_commit_window)
+
+    def path(self, collection: str) -> str:
+        return os.path.join(self.data_dir, f"{collection}.json")
+
+    def _load(self, collection: str) -> List[Dict]:
+        path = self.path(collection)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self._cache[collection] = (None, [])
+            return []
+        identity = (stat.st_mtime_ns, stat.st_size)
+        cached = self._cache.get(collection)
+        if cached and cached[0] == identity:
+            return cached[1]
+        with open(path, 'r') as f:
+            content = f.read().strip()
+        try:
+            records = json.loads(content) if content else []
+        except json.JSONDecodeError:
+            logger.warning("Ignoring invalid JSON in %s", path)
+            records = []
+        if not isinstance(records, list):
+            records = []
+        if cached is not None:
+            self._versions[collection] = self._versions.get(collection, 0) + 1
+        ids = [r.get('id') for r in records if isinstance(r, dict) and isinstance(r.get('id'), int)]
+        self._next_ids[collection] = max(self._next_ids.get(collection, 1), max(ids, default=0) + 1)
+        self._cache[collection] = (identity, records)
+        return records
+
+    def _save(self, collection: str, records: List[Dict]):
+        path = self.path(collection)
+        _atomic_write_json(path, records)
+        stat = os.stat(path)
+        self._cache[collection] = ((stat.st_mtime_ns, stat.st_size), records)
+
+    def _records_for_write(self, collection: str) -> List[Dict]:
+        """Working copy of a collection for the batch being committed"""
+        if collection not in self._working:
+            self._working[collection] = list(self._load(collection))
+        return self._working[collection]
+
+    def _bump(self, collection: str, count: int = 1) -> int:
+        self._versions[collection] = self._versions.get(collection, 0) + count
+        return self._versions[collection]
+
+    def _commit_batch(self, ops: List[Callable]) -> List:
+        results, events = [], []
+        # The file lock keeps read-modify-write cycles from other worker processes apart;
+        # _load() then sees their rewrites through the changed mtime/size
+        with self._lock, _interprocess_lock(os.path.join(self.data_dir, '.write.lock')):
+            self._working = {}
+            try:
+                for op in ops:
+                    op_events = []
+                    try:
+                        results.append(op(op_events))
+                        events.extend(op_events)
+                    except Exception as e:
+                        results.append(e)
+                # One atomic rewrite per touched file for the whole batch
+                for collection, records in self._working.items():
+                    self._save(collection, records)
+            finally:
+                self._working = None
+            for event in events:
+                self._notify(*event)
+        return results
+
+    def list(self, collection: str) -> List[Dict]:
+        with self._lock:
+            return list(self._load(collection))
+
+    def iter(self, collection: str) -> Iterator[Dict]:
+        return iter(self.list(collection))
+
+    def iter_raw(self, collection: str) -> Iterator[str]:
+        return (json.dumps(record) for record in self.list(collection))
+
+    def count(self, collection: str) -> int:
+        with self._lock:
+            return len(self._load(collection))
+
+    def page(self, collection: str, after: int = 0, limit: int = 100) -> Tuple[List[Dict], Optional[int]]:
+        """Records after sequence number `after` (1-based position here), plus the next position"""
+        with self._lock:
+            records = self._load(collection)
+            chunk = records[after:after + limit]
+            end = after + len(chunk)
+            return list(chunk), (end if end < len(records) else None)
+
+    def get(self, collection: str, key) -> Optional[Dict]:
+        key = str(key)
+        with self._lock:
+            for record in self._load(collection):
+                if _record_key(record) == key:
+                    return record
+        return None
+
+    def insert(self, collection: str, record: Dict, assign_id: bool = False) -> Dict:
+        return self._writer.submit(lambda events: self._insert(events, collection, record, assign_id))
+
+    def _insert(self, events: List, collection: str, record: Dict, assign_id: bool) -> Dict:
+        records = self._records_for_write(collection)
+        if assign_id:
+            record = {'id': self._next_ids.get(collection, 1), **record}
+        if isinstance(record.get('id'), int):
+            self._next_ids[collection] = max(self._next_ids.get(collection, 1), record['id'] + 1)
+        records.append(record)
+        events.append((collection, self._bump(collection), None, record))
+        return record
+
+    def bulk_write(self, collection: str, records: List[Dict], upsert_key: Optional[str] = None,
+                   defaults: Optional[Dict] = None) -> List[Tuple[str, Dict]]:
+        """Write all records in one commit; see SQLiteStorage.bulk_write"""
+        return self._writer.submit(lambda events: self._bulk_write(events, collection, records, upsert_key, defaults))
+
+    def _bulk_write(self, events: List, collection: str, records: List[Dict],
+                    upsert_key: Optional[str], defaults: Optional[Dict]) -> List[Tuple[str, Dict]]:
+        # Changes go to a copy, so a rejected bulk leaves the batch's working records untouched
+        working = self._records_for_write(collection)
+        stored = list(working)
+        positions = {}
+        if upsert_key:
+            for index, record in enumerate(stored):
+                if isinstance(record, dict) and record.get(upsert_key) is not None:
+                    positions.setdefault(record[upsert_key], index)
+        keys = {_record_key(record) for record in stored}
+        results = []
+        for position, record in enumerate(records):
+            index = positions.get(record[upsert_key]) if upsert_key else None
+            if index is not None:
+                old = stored[index]
+                stored[index] = _apply_changes(old, record)
+                events.append((collection, self._bump(collection), old, stored[index]))
+                results.append(('updated', stored[index]))
+                continue
+            if defaults:
+                record = {**copy.deepcopy(defaults), **record}
+            if 'id' not in record:
+                next_id = self._next_ids.get(collection, 1)
+                # Skip ids held by records the counter does not know of (string ids such as "7")
+                while str(next_id) in keys:
+                    next_id += 1
+                record = {'id': next_id, **record}
+            elif _record_key(record) in keys:
+                raise DuplicateIdError(_record_key(record), position)
+            if isinstance(record['id'], int):
+                self._next_ids[collection] = max(self._next_ids.get(collection, 1), record['id'] + 1)
+            keys.add(_record_key(record))
+            stored.append(record)
+            if upsert_key:
+                positions[record[upsert_key]] = len(stored) - 1
+            events.append((collection, self._bump(collection), None, record))
+            results.append(('inserted', record))
+        working[:] = stored
+        return results
+
+    def update(self, collection: str, key, changes: Dict,
+               expected_etags: Optional[Collection[str]] = None) -> Optional[Dict]:
+        """Merge `changes` into the record with this id; None if it does not exist"""
+        return self._writer.submit(
+            lambda events: self._update(events, collection, str(key), changes, expected_etags))
+
+    def delete(self, collection: str, key,
+               expected_etags: Optional[Collection[str]] = None) -> Optional[Dict]:
+        """Remove the record with this id and return it; None if it does not exist"""
+        return self._writer.submit(
+            lambda events: self._update(events, collection, str(key), None, expected_etags))
+
+    def _update(self, events: List, collection: str, key: str, changes: Optional[Dict],
+                expected_etags: Optional[Collection[str]]) -> Optional[Dict]:
+        records = self._records_for_write(collection)
+        for index, record in enumerate(records):
+            if _record_key(record) == key:
+                break
+        else:
+            return None
+        _check_etag(record, expected_etags)
+        if changes is None:
+            del records[index]
+            events.append((collection, self._bump(collection), record, None))
+            return record
+        updated = _apply_changes(record, changes)
+        records[index] = updated
+        events.append((collection, self._bump(collection), record, updated))
+        return updated
+
+    def version(self, collection: str) -> int:
+        with self._lock:
+            self._load(collection)
+            return self._versions.get(collection, 0)
+
+    def write_stats(self) -> Dict:
+        return self._writer.stats()
+
+    def close(self):
+        self._writer.close()
+
+
+class SQLiteStorage(_Listeners):
+    """Default backend: one SQLite row per record, indexed by record id"""
+
+    name = "sqlite"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS records (
+            collection TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            key TEXT,
+            body TEXT NOT NULL,
+            PRIMARY KEY (collection, seq)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_records_key ON records (collection, key);
+        CREATE INDEX IF NOT EXISTS idx_records_external_id
+            ON records (collection, json_extract(body, '$.external_id'));
+        CREATE TABLE IF NOT EXISTS meta (
+            collection TEXT PRIMARY KEY,
+            next_seq INTEGER NOT NULL,
+            version INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS store_info (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, data_dir="data", filename="compliance.db", group_commit_window: float = 0.002,
+                 readonly: bool = False):
+        self.data_dir = data_dir
+        os.makedirs(self.data_dir, exist_ok=True)
+        self.db_path = os.path.join(data_dir, filename)
+        self._lock = threading.RLock()
+        self._listeners = []
+        if readonly:
+            # An existing database only: no schema, no writer thread, and SQLite refuses writes
+            self._conn = sqlite3.connect(f"file:{os.path.abspath(self.db_path)}?mode=ro", uri=True,
+                                         isolation_level=None, check_same_thread=False, timeout=30)
+            self.instance_id = self._conn.execute(
+                "SELECT value FROM store_info WHERE key = 'instance_id'").fetchone()[0]
+            self._writer = _ReadOnlyWriter()
+            return
+        self._conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False,
+                                     timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Every commit is fsynced; group commit keeps that to one fsync per batch
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.executescript(self.SCHEMA)
+        # Versions live in the database, so they are shared by every process using it;
+        # instance_id tells them apart from the versions of a recreated database
+        self._conn.execute("INSERT OR IGNORE INTO store_info (key, value) VALUES ('instance_id', ?)",
+                           (uuid.uuid4().hex,))
+        self.instance_id = self._conn.execute(
+            "SELECT value FROM store_info WHERE key = 'instance_id'").fetchone()[0]
+        self._writer = GroupCommitter(self._commit_batch, window=group_commit_window)
+
+    def import_legacy(self, legacy: JSONStorage, collections=COLLECTIONS) -> Dict[str, int]:
+        """Copy legacy JSON files into collections that have never been initialized"""
+        imported = {}
+        with self._lock:
+            for collection in collections:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    exists = self._conn.execute(
+                        "SELECT 1 FROM meta WHERE collection = ?", (collection,)).fetchone()
+                    if exists:
+                        self._conn.execute("COMMIT")
+                        continue
+                    records = legacy.list(collection)
+                    self._conn.executemany(
+                        "INSERT INTO records (collection, seq, key, body) VALUES (?, ?, ?, ?)",
+                        ((collection, seq, _record_key(r), json.dumps(r))
+                         for seq, r in enumerate(records, start=1)))
+                    int_ids = [r.get('id') for r in records
+                               if isinstance(r, dict) and isinstance(r.get('id'), int)]
+                    next_seq = max([len(records)] + int_ids) + 1
+                    self._conn.execute(
+                        "INSERT INTO meta (collection, next_seq, version) VALUES (?, ?, 0)",
+                        (collection, next_seq))
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+                if records:
+                    imported[collection] = len(records)
+        return imported
+
+    def list(self, collection: str) -> List[Dict]:
+        return list(self.iter(collection))
+
+    def iter(self, collection: str) -> Iterator[Dict]:
+        return (json.loads(body) for body in self.iter_raw(collection))
+
+    def iter_raw(self, collection: str, batch_size: int = 500) -> Iterator[str]:
+        """Serialized records in seq order, fetched in batches so memory stays flat"""
+        after = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT seq, body FROM records WHERE collection = ? AND seq > ? ORDER BY seq LIMIT ?",
+                    (collection, after, batch_size)).fetchall()
+            for _, body in rows:
+                yield body
+            if len(rows) < batch_size:
+                return
+            after = rows[-1][0]
+
+    def count(self, collection: str) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM records WHERE collection = ?", (collection,)).fetchone()[0]
+
+    def page(self, collection: str, after: int = 0, limit: int = 100) -> Tuple[List[Dict], Optional[int]]:
+        """Up to `limit` records with seq greater than `after`, plus the seq to continue from"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, body FROM records WHERE collection = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (collection, after, limit + 1)).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        return [json.loads(body) for _, body in rows], (rows[-1][0] if more else None)
+
+    def get(self, collection: str, key) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body FROM records WHERE collection = ? AND key = ? ORDER BY seq LIMIT 1",
+                (collection, str(key))).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def insert(self, collection: str, record: Dict, assign_id: bool = False) -> Dict:
+        return self._writer.submit(lambda events: self._insert(events, collection, record, assign_id))
+
+    def _insert(self, events: List, collection: str, record: Dict, assign_id: bool) -> Dict:
+        row = self._conn.execute(
+            "SELECT next_seq FROM meta WHERE collection = ?", (collection,)).fetchone()
+        record, seq = self._place(collection, record, row[0] if row else 1, assign_id)
+        self._conn.execute(
+            "INSERT INTO records (collection, seq, key, body) VALUES (?, ?, ?, ?)",
+            (collection, seq, _record_key(record), json.dumps(record)))
+        events.append((collection, self._bump(collection, next_seq=seq + 1), None, record))
+        return record
+
+    def _id_taken(self, collection: str, key: str) -> bool:
+        return self._conn.execute("SELECT 1 FROM records WHERE collection = ? AND key = ?",
+                                  (collection, key)).fetchone() is not None
+
+    def _place(self, collection: str, record: Dict, next_seq: int, assign_id: bool) -> Tuple[Dict, int]:
+        """The record as stored (with a free id when assigning one) and the seq of its row.
+
+        An integer id is also its row's seq, unless a record imported out of order
+        holds that seq; callers move next_seq past the seq returned.
+        """
+        if 'id' not in record:
+            if not assign_id:
+                return record, next_seq
+            # Skip ids held by records the counter does not know of (string ids, rows from older versions)
+            while self._id_taken(collection, str(next_seq)):
+                next_seq += 1
+            return {'id': next_seq, **record}, next_seq
+        if isinstance(record['id'], int) and record['id'] >= 1:
+            taken = record['id'] < next_seq and self._conn.execute(
+                "SELECT 1 FROM records WHERE collection = ? AND seq = ?", (collection, record['id'])).fetchone()
+            if not taken:
+                return record, record['id']
+        return record, next_seq
+
+    def bulk_write(self, collection: str, records: List[Dict], upsert_key: Optional[str] = None,
+                   defaults: Optional[Dict] = None) -> List[Tuple[str, Dict]]:
+        """Write all records in a single transaction, as one group-commit op.
+
+        Records without an id get the next one; an explicit id that is already
+        taken raises DuplicateIdError and nothing is written. With `upsert_key`, a record whose
+        value for that field matches a stored record is merged into it instead
+        (the stored id is kept); `defaults` fill in fields of inserted records only. Returns [('inserted' | 'updated', record), ...].
+        """
+        if upsert_key is not None and not re.fullmatch(r'\w+', upsert_key):
+            raise ValueError(f"Invalid upsert key: {upsert_key}")
+        return self._writer.submit(lambda events: self._bulk_write(events, collection, records, upsert_key, defaults))
+
+    def _bulk_write(self, events: List, collection: str, records: List[Dict],
+                    upsert_key: Optional[str], defaults: Optional[Dict]) -> List[Tuple[str, Dict]]:
+        row = self._conn.execute(
+            "SELECT next_seq FROM meta WHERE collection = ?", (collection,)).fetchone()
+        next_seq = row[0] if row else 1
+        # The planner picks the primary key over the expression index unless told otherwise
+        indexed = "INDEXED BY idx_records_external_id " if upsert_key == 'external_id' else ""
+        find = (f"SELECT seq, body FROM records {indexed}WHERE collection = ? "
+                f"AND json_extract(body, '$.{upsert_key}') = ? ORDER BY seq LIMIT 1")
+        results, changes = [], []
+        for position, record in enumerate(records):
+            existing = upsert_key and self._conn.execute(find, (collection, record[upsert_key])).fetchone()
+            if existing:
+                seq, old = existing[0], json.loads(existing[1])
+                new = _apply_changes(old, record)
+                self._conn.execute(
+                    "UPDATE records SET body = ? WHERE collection = ? AND seq = ?",
+                    (json.dumps(new), collection, seq))
+                changes.append((old, new))
+                results.append(('updated', new))
+                continue
+            if defaults:
+                record = {**copy.deepcopy(defaults), **record}
+            if 'id' in record and self._id_taken(collection, _record_key(record)):
+                raise DuplicateIdError(_record_key(record), position)
+            record, seq = self._place(collection, record, next_seq, assign_id=True)
+            self._conn.execute(
+                "INSERT INTO records (collection, seq, key, body) VALUES (?, ?, ?, ?)",
+                (collection, seq, _record_key(record), json.dumps(record)))
+            next_seq = max(next_seq, seq + 1)
+            changes.append((None, record))
+            results.append(('inserted', record))
+        if changes:
+            # One meta update for the whole bulk; each record still gets its own version
+            version = self._bump(collection, next_seq=next_seq, count=len(changes))
+            first = version - len(changes) + 1
+            events.extend((collection, first + n, old, new) for n, (old, new) in enumerate(changes))
+        return results
+
+    def update(self, collection: str, key, changes: Dict,
+               expected_etags: Optional[Collection[str]] = None) -> Optional[Dict]:
+        """Merge `changes` into the record with this id; None if it does not exist"""
+        return self._writer.submit(
+            lambda events: self._update(events, collection, str(key), changes, expected_etags))
+
+    def delete(self, collection: str, key,
+               expected_etags: Optional[Collection[str]] = None) -> Optional[Dict]:
+        """Remove the record with this id and return it; None if it does not exist"""
+        return self._writer.submit(
+            lambda events: self._update(events, collection, str(key), None, expected_etags))
+
+    def _update(self, events: List, collection: str, key: str, changes: Optional[Dict],
+                expected_etags: Optional[Collection[str]]) -> Optional[Dict]:
+        row = self._conn.execute(
+            "SELECT seq, body FROM records WHERE collection = ? AND key = ? ORDER BY seq LIMIT 1",
+            (collection, key)).fetchone()
+        if row is None:
+            return None
+        seq, record = row[0], json.loads(row[1])
+        _check_etag(record, expected_etags)
+        if changes is None:
+            self._conn.execute("DELETE FROM records WHERE collection = ? AND seq = ?", (collection, seq))
+            events.append((collection, self._bump(collection), record, None))
+            return record
+        updated = _apply_changes(record, changes)
+        self._conn.execute(
+            "UPDATE records SET body = ? WHERE collection = ? AND seq = ?",
+            (json.dumps(updated), collection, seq))
+        events.append((collection, self._bump(collection), record, updated))
+        return updated
+
+    def _bump(self, collection: str, next_seq: Optional[int] = None, count: int = 1) -> int:
+        """Advance the collection version (and id allocator) inside the current transaction"""
+        self._conn.execute(
+            "INSERT INTO meta (collection, next_seq, version) VALUES (?, ?, ?) "
+            "ON CONFLICT (collection) DO UPDATE SET "
+            "next_seq = MAX(next_seq, excluded.next_seq), version = version + excluded.version",
+            (collection, next_seq or 1, count))
+        return self._conn.execute(
+            "SELECT version FROM meta WHERE collection = ?", (collection,)).fetchone()[0]
+
+    def _commit_batch(self, ops: List[Callable]) -> List:
+        results, events = [], []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for op in ops:
+                    op_events = []
+                    self._conn.execute("SAVEPOINT write_op")
+                    try:
+                        results.append(op(op_events))
+                        events.extend(op_events)
+                    except Exception as e:
+                        # Undo just this write; the rest of the batch still commits
+                        self._conn.execute("ROLLBACK TO write_op")
+                        results.append(e)
+                    self._conn.execute("RELEASE write_op")
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            for event in events:
+                self._notify(*event)
+        return results
+
+    def version(self, collection: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version FROM meta WHERE collection = ?", (collection,)).fetchone()
+        return row[0] if row else 0
+
+    def write_stats(self) -> Dict:
+        return self._writer.stats()
+
+    def close(self):
+        self._writer.close()
+        with self._lock:
+            self._conn.close()
+
+
+def open_storage(backend: Optional[str] = None, data_dir: Optional[str] = None, readonly: bool = False):
+    """Open the configured backend (COMPLIANCE_STORAGE=sqlite|json, default sqlite).
+
+    `readonly` opens a store another process has already set up, for readers
+    such as export workers: writes raise PermissionError and legacy JSON files
+    are not imported.
+    """
+    backend = (backend or os.getenv('COMPLIANCE_STORAGE', 'sqlite')).lower()
+    data_dir = data_dir or os.getenv('COMPLIANCE_DATA_DIR', 'data')
+    window = float(os.getenv('COMPLIANCE_GROUP_COMMIT_MS', '2')) / 1000
+    if backend not in ('json', 'sqlite'):
+        raise ValueError(f"Unknown storage backend: {backend}")
+    if readonly:
+        return (JSONStorage if backend == 'json' else SQLiteStorage)(data_dir, readonly=True)
+    legacy = JSONStorage(data_dir, group_commit_window=window)
+    if backend == 'json':
+        return legacy
+    storage = SQLiteStorage(data_dir, group_commit_window=window)
+    for collection, count in storage.import_legacy(legacy).items():
+        logger.info("Imported %d %s from %s", count, collection, legacy.path(collection))
+    legacy.close()
+    return storage
@@ -0,0 +1,27 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+# Tests import the services package from the repository root, as local_server.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """local_server imported afresh over an empty data directory"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('COMPLIANCE_DATA_DIR', str(tmp_path / 'data'))
+    monkeypatch.setenv('EXPORT_DIR', str(tmp_path / 'exports'))
+    sys.modules.pop('local_server', None)
+    module = importlib.import_module('local_server')
+    yield module
+    module.export_jobs.close()
+    module.storage.close()
+    sys.modules.pop('local_server', None)
+
+
+@pytest.fixture
+def client(server):
+    return server.app.test_client()
@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_forked_worker_log_lines_reach_the_stream():
+    # A fresh interpreter: configure_logging() is once per process and the test runner has its own handlers
+    script = textwrap.dedent("""
+        import os
+        from services import app_logging
+
+        app_logging.configure_logging()
+        app_logging.get_logger('parent').info('before fork')
+        pid = os.fork()
+        if pid == 0:
+            app_logging.get_logger('worker').error('Error saving assessment')
+            app_logging._stop()
+            os._exit(0)
+        os.waitpid(pid, 0)
+    """)
+    result = subprocess.run([sys.executable, '-c', script], cwd=ROOT, capture_output=True, text=True, timeout=30)
+    assert result.returncode == 0, result.stderr
+    assert 'parent: before fork' in result.stderr
+    assert 'worker: Error saving assessment' in result.stderr
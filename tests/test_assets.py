@@ -0,0 +1,65 @@
+import gzip
+
+import pytest
+from flask import Flask, request
+
+from services.assets import IMMUTABLE, REVALIDATE, AssetPipeline
+
+
+@pytest.fixture
+def site(tmp_path):
+    (tmp_path / 'css').mkdir()
+    (tmp_path / 'js').mkdir()
+    (tmp_path / 'css' / 'site.css').write_text('body { color: black; }\n' * 200)
+    (tmp_path / 'js' / 'app.js').write_text('console.log("app");\n')
+    (tmp_path / 'index.html').write_text('<link href="css/site.css"><script src="/js/app.js"></script>'
+                                         '<a href="https://example.com/x.css">')
+    return tmp_path
+
+
+def _hashed(pipeline, path):
+    stem, ext = path.rsplit('.', 1)
+    return f"{stem}.{pipeline.get(path).digest}.{ext}"
+
+
+def _serve(pipeline, path, headers=None):
+    app = Flask(__name__)
+    with app.test_request_context(headers=headers or {}):
+        return pipeline.response(pipeline.get(path), request, app.response_class)
+
+
+def test_pages_reference_fingerprinted_immutable_assets(site):
+    pipeline = AssetPipeline(str(site))
+    page = pipeline.get('index.html')
+    html = page.variants['identity'].decode()
+    assert f'href="{_hashed(pipeline, "css/site.css")}"' in html
+    assert f'src="/{_hashed(pipeline, "js/app.js")}"' in html
+    assert 'https://example.com/x.css' in html
+    assert pipeline.get(_hashed(pipeline, 'css/site.css')).cache_control == IMMUTABLE
+    # The unhashed path still works, but is revalidated
+    assert pipeline.get('css/site.css').cache_control == REVALIDATE
+    assert page.cache_control == REVALIDATE
+
+
+def test_responses_are_precompressed_and_revalidated(site):
+    pipeline = AssetPipeline(str(site))
+    url = _hashed(pipeline, 'css/site.css')
+    response = _serve(pipeline, url, {'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.get_data()) == (site / 'css' / 'site.css').read_bytes()
+    assert response.headers['Vary'] == 'Accept-Encoding'
+
+    cached = _serve(pipeline, url, {'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+    assert cached.status_code == 304
+    # Tiny files are not worth compressing
+    assert 'Content-Encoding' not in _serve(pipeline, 'js/app.js', {'Accept-Encoding': 'gzip'}).headers
+
+
+def test_watch_rebuilds_after_an_edit(site):
+    pipeline = AssetPipeline(str(site), watch=True)
+    before = _hashed(pipeline, 'js/app.js')
+    (site / 'js' / 'app.js').write_text('console.log("changed");\n')
+    after = _hashed(pipeline, 'js/app.js')
+    assert after != before
+    assert after in pipeline.get('index.html').variants['identity'].decode()
+    assert AssetPipeline(str(site)).get('missing.js') is None
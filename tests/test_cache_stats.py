@@ -0,0 +1,26 @@
+from services.export_cache import ExportCache
+from services.read_cache import ReadCache
+from services.storage import JSONStorage
+
+
+def test_hit_rates_are_percentages_in_both_caches(tmp_path):
+    storage = JSONStorage(str(tmp_path / 'data'))
+    read_cache = ReadCache(storage, dumps=str)
+    for _ in range(3):
+        read_cache.get('assessments')
+    storage.close()
+
+    export_cache = ExportCache(str(tmp_path / 'exports'))
+    key = ExportCache.key('report', 1)
+    export_cache.lookup(key, 'pdf')
+    with open(export_cache.path(key, 'pdf'), 'wb') as f:
+        f.write(b'%PDF')
+    export_cache.lookup(key, 'pdf')
+    export_cache.lookup(key, 'pdf')
+
+    assert read_cache.stats()['hit_rate'] == 66.7
+    assert export_cache.stats()['hit_rate'] == 66.7
+
+
+def test_hit_rate_without_lookups_is_zero(tmp_path):
+    assert ExportCache(str(tmp_path)).stats()['hit_rate'] == 0.0
@@ -0,0 +1,67 @@
+import pytest
+
+from services.compliance_counters import ComplianceCounters, compliance_score
+from services.storage import SQLiteStorage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path))
+    yield storage
+    storage.close()
+
+
+def _control(status='implemented', test_status='tested', test_result='pass'):
+    return {'status': status, 'test_status': test_status, 'test_result': test_result}
+
+
+def test_counters_follow_inserts_updates_and_deletes(storage):
+    counters = ComplianceCounters(storage)
+    assert counters.counts()['total_controls'] == 0
+    soc = storage.insert('assessments', {'framework': 'SOC 2', 'controls': [
+        _control(), _control(test_result='fail'), _control('not_started', 'not_tested', 'not_tested')]},
+        assign_id=True)
+    hipaa = storage.insert('assessments', {'framework': 'HIPAA', 'controls': [_control()]}, assign_id=True)
+    assert counters.counts() == {'total_controls': 4, 'implemented_controls': 3, 'tested_controls': 3,
+                                 'passed_controls': 2}
+
+    storage.update('assessments', soc['id'], {'controls': [_control()]})
+    storage.delete('assessments', hipaa['id'])
+    assert counters.counts() == {'total_controls': 1, 'implemented_controls': 1, 'tested_controls': 1,
+                                 'passed_controls': 1}
+    assert counters.counts(framework='HIPAA')['total_controls'] == 0
+    assert counters.counts(assessment_id=soc['id'])['passed_controls'] == 1
+    assert counters.framework_scores() == {'SOC 2': 100.0}
+    assert counters.verify() == []
+
+
+def test_writes_the_counters_did_not_see_trigger_a_rebuild(storage, tmp_path):
+    counters = ComplianceCounters(storage)
+    storage.insert('assessments', {'framework': 'SOC 2', 'controls': [_control()]}, assign_id=True)
+    assert counters.counts()['total_controls'] == 1
+    # Another process writing to the same database
+    other = SQLiteStorage(str(tmp_path))
+    other.insert('assessments', {'framework': 'SOC 2', 'controls': [_control(), _control()]}, assign_id=True)
+    other.close()
+    assert counters.counts()['total_controls'] == 3
+
+
+def test_rebuild_reports_drift(storage):
+    counters = ComplianceCounters(storage)
+    storage.insert('assessments', {'framework': 'SOC 2', 'controls': [_control()]}, assign_id=True)
+    counters.counts()
+    counters._state['totals']['passed_controls'] = 0
+    report = counters.rebuild_and_verify()
+    assert not report['verified']
+    assert report['mismatches'] == ['total passed_controls: counter=0 stored=1']
+    assert report['passed_controls'] == 1
+    assert counters.verify() == []
+
+
+def test_score_endpoint_reads_the_counters(client):
+    client.post('/api/assessments', json={'name': 'Cloud', 'framework': 'SOC 2',
+                                          'controls': [_control(), _control(test_result='fail')]})
+    score = client.get('/api/analytics/compliance-score').get_json()
+    assert score['overall_score'] == 50.0
+    assert score['framework_scores'] == {'SOC 2': 50.0}
+    assert score == {**compliance_score(score), 'framework_scores': {'SOC 2': 50.0}}
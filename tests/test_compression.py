@@ -0,0 +1,63 @@
+import gzip
+import json
+import zlib
+
+import pytest
+from werkzeug.http import parse_accept_header
+
+from services.compression import (ENCODINGS, base_etag, brotli, compress, compress_stream, encoded_etag, negotiate,
+                                  zstandard)
+
+
+def _decompress(data, encoding):
+    if encoding == 'br':
+        return brotli.decompress(data)
+    if encoding == 'zstd':
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return gzip.decompress(data)
+
+
+def _accept(header):
+    return parse_accept_header(header)
+
+
+def test_negotiation_follows_quality_then_server_preference():
+    assert negotiate(_accept('')) is None
+    assert negotiate(_accept('identity')) is None
+    assert negotiate(_accept('gzip')) == 'gzip'
+    assert negotiate(_accept('gzip;q=0')) is None
+    assert negotiate(_accept('*')) == ENCODINGS[0]
+    assert negotiate(_accept(', '.join(ENCODINGS))) == ENCODINGS[0]
+
+
+@pytest.mark.parametrize('encoding', ENCODINGS)
+def test_streamed_compression_decodes_to_the_original(encoding):
+    chunks = [json.dumps({'n': n}).encode() for n in range(100)]
+    streamed = b''.join(compress_stream(iter(chunks), encoding))
+    assert _decompress(streamed, encoding) == b''.join(chunks)
+    assert _decompress(compress(b''.join(chunks), encoding), encoding) == b''.join(chunks)
+
+
+def test_encoded_etags_round_trip():
+    assert base_etag(encoded_etag('abc', 'gzip')) == 'abc'
+    assert base_etag('abc') == 'abc'
+
+
+def test_api_json_is_compressed_above_the_size_threshold(server, client):
+    server.storage.bulk_write('controls', [{'name': f"control {n}", 'notes': 'x' * 50} for n in range(100)])
+    response = client.get('/api/controls', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert len(json.loads(gzip.decompress(response.get_data()))) == 100
+
+    small = client.get('/api/controls?limit=1', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in small.headers
+    assert 'Content-Encoding' not in client.get('/api/controls').headers
+
+
+def test_streamed_api_responses_are_compressed_incrementally(server, client):
+    server.storage.bulk_write('controls', [{'name': f"control {n}"} for n in range(100)])
+    response = client.get('/api/controls?stream=ndjson', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    lines = zlib.decompress(response.get_data(), 31).decode().splitlines()
+    assert len(lines) == 100
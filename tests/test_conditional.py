@@ -0,0 +1,29 @@
+def test_unchanged_polls_get_304_until_a_write(client):
+    client.post('/api/assessments', json={'name': 'Cloud', 'framework': 'SOC 2', 'controls': []})
+    first = client.get('/api/assessments')
+    etag = first.headers['ETag']
+    assert client.get('/api/assessments', headers={'If-None-Match': etag}).status_code == 304
+    # Derived views are tagged by the collection they read
+    score_etag = client.get('/api/analytics/compliance-score').headers['ETag']
+    assert client.get('/api/analytics/compliance-score', headers={'If-None-Match': score_etag}).status_code == 304
+
+    client.post('/api/assessments', json={'name': 'Office', 'framework': 'HIPAA', 'controls': []})
+    changed = client.get('/api/assessments', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert client.get('/api/analytics/compliance-score', headers={'If-None-Match': score_etag}).status_code == 200
+
+
+def test_writes_to_other_collections_keep_the_tag(client):
+    etag = client.get('/api/controls').headers['ETag']
+    client.post('/api/audit-plans', json={'name': 'Plan', 'framework': 'SOC 2'})
+    assert client.get('/api/controls', headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_tags_differ_per_url_and_accept_the_compressed_form(client):
+    plain = client.get('/api/assessments').headers['ETag']
+    assert client.get('/api/assessments?summary=1').headers['ETag'] != plain
+    held = f'"{plain.strip(chr(34))}-gzip"'
+    response = client.get('/api/assessments', headers={'If-None-Match': held, 'Accept-Encoding': 'gzip'})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == held
@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+from services.control_catalog import ControlCatalog
+
+
+def test_normalize_folds_case_and_whitespace():
+    catalog = ControlCatalog()
+    assert catalog.normalize('  Identity Management ') == 'identity_management'
+    assert catalog.normalize('IDENTITY-MANAGEMENT') == 'identity_management'
+    assert catalog.normalize('no such type') is None
+
+
+def test_normalize_memo_is_bounded():
+    catalog = ControlCatalog()
+    for n in range(5000):
+        catalog.normalize(f"unknown type {n}")
+    for spelling in ('Database', 'database', ' DATABASE'):
+        catalog.normalize(spelling)
+    info = catalog._normalized.cache_info()
+    assert info.currsize <= info.maxsize == 1024
+    assert info.hits >= 2
+
+
+def _catalog(tmp_path, controls):
+    path = tmp_path / 'catalog.json'
+    path.write_text(json.dumps({
+        'frameworks': {'SOC 2': ['Security', 'Availability']},
+        'infrastructure_types': ['firewall', 'database'],
+        'aliases': {'db': 'database'},
+        'controls': controls
+    }))
+    return ControlCatalog(str(path))
+
+
+def _control(key, infrastructure, **extra):
+    return {'key': key, 'name': key.title(), 'description': f"{key} control", 'type': 'technical',
+            'risk_level': 'High', 'infrastructure': infrastructure, 'domains': {'SOC 2': 'Security'}, **extra}
+
+
+def test_shared_controls_are_generated_once_per_type_list(tmp_path):
+    catalog = _catalog(tmp_path, [_control('segment', ['firewall', 'database']), _control('backup', ['database']),
+                                  _control('policy', ['*'])])
+    controls = catalog.generate('SOC 2', ['Firewall', 'DB', 'unknown'])
+    assert [(c['id'], c['catalog_key'], c.get('infrastructure')) for c in controls] == [
+        ('SOC 2-1', 'segment', 'firewall'), ('SOC 2-2', 'backup', 'database'), ('SOC 2-3', 'policy', None)]
+    assert controls[0]['domain'] == 'Security'
+    assert controls[0]['status'] == 'not_started'
+
+
+def test_inventory_items_get_their_own_controls(tmp_path):
+    catalog = _catalog(tmp_path, [_control('backup', ['database'])])
+    controls = catalog.generate('SOC 2', [{'type': 'database', 'name': 'orders'}, {'type': 'db', 'id': 'users'}])
+    assert [(c['catalog_key'], c['asset']) for c in controls] == [('backup', 'orders'), ('backup', 'users')]
+    # Generated controls are copies; the memoized templates stay untouched
+    controls[0]['status'] = 'implemented'
+    assert catalog.generate('SOC 2', ['database'])[0]['status'] == 'not_started'
+    assert catalog.cache_info().hits >= 1
+
+
+def test_unknown_frameworks_use_controls_without_a_framework_list(tmp_path):
+    catalog = _catalog(tmp_path, [_control('any', ['database']),
+                                  _control('soc_only', ['database'], frameworks=['SOC 2'])])
+    assert [c['catalog_key'] for c in catalog.generate('GDPR', ['database'])] == ['any']
+    assert [c['catalog_key'] for c in catalog.generate('SOC 2', ['database'])] == ['any', 'soc_only']
+
+
+def test_invalid_catalogs_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        _catalog(tmp_path, [_control('bad', ['mainframe'])])
+    with pytest.raises(ValueError):
+        _catalog(tmp_path, [_control('bad', ['database'], domains={'SOC 2': 'Marketing'})])
+
+
+def test_generate_controls_endpoint_uses_the_bundled_catalog(client):
+    controls = client.post('/api/generate-controls', json={'framework': 'HIPAA', 'infrastructure': ['Database']})
+    assert controls.status_code == 200
+    assert controls.get_json()
+    assert all(control['id'].startswith('HIPAA-') for control in controls.get_json())
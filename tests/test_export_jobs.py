@@ -0,0 +1,105 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from services.storage import open_storage
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    storage = open_storage('sqlite', str(tmp_path / 'data'))
+    storage.insert('assessments', {'name': 'Cloud', 'framework': 'SOC 2', 'controls': [
+        {'id': 'CC1', 'name': 'Access', 'status': 'implemented'}]}, assign_id=True)
+    storage.close()
+    return str(tmp_path / 'data')
+
+
+def test_readonly_storage_reads_but_refuses_writes(data_dir):
+    storage = open_storage('sqlite', data_dir, readonly=True)
+    assert [record['name'] for record in storage.list('assessments')] == ['Cloud']
+    with pytest.raises(PermissionError):
+        storage.insert('assessments', {'name': 'more'})
+    storage.close()
+
+
+def test_render_processes_do_not_rerun_the_main_script(data_dir, tmp_path):
+    # The parent is a script, like local_server.py; it leaves a marker file each time it is imported
+    script = tmp_path / 'server.py'
+    script.write_text(textwrap.dedent(f"""
+        import os
+        import sys
+        sys.path.insert(0, {ROOT!r})
+        with open(os.path.join({str(tmp_path)!r}, f"imported-{{os.getpid()}}-{{__name__}}"), 'w'):
+            pass
+
+        if __name__ == '__main__':
+            from services.export_jobs import ExportJobs
+            from services.report_export import init_worker, render
+            jobs = ExportJobs(os.path.join({data_dir!r}, 'export_jobs.db'), os.path.join({str(tmp_path)!r}, 'exports'),
+                              render, init_worker, context={{'backend': 'sqlite', 'data_dir': {data_dir!r}}})
+            job = jobs.wait(jobs.submit('csv', {{}}, 'csv')['id'], 60)
+            print(job['status'], job['error'])
+            print(open(job['path']).read())
+            jobs.close()
+    """))
+    result = subprocess.run([sys.executable, str(script)], capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.startswith('done None')
+    assert 'CC1,Access,implemented' in result.stdout
+    imported = sorted(name.rsplit('-', 1)[1] for name in os.listdir(tmp_path) if name.startswith('imported-'))
+    assert imported == ['__main__']
+
+
+def _jobs(data_dir, tmp_path, **kwargs):
+    from services.export_jobs import ExportJobs
+    from services.report_export import init_worker, render
+    return ExportJobs(os.path.join(data_dir, 'export_jobs.db'), str(tmp_path / 'exports'), render, init_worker,
+                      context={'backend': 'sqlite', 'data_dir': data_dir}, **kwargs)
+
+
+def test_cache_hits_return_the_finished_job_instead_of_adding_one(data_dir, tmp_path):
+    from services.export_cache import ExportCache
+    cache = ExportCache(str(tmp_path / 'exports'))
+    jobs = _jobs(data_dir, tmp_path, cache=cache)
+    key = ExportCache.key('report', 1)
+    first = jobs.submit('csv', {}, 'csv', key=key)
+    assert first['new']
+    assert jobs.wait(first['id'], 60)['status'] == 'done'
+
+    repeats = [jobs.submit('csv', {}, 'csv', key=key) for _ in range(3)]
+    assert {job['id'] for job in repeats} == {first['id']}
+    assert not any(job['new'] for job in repeats)
+    assert jobs.stats()['done'] == 1
+    assert cache.hits == 3
+    jobs.close()
+
+
+def test_only_the_newest_finished_jobs_are_kept(data_dir, tmp_path):
+    jobs = _jobs(data_dir, tmp_path, max_finished=2)
+    done = [jobs.wait(jobs.submit('csv', {}, 'csv')['id'], 60) for _ in range(3)]
+    assert [job['status'] for job in done] == ['done'] * 3
+
+    assert [job['id'] for job in jobs.list()] == [job['id'] for job in reversed(done[1:])]
+    assert jobs.get(done[0]['id']) is None
+    assert not os.path.exists(done[0]['path'])
+    assert all(os.path.exists(job['path']) for job in done[1:])
+    jobs.close()
+
+
+def test_render_limit_is_shared_by_processes_using_one_job_table(data_dir, tmp_path):
+    # Two server workers; neither is started, so jobs are only claimed here
+    first, second = _jobs(data_dir, tmp_path, max_workers=1), _jobs(data_dir, tmp_path, max_workers=1)
+    for _ in range(2):
+        first._conn.execute("INSERT INTO jobs (id, format, params, extension, status, created_at) "
+                            "VALUES (hex(randomblob(16)), 'csv', '{}', 'csv', 'queued', datetime('now'))")
+    assert first._claim() is not None
+    assert first._claim() is None
+    assert second._claim() is None
+    assert first.stats() == {'queued': 1, 'running': 1, 'done': 0, 'failed': 0, 'cancelled': 0}
+    first.close()
+    second.close()
@@ -0,0 +1,76 @@
+import pytest
+
+from services.gap_engine import GapEngine
+from services.storage import SQLiteStorage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path))
+    yield storage
+    storage.close()
+
+
+def _assessment(name, framework, *risks, created_at='2024-01-01T00:00:00'):
+    return {'name': name, 'framework': framework, 'created_at': created_at,
+            'controls': [{'id': f"{name}-{n}", 'name': f"{name} {risk}", 'risk_level': risk, 'status': 'not_started'}
+                         for n, risk in enumerate(risks)]}
+
+
+def _names(gaps):
+    return [gap['control_name'] for gap in gaps]
+
+
+def test_filtered_queries_page_in_risk_order(storage):
+    engine = GapEngine(storage)
+    storage.insert('assessments', _assessment('a', 'SOC 2', 'Low', 'Critical', 'Medium'), assign_id=True)
+    storage.insert('assessments', _assessment('b', 'HIPAA', 'High', 'Critical'), assign_id=True)
+    storage.insert('assessments', _assessment('c', 'SOC 2', 'High'), assign_id=True)
+
+    gaps, cursor = engine.query(limit=2, framework={'SOC 2'})
+    assert _names(gaps) == ['a Critical', 'c High']
+    gaps, cursor = engine.query(limit=2, cursor=cursor, framework={'SOC 2'})
+    assert _names(gaps) == ['a Medium', 'a Low']
+    assert engine.query(limit=2, cursor=cursor, framework={'SOC 2'}) == ([], None)
+
+    gaps, _ = engine.query(limit=10, risk_level={'Critical', 'High'})
+    assert _names(gaps) == ['a Critical', 'b Critical', 'b High', 'c High']
+    gaps, _ = engine.query(limit=10, framework={'HIPAA', 'PCI DSS'}, risk_level={'High'})
+    assert _names(gaps) == ['b High']
+
+
+def test_filter_indexes_follow_updates_and_deletes(storage):
+    engine = GapEngine(storage)
+    first = storage.insert('assessments', _assessment('a', 'SOC 2', 'High', 'Low'), assign_id=True)
+    second = storage.insert('assessments', _assessment('b', 'SOC 2', 'High'), assign_id=True)
+    assert engine.total() == 3
+
+    storage.update('assessments', first['id'], _assessment('a', 'HIPAA', 'Low'))
+    storage.delete('assessments', second['id'])
+    assert engine.query(framework={'SOC 2'}) == ([], None)
+    assert _names(engine.query(framework={'HIPAA'})[0]) == ['a Low']
+    assert engine.query(risk_level={'High'}) == ([], None)
+
+    # The incremental state matches a rebuild
+    incremental = engine.query(limit=50)
+    engine.rebuild()
+    assert engine.query(limit=50) == incremental
+
+
+def test_invalid_creation_dates_rank_the_same_every_time(storage):
+    weights = {'age_per_day': 1.0}
+    storage.insert('assessments', _assessment('a', 'SOC 2', 'Low', created_at='not a date'), assign_id=True)
+    storage.insert('assessments', _assessment('b', 'SOC 2', 'Critical', created_at='2024-06-01'), assign_id=True)
+    ranks = {GapEngine._created_day({'created_at': 'not a date'}) for _ in range(3)}
+    assert ranks == {0.0}
+    # Undated gaps count as the oldest, so with an age weight they come first
+    assert _names(GapEngine(storage, weights).query()[0]) == ['a Low', 'b Critical']
+
+
+def test_gap_endpoint_pages_with_the_next_cursor_header(client):
+    client.post('/api/assessments', json=_assessment('a', 'SOC 2', 'Low', 'Critical', 'High'))
+    first = client.get('/api/analytics/gap-analysis?limit=2&risk_level=Critical,High')
+    assert _names(first.get_json()) == ['a Critical', 'a High']
+    cursor = first.headers['X-Next-Cursor']
+    assert client.get(f'/api/analytics/gap-analysis?limit=2&cursor={cursor}').get_json()[0]['control_name'] == 'a Low'
+    assert client.get('/api/analytics/gap-analysis?cursor=bm9wZQ').status_code == 400
@@ -0,0 +1,74 @@
+import io
+import json
+
+import pytest
+
+from services import ingest
+from services.ingest import ParseError, parse_records
+
+
+def parse(body, upsert=True):
+    return list(parse_records(io.BytesIO(body.encode('utf-8')), 'application/x-ndjson', 'controls', upsert))
+
+
+@pytest.mark.parametrize('external_id', ['[1, 2]', '{"a": 1}', 'true', '1.5'])
+def test_upsert_key_must_be_string_or_integer(external_id):
+    [(index, record, error)] = parse(f'{{"name": "c", "external_id": {external_id}}}\n')
+    assert record is None
+    assert error == "external_id must be a string or an integer"
+
+
+def test_upsert_key_accepts_strings_and_integers():
+    results = parse('{"name": "a", "external_id": "x"}\n{"name": "b", "external_id": 7}\n')
+    assert [error for _, _, error in results] == [None, None]
+
+
+def test_bulk_endpoint_answers_400_for_bad_upsert_keys(tmp_path, monkeypatch):
+    monkeypatch.setenv('COMPLIANCE_DATA_DIR', str(tmp_path))
+    import local_server
+    response = local_server.app.test_client().post(
+        '/api/controls/bulk?upsert=1', json=[{'name': 'c', 'external_id': ['x']}])
+    assert response.status_code == 400
+    assert response.json['errors'] == [{'index': 0, 'error': "external_id must be a string or an integer"}]
+
+
+def test_ndjson_reports_bad_lines_and_keeps_the_rest():
+    body = '{"name": "a"}\n\nnot json\n[1]\n{"name": ""}\n{"name": "b", "progress": 50}'
+    results = list(parse_records(io.BytesIO(body.encode()), 'application/x-ndjson', 'controls'))
+    assert [(index, record and record['name'], error and error.split(':')[0]) for index, record, error in results] == [
+        (0, 'a', None), (1, None, 'Invalid JSON'), (2, None, 'Record must be a JSON object'),
+        (3, None, 'name is required'), (4, 'b', None)]
+
+
+def test_values_split_across_read_chunks_are_reassembled(monkeypatch):
+    monkeypatch.setattr(ingest, 'CHUNK_SIZE', 7)
+    records = [{'name': f"contrôle {n}", 'weight': 12345.678} for n in range(20)]
+    for mimetype, body in (('application/x-ndjson', '\n'.join(json.dumps(r, ensure_ascii=False) for r in records)),
+                           ('application/json', json.dumps(records, ensure_ascii=False))):
+        results = list(parse_records(io.BytesIO(body.encode('utf-8')), mimetype, 'controls'))
+        assert [record for _, record, _ in results] == records
+
+
+@pytest.mark.parametrize('body', ['[{"name": "a"}, {"name": "b"', '{"name": "a"}', '[{"name": "a"} {"name": ]'])
+def test_malformed_json_arrays_are_fatal(body):
+    with pytest.raises(ParseError) as error:
+        list(parse_records(io.BytesIO(body.encode()), 'application/json', 'controls'))
+    assert error.value.fatal
+
+
+def test_bulk_ndjson_inserts_then_upserts(client):
+    ndjson = '{"name": "Access", "external_id": "AC-1"}\n{"name": "Backup", "external_id": "BK-1"}\n'
+    created = client.post('/api/controls/bulk', data=ndjson, content_type='application/x-ndjson').get_json()
+    assert (created['inserted'], created['updated'], created['failed']) == (2, 0, 0)
+
+    update = ('{"external_id": "AC-1", "name": "Access", "status": "implemented"}\n'
+              '{"external_id": "NEW-1", "name": "New"}\n')
+    result = client.post('/api/controls/bulk?upsert=1', data=update, content_type='application/x-ndjson').get_json()
+    assert [(r['index'], r['action']) for r in result['results']] == [(0, 'updated'), (1, 'inserted')]
+    controls = {control['external_id']: control for control in client.get('/api/controls').get_json()}
+    assert controls['AC-1'] == {**controls['AC-1'], 'name': 'Access', 'status': 'implemented'}
+    assert len(controls) == 3
+
+    truncated = client.post('/api/controls/bulk', data='[{"name": "x"}', content_type='application/json')
+    assert truncated.status_code == 400
+    assert client.get('/api/controls').get_json() == list(controls.values())
@@ -0,0 +1,39 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+import load_test  # noqa: E402
+import synthetic  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def restore_environment(monkeypatch):
+    # load_server() points the environment at its data directory
+    monkeypatch.setenv('COMPLIANCE_STORAGE', 'sqlite')
+    monkeypatch.setenv('COMPLIANCE_DATA_DIR', 'data')
+    yield
+    sys.modules.pop('local_server', None)
+
+
+def test_every_route_is_covered_by_the_load_test():
+    assert load_test.uncovered_routes() == []
+
+
+def test_synthetic_dataset_loads_into_the_server(tmp_path):
+    counts = synthetic.write_dataset(str(tmp_path), 4, controls=(2, 3))
+    assert counts['assessments'] == 4
+    with open(tmp_path / 'controls.json') as f:
+        controls = json.load(f)
+    assert len(controls) == counts['controls']
+    assert [control['id'] for control in controls] == list(range(1, counts['controls'] + 1))
+
+    server = synthetic.load_server('sqlite', str(tmp_path))
+    try:
+        assert server.storage.count('assessments') == 4
+        assert server.storage.count('controls') == counts['controls']
+    finally:
+        server.export_jobs.close()
+        server.storage.close()
@@ -0,0 +1,38 @@
+from services.metrics import Histogram, Metrics, instrument_storage
+from services.storage import SQLiteStorage
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram((0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+    assert list(histogram.lines('latency', 'route="/x",')) == [
+        'latency_bucket{route="/x",le="0.1"} 2',
+        'latency_bucket{route="/x",le="1.0"} 3',
+        'latency_bucket{route="/x",le="+Inf"} 4',
+        'latency_sum{route="/x"} 3.65',
+        'latency_count{route="/x"} 4',
+    ]
+
+
+def test_storage_calls_are_timed_per_operation_and_collection(tmp_path):
+    metrics = Metrics()
+    storage = instrument_storage(SQLiteStorage(str(tmp_path)), metrics)
+    storage.insert('controls', {'name': 'Access'}, assign_id=True)
+    assert [record['name'] for record in storage.iter('controls')] == ['Access']
+    storage.close()
+    assert {('insert', 'controls'), ('iter', 'controls')} <= set(metrics.storage_latency)
+    text = metrics.render()
+    assert 'storage_operation_duration_seconds_count{operation="iter",collection="controls"} 1' in text
+    assert 'storage_writes_total 1' in text
+
+
+def test_metrics_endpoint_reports_requests_by_route_template(client):
+    client.get('/api/assessments/7')
+    client.get('/api/assessments/8')
+    client.get('/no/such/page.txt')
+    text = client.get('/metrics').get_data(as_text=True)
+    assert 'http_requests_total{method="GET",route="/api/assessments/<record_id>",status="404"} 2' in text
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/assessments/<record_id>"} 2' in text
+    assert 'read_cache_requests_total{result="hit"}' in text
+    assert 'export_jobs{status="queued"} 0' in text
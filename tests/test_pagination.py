@@ -0,0 +1,51 @@
+import base64
+import json
+
+import pytest
+
+from services.pagination import decode_cursor, encode_cursor, shape
+
+
+def _raw(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip('=')
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor((42,))) == (42,)
+    assert decode_cursor(encode_cursor(('a-1',)), (str,)) == ('a-1',)
+    assert decode_cursor(encode_cursor((-3.5, 1, 0)), (float, int, int)) == (-3.5, 1, 0)
+    # A float position takes a whole number as well
+    assert decode_cursor(_raw([-3, 1, 0]), (float, int, int)) == (-3, 1, 0)
+
+
+@pytest.mark.parametrize('cursor', [_raw([1.5]), _raw([True]), _raw([None]), _raw(['7']), _raw([[1]]),
+                                    _raw([1, 2]), _raw({'a': 1}), 'not base64!', ''])
+def test_malformed_seq_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, (int,))
+
+
+def test_bool_is_not_a_rank():
+    with pytest.raises(ValueError):
+        decode_cursor(_raw([False, 1, 0]), (float, int, int))
+
+
+def test_shape_summarizes_then_projects():
+    record = {'id': 1, 'name': 'Cloud', 'controls': [{'id': 'CC1'}, {'id': 'CC2'}], 'tags': ['a']}
+    assert shape(record, summary=True) == {'id': 1, 'name': 'Cloud', 'controls_count': 2, 'tags': ['a']}
+    assert shape(record, fields=['id', 'controls_count'], summary=True) == {'id': 1, 'controls_count': 2}
+
+
+def test_list_endpoint_pages_projects_and_summarizes(client):
+    for name in ('Cloud', 'Office', 'Lab'):
+        client.post('/api/assessments', json={'name': name, 'framework': 'SOC 2', 'controls': [{'id': 'CC1'}]})
+
+    first = client.get('/api/assessments?limit=2&fields=id,name')
+    assert first.get_json() == [{'id': 1, 'name': 'Cloud'}, {'id': 2, 'name': 'Office'}]
+    second = client.get(f"/api/assessments?limit=2&cursor={first.headers['X-Next-Cursor']}&summary=1")
+    assert [(record['name'], record['controls_count']) for record in second.get_json()] == [('Lab', 1)]
+    assert 'X-Next-Cursor' not in second.headers
+
+    bad = client.get(f"/api/assessments?limit=2&cursor={_raw([1.5])}")
+    assert bad.status_code == 400
+    assert 'Invalid cursor' in bad.get_json()['error']
@@ -0,0 +1,76 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import textwrap
+import time
+import urllib.request
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'fork'), reason="pre-forking needs os.fork()")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _pids(port: int, requests: int = 40) -> set:
+    pids = set()
+    for _ in range(requests):
+        # A fresh connection each time, so the kernel can hand it to any worker
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=5) as response:
+            pids.add(int(response.read()))
+    return pids
+
+
+@pytest.fixture
+def master(tmp_path):
+    (tmp_path / 'pid_app.py').write_text(textwrap.dedent("""
+        import os
+        import time
+
+        def app(environ, start_response):
+            time.sleep(0.01)
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return [str(os.getpid()).encode()]
+    """))
+    port = _free_port()
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'services', 'prefork.py'), 'pid_app:app',
+                                '--host', '127.0.0.1', '--port', str(port), '--workers', '2', '--threads', '1',
+                                '--chdir', str(tmp_path)], stdout=subprocess.PIPE, text=True)
+    deadline = time.monotonic() + 20
+    while True:
+        try:
+            _pids(port, 1)
+            break
+        except OSError:
+            if time.monotonic() > deadline or process.poll() is not None:
+                process.kill()
+                pytest.fail("pre-fork server did not start")
+            time.sleep(0.1)
+    yield process, port
+    if process.poll() is None:
+        process.kill()
+        process.wait()
+
+
+def test_workers_serve_requests_and_are_replaced_on_sighup(master):
+    process, port = master
+    before = _pids(port)
+    assert process.pid not in before
+    assert len(before) <= 2
+
+    process.send_signal(signal.SIGHUP)
+    deadline = time.monotonic() + 20
+    while _pids(port, 5) & before:
+        assert time.monotonic() < deadline, "old generation still serving"
+        time.sleep(0.2)
+
+    process.send_signal(signal.SIGTERM)
+    assert process.wait(timeout=30) == 0
@@ -0,0 +1,49 @@
+import json
+
+from services.read_cache import ReadCache
+from services.storage import SQLiteStorage
+
+
+def test_entries_are_reused_until_a_write(tmp_path):
+    storage = SQLiteStorage(str(tmp_path))
+    cache = ReadCache(storage, dumps=json.dumps)
+    storage.insert('controls', {'name': 'Access'}, assign_id=True)
+
+    first = cache.get('controls')
+    assert cache.get('controls') is first
+    assert json.loads(first.body) == [{'id': 1, 'name': 'Access'}]
+
+    storage.insert('controls', {'name': 'Backup'}, assign_id=True)
+    second = cache.get('controls')
+    assert second is not first
+    assert [record['name'] for record in second.data] == ['Access', 'Backup']
+    assert cache.stats() == {'hits': 1, 'misses': 2, 'hit_rate': 33.3, 'entries': 1}
+    storage.close()
+
+
+def test_variants_are_cached_apart_and_built_once(tmp_path):
+    storage = SQLiteStorage(str(tmp_path))
+    cache = ReadCache(storage, dumps=json.dumps)
+    storage.insert('controls', {'name': 'Access', 'owner': 'ops'}, assign_id=True)
+    builds = []
+
+    def names():
+        builds.append(1)
+        return [record['name'] for record in storage.iter('controls')]
+
+    assert cache.get('controls', variant='names', build=names).data == ['Access']
+    assert cache.get('controls', variant='names', build=names).data == ['Access']
+    assert cache.get('controls').data == [{'id': 1, 'name': 'Access', 'owner': 'ops'}]
+    assert len(builds) == 1
+    cache.invalidate('controls')
+    assert cache.stats()['entries'] == 0
+    storage.close()
+
+
+def test_list_endpoint_serves_writes_made_after_a_cached_read(client):
+    assert client.get('/api/controls').get_json() == []
+    client.post('/api/controls', json={'id': 'AC-1', 'name': 'Access'})
+    assert [control['name'] for control in client.get('/api/controls').get_json()] == ['Access']
+    assert client.get('/api/cache/stats').get_json()['hits'] == 0
+    client.get('/api/controls')
+    assert client.get('/api/cache/stats').get_json()['hits'] == 1
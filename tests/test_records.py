@@ -0,0 +1,35 @@
+def test_get_patch_delete_one_record(client):
+    created = client.post('/api/assessments', json={'name': 'Cloud', 'framework': 'SOC 2'}).get_json()
+    url = f"/api/assessments/{created['id']}"
+
+    got = client.get(url)
+    assert got.get_json()['name'] == 'Cloud'
+    patched = client.patch(url, json={'name': 'Cloud 2'})
+    assert patched.get_json()['name'] == 'Cloud 2'
+    assert patched.headers['ETag'] != got.headers['ETag']
+    assert client.get(url).get_json()['name'] == 'Cloud 2'
+
+    assert client.delete(url).get_json() == {'deleted': True, 'id': created['id']}
+    assert client.get(url).status_code == 404
+    assert client.patch(url, json={'name': 'gone'}).status_code == 404
+
+
+def test_if_match_guards_against_lost_updates(client):
+    created = client.post('/api/controls', json={'id': 'AC-1', 'name': 'Access'}).get_json()
+    url = f"/api/controls/{created['id']}"
+    etag = client.get(url).headers['ETag']
+
+    assert client.patch(url, json={'name': 'first'}, headers={'If-Match': etag}).status_code == 200
+    stale = client.patch(url, json={'name': 'second'}, headers={'If-Match': etag})
+    assert stale.status_code == 412
+    assert stale.get_json()['current']['name'] == 'first'
+    assert client.delete(url, headers={'If-Match': etag}).status_code == 412
+    assert client.delete(url, headers={'If-Match': stale.headers['ETag']}).status_code == 200
+
+
+def test_unchanged_record_is_answered_with_304(client):
+    created = client.post('/api/controls', json={'id': 'AC-1', 'name': 'Access'}).get_json()
+    url = f"/api/controls/{created['id']}"
+    etag = client.get(url).headers['ETag']
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+    assert client.patch(url, data='[1]', content_type='application/json').status_code == 400
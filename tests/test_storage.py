@@ -0,0 +1,174 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from services.storage import (ConflictError, DuplicateIdError, GroupCommitter, JSONStorage, SQLiteStorage,
+                              open_storage, record_etag)
+
+
+@pytest.fixture(params=[JSONStorage, SQLiteStorage], ids=['json', 'sqlite'])
+def storage(request, tmp_path):
+    storage = request.param(str(tmp_path))
+    yield storage
+    storage.close()
+
+
+def test_explicit_bulk_id_moves_the_id_allocator(storage):
+    storage.bulk_write('assessments', [{'id': 3, 'name': 'bulk'}])
+    ids = [storage.insert('assessments', {'name': f"post {n}"}, assign_id=True)['id'] for n in range(3)]
+    assert ids == [4, 5, 6]
+    assert storage.get('assessments', 3)['name'] == 'bulk'
+    assert [record['id'] for record in storage.list('assessments')] == [3, 4, 5, 6]
+
+
+def test_bulk_ids_without_explicit_id_follow_it(storage):
+    written = storage.bulk_write('assessments', [{'id': 10}, {'name': 'next'}])
+    assert [record['id'] for _, record in written] == [10, 11]
+
+
+def test_duplicate_bulk_id_is_rejected_and_nothing_written(storage):
+    storage.insert('assessments', {'name': 'first'}, assign_id=True)
+    with pytest.raises(DuplicateIdError) as error:
+        storage.bulk_write('assessments', [{'id': 7}, {'id': 1, 'name': 'clash'}])
+    assert error.value.index == 1
+    assert [record['id'] for record in storage.list('assessments')] == [1]
+    with pytest.raises(DuplicateIdError):
+        storage.bulk_write('assessments', [{'id': 'a'}, {'id': 'a'}])
+    assert storage.count('assessments') == 1
+
+
+def test_upsert_still_merges_into_stored_record(storage):
+    storage.bulk_write('controls', [{'id': 5, 'external_id': 'x', 'name': 'old'}], upsert_key='external_id')
+    written = storage.bulk_write('controls', [{'id': 5, 'external_id': 'x', 'name': 'new'}], upsert_key='external_id')
+    assert written == [('updated', {'id': 5, 'external_id': 'x', 'name': 'new'})]
+
+
+def test_explicit_insert_id_moves_the_id_allocator(storage):
+    storage.insert('controls', {'id': 3, 'name': 'explicit'})
+    written = storage.bulk_write('controls', [{'name': f"bulk {n}"} for n in range(4)])
+    assert [record['id'] for _, record in written] == [4, 5, 6, 7]
+    assert storage.insert('controls', {'name': 'post'}, assign_id=True)['id'] == 8
+
+
+def test_auto_ids_skip_ids_the_counter_does_not_know(storage):
+    storage.insert('controls', {'id': '1', 'name': 'string id'})
+    written = storage.bulk_write('controls', [{'name': 'a'}, {'name': 'b'}])
+    assert [record['id'] for _, record in written] == [2, 3]
+    ids = [str(record['id']) for record in storage.list('controls')]
+    assert len(ids) == len(set(ids))
+
+
+def test_records_round_trip_and_survive_reopening(storage, tmp_path):
+    first = storage.insert('assessments', {'name': 'Cloud'}, assign_id=True)
+    second = storage.insert('assessments', {'name': 'Office'}, assign_id=True)
+    storage.insert('assessments', {'name': 'Lab'}, assign_id=True)
+    assert storage.update('assessments', first['id'], {'name': 'Cloud 2'})['name'] == 'Cloud 2'
+    assert storage.delete('assessments', second['id']) == second
+    assert storage.update('assessments', 99, {'name': 'missing'}) is None
+    assert storage.delete('assessments', 99) is None
+    storage.close()
+
+    reopened = type(storage)(str(tmp_path))
+    assert reopened.list('assessments') == [{'id': 1, 'name': 'Cloud 2'}, {'id': 3, 'name': 'Lab'}]
+    assert reopened.get('assessments', '1') == {'id': 1, 'name': 'Cloud 2'}
+    assert reopened.get('assessments', 2) is None
+    assert reopened.count('assessments') == 2
+    assert reopened.insert('assessments', {'name': 'next'}, assign_id=True)['id'] == 4
+    reopened.close()
+
+
+def test_every_write_bumps_the_collection_version(storage):
+    assert storage.version('assessments') == 0
+    record = storage.insert('assessments', {'name': 'Cloud'}, assign_id=True)
+    storage.update('assessments', record['id'], {'name': 'Cloud 2'})
+    storage.bulk_write('assessments', [{'name': 'a'}, {'name': 'b'}])
+    storage.delete('assessments', record['id'])
+    assert storage.version('assessments') == 5
+    assert storage.version('controls') == 0
+
+
+def test_pages_follow_insertion_order(storage):
+    storage.bulk_write('controls', [{'name': str(n)} for n in range(5)])
+    names, after = [], 0
+    while after is not None:
+        records, after = storage.page('controls', after=after, limit=2)
+        names.append([record['name'] for record in records])
+    assert names == [['0', '1'], ['2', '3'], ['4']]
+    assert [json.loads(raw)['name'] for raw in storage.iter_raw('controls')] == ['0', '1', '2', '3', '4']
+
+
+def test_stale_etag_is_a_conflict(storage):
+    record = storage.insert('controls', {'name': 'Access'}, assign_id=True)
+    storage.update('controls', record['id'], {'name': 'Access 2'}, expected_etags=[record_etag(record)])
+    with pytest.raises(ConflictError):
+        storage.update('controls', record['id'], {'name': 'lost update'}, expected_etags=[record_etag(record)])
+    assert storage.get('controls', record['id'])['name'] == 'Access 2'
+
+
+def test_sqlite_imports_legacy_json_files_once(tmp_path):
+    legacy = JSONStorage(str(tmp_path))
+    legacy.insert('assessments', {'name': 'from json'}, assign_id=True)
+    legacy.close()
+    storage = open_storage('sqlite', str(tmp_path))
+    assert storage.list('assessments') == [{'id': 1, 'name': 'from json'}]
+    storage.delete('assessments', 1)
+    storage.close()
+    # The collection exists in SQLite now, so the JSON file is not imported again
+    storage = open_storage('sqlite', str(tmp_path))
+    assert storage.list('assessments') == []
+    storage.close()
+
+
+def test_group_committer_batches_queued_writes_and_keeps_per_write_results():
+    release = threading.Event()
+    batches = []
+
+    def commit(ops):
+        release.wait(5)
+        batches.append(len(ops))
+        return [op() for op in ops]
+
+    committer = GroupCommitter(commit, window=0.05)
+
+    def write(n):
+        if n == 3:
+            return ValueError("bad write")
+        return n * 10
+
+    with ThreadPoolExecutor(8) as pool:
+        first = pool.submit(committer.submit, lambda: write(0))
+        time.sleep(0.05)
+        # These queue up while the first batch is being committed
+        futures = [pool.submit(committer.submit, lambda n=n: write(n)) for n in range(1, 8)]
+        time.sleep(0.05)
+        release.set()
+        assert first.result() == 0
+        with pytest.raises(ValueError):
+            futures[2].result()
+        assert [future.result() for n, future in enumerate(futures, start=1) if n != 3] == [10, 20, 40, 50, 60, 70]
+    committer.close()
+    assert batches == [1, 7]
+    assert committer.stats() == {'writes': 8, 'batches': 2, 'writes_per_batch': 4.0}
+
+
+def test_a_failing_write_does_not_undo_the_rest_of_its_batch(tmp_path):
+    storage = SQLiteStorage(str(tmp_path))
+    storage.insert('controls', {'id': 1, 'name': 'Access'})
+
+    def write(n):
+        try:
+            if n == 1:
+                return storage.update('controls', 1, {'name': 'lost update'}, expected_etags=['"stale"'])
+            return storage.insert('controls', {'id': n})
+        except ConflictError as e:
+            return e
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(write, [2, 1, 3, 4, 5]))
+    assert isinstance(results[1], ConflictError)
+    assert [record.get('name') for record in storage.list('controls')] == ['Access', None, None, None, None]
+    assert storage.version('controls') == 5
+    storage.close()
@@ -0,0 +1,31 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def controls(server):
+    server.storage.bulk_write('controls', [{'name': f"control {n}", 'notes': 'x' * 100} for n in range(1500)])
+    return server
+
+
+def test_streamed_json_array_matches_the_buffered_list(controls, client):
+    streamed = client.get('/api/controls?stream=json')
+    assert streamed.is_streamed
+    assert streamed.mimetype == 'application/json'
+    assert json.loads(streamed.data) == client.get('/api/controls').get_json()
+
+
+def test_ndjson_has_one_record_per_line(controls, client):
+    for response in (client.get('/api/controls?stream=ndjson&fields=id,name'),
+                     client.get('/api/controls?fields=id,name', headers={'Accept': 'application/x-ndjson'})):
+        assert response.mimetype == 'application/x-ndjson'
+        lines = response.data.decode().splitlines()
+        assert len(lines) == 1500
+        assert json.loads(lines[0]) == {'id': 1, 'name': 'control 0'}
+        assert json.loads(lines[-1]) == {'id': 1500, 'name': 'control 1499'}
+
+
+def test_empty_collection_streams_an_empty_array(client):
+    assert client.get('/api/assessments?stream=1').get_json() == []
+    assert client.get('/api/assessments?stream=ndjson').data == b''